@@ -0,0 +1,195 @@
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import analytics
+import auth
+import coherence
+import db
+import user_cache
+
+# Sign-up and login as a service over auth (hashing), db and user_cache, with
+# in-memory rate limits so a burst of sign-ups or credential stuffing cannot
+# take the hashing pool, the writer and the CPU away from real users:
+#   - every attempt takes a token from its client's bucket (IP address, or
+#     the session when there is none), and a login also from the email's
+#   - failed logins are counted per (email, client); at FAILURE_LIMIT that
+#     client is refused for that email for FAILURE_WINDOW, without a scrypt
+#     call. Keying by client too means one attacker cannot lock the real
+#     user out; attempts from many clients are bounded by the email's
+#     bucket, which slows that account's logins to LOGINS_PER_MINUTE.
+#   - sign-ups hash on auth's separate sign-up pool, at most SIGNUP_QUEUE at
+#     a time, and their inserts are group-committed by the db writer
+# Limits are per process: with several workers (coherence.py) each one
+# enforces them for the clients its load balancer sends it.
+ENABLED = os.environ.get("ROADMAP_RATE_LIMIT", "1") == "1"
+CLIENT_PER_MINUTE = float(os.environ.get("ROADMAP_CLIENT_PER_MINUTE", "60"))
+CLIENT_BURST = int(os.environ.get("ROADMAP_CLIENT_BURST", "20"))
+LOGINS_PER_MINUTE = float(os.environ.get("ROADMAP_LOGINS_PER_MINUTE", "12"))
+LOGIN_BURST = int(os.environ.get("ROADMAP_LOGIN_BURST", "6"))
+SIGNUPS_PER_MINUTE = float(os.environ.get("ROADMAP_SIGNUPS_PER_MINUTE", "3"))
+SIGNUP_BURST = int(os.environ.get("ROADMAP_SIGNUP_BURST", "3"))
+FAILURE_LIMIT = int(os.environ.get("ROADMAP_FAILURE_LIMIT", "10"))
+FAILURE_WINDOW = float(os.environ.get("ROADMAP_FAILURE_WINDOW", "900"))
+SIGNUP_QUEUE = int(os.environ.get("ROADMAP_SIGNUP_QUEUE", "32"))
+# Behind reverse proxies every request comes from the nearest one's address.
+# Set this to how many proxies sit in front of Streamlit and the client is
+# the X-Forwarded-For entry the outermost one appended, counting from the
+# right: proxies append to the header, so entries further left are whatever
+# the client sent. Only when clients cannot reach Streamlit directly.
+TRUST_PROXY = int(os.environ.get("ROADMAP_TRUST_PROXY", "0"))
+# Keys tracked per table (about 200 bytes each); the least recently seen go
+MAX_KEYS = int(os.environ.get("ROADMAP_RATE_LIMIT_KEYS", "20000"))
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after):
+        self.retry_after = max(math.ceil(retry_after), 1)   # whole seconds
+        super().__init__(f"Too many attempts; retry in {self.retry_after}s")
+
+
+class TokenBuckets:
+    # One bucket per key holding up to `burst` tokens, refilled at `rate`
+    # per second. Stored as (tokens, when) and topped up on access, so idle
+    # keys cost nothing; evicting one only hands it a full bucket early.
+    def __init__(self, rate, burst, size=MAX_KEYS):
+        self.rate = rate
+        self.burst = burst
+        self.size = size
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"allowed": 0, "limited": 0, "evictions": 0}
+
+    def take(self, key, n=1):
+        # -> 0 when the request may go ahead (its tokens are taken), else
+        # seconds until it could
+        now = time.monotonic()
+        with self._lock:
+            entry = self._buckets.get(key)
+            tokens = self.burst if entry is None else min(self.burst, entry[0] + (now - entry[1]) * self.rate)
+            wait = 0.0 if tokens >= n else (n - tokens) / self.rate
+            self._buckets[key] = (tokens - n if not wait else tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.size:
+                self._buckets.popitem(last=False)
+                self.stats["evictions"] += 1
+            self.stats["limited" if wait else "allowed"] += 1
+        return wait
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class FailureCounter:
+    # Failures per key in a window starting at the first one: (count, end)
+    def __init__(self, limit, window, size=MAX_KEYS):
+        self.limit = limit
+        self.window = window
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"failures": 0, "blocked": 0, "evictions": 0}
+
+    def blocked(self, key):
+        # -> seconds until `key` may try again, 0 if it may now. A single
+        # dict read, without the lock: entries are replaced, never mutated
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < self.limit:
+            return 0.0
+        wait = entry[1] - time.monotonic()
+        if wait <= 0:
+            return 0.0
+        self.stats["blocked"] += 1
+        return wait
+
+    def record(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= now:
+                entry = (1, now + self.window)
+            else:
+                # Reaching the limit blocks for a whole window from then
+                count = entry[0] + 1
+                entry = (count, now + self.window if count == self.limit else entry[1])
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+            self.stats["failures"] += 1
+
+    def clear(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+clients = TokenBuckets(CLIENT_PER_MINUTE / 60, CLIENT_BURST)
+logins = TokenBuckets(LOGINS_PER_MINUTE / 60, LOGIN_BURST)
+signups = TokenBuckets(SIGNUPS_PER_MINUTE / 60, SIGNUP_BURST)
+failures = FailureCounter(FAILURE_LIMIT, FAILURE_WINDOW)
+_signup_slots = threading.BoundedSemaphore(SIGNUP_QUEUE)
+
+
+def load_user(email):
+    with db.connection() as conn:
+        return conn.execute(db.SELECT_USER, (email,)).fetchone()
+
+def login(email, password, client, session=None):
+    # -> the users row, or None for wrong credentials; raises RateLimited
+    if ENABLED:
+        # Later buckets are only charged once the earlier checks pass
+        wait = failures.blocked((email, client)) or clients.take(client) or logins.take(email)
+        if wait:
+            raise RateLimited(wait)
+    data = user_cache.users.get(email, load_user)
+    ok = needs_rehash = False
+    if data and data[1]:
+        ok, needs_rehash = auth.verify_password(email, password, data[1])
+    if not ok:
+        if ENABLED:
+            failures.record((email, client))
+        return None
+    failures.clear((email, client))
+    if needs_rehash:
+        # Upgrade legacy SHA-256 or lower-cost hashes transparently
+        db.write_many([(db.UPDATE_PASSWORD, (auth.hash_password(password), email))] +
+                      coherence.notify("user", email, session))
+        user_cache.users.invalidate(email)
+    return data
+
+def sign_up(email, password, client, session=None):
+    # Raises RateLimited, or sqlite3.IntegrityError when the email is taken
+    if ENABLED:
+        wait = clients.take(client) or signups.take(client)
+        if wait:
+            raise RateLimited(wait)
+    if user_cache.users.get(email, load_user) is not None:
+        # What the insert would raise, without hashing the password first
+        raise sqlite3.IntegrityError("UNIQUE constraint failed: users.email")
+    if not _signup_slots.acquire(blocking=False):
+        raise RateLimited(1)
+    try:
+        stored = auth.hash_new_password(password)
+    finally:
+        _signup_slots.release()
+    db.write_many([(db.INSERT_USER, (email, stored, json.dumps({}), datetime.now()))] +
+                  coherence.notify("user", email, session))
+    user_cache.users.invalidate(email)
+    analytics.mark_changed(email)
+
+def stats():
+    result = {}
+    for name, table in (("clients", clients), ("logins", logins), ("signups", signups),
+                        ("failures", failures)):
+        result.update({f"{name}_{key}": value for key, value in table.stats.items()})
+        result[f"{name}_keys"] = len(table)
+    return result
@@ -0,0 +1,210 @@
+import threading
+import time
+
+import db
+import progress_codec
+
+# Cohort analytics over every user at once. Progress is loaded with one bulk
+# query into a users x topics boolean matrix (columns are roadmap_model topic
+# IDs, so stages are contiguous column ranges) and every aggregate is a
+# vectorized operation on it. Saves mark the user as changed, and refresh()
+# re-reads only those users' rows.
+#
+# Every page save calls mark_changed(), but only the admin dashboard builds
+# a Cohort, so NumPy (the slowest import in the app) is imported then.
+STAGE_BUCKETS = (0, 25, 50, 75, 100)
+BUCKET_LABELS = ("0%", "1-25%", "26-50%", "51-75%", "76-99%", "100%")
+
+_changed = set()
+_changed_lock = threading.Lock()
+np = None
+
+
+def mark_changed(email):
+    with _changed_lock:
+        _changed.add(email)
+
+def _take_changed():
+    global _changed
+    with _changed_lock:
+        changed, _changed = _changed, set()
+    return changed
+
+
+class Cohort:
+    # In the "events" storage mode there is no table to bulk-read, so each
+    # user's progress comes from `reader(email)` -> {stage: [topics]}
+    def __init__(self, model, registry=None, reader=None):
+        global np
+        if np is None:
+            import numpy as np
+        self.model = model
+        self.registry = registry
+        self.reader = reader
+        self.hours = np.frombuffer(model.topic_hours, dtype=model.topic_hours.typecode).astype(np.int64)
+        self.stage_start = np.asarray(model.stage_start[:-1], dtype=np.intp)
+        self.stage_hours = np.asarray(model.stage_hours, dtype=np.int64)
+        self.stage_sizes = np.diff(np.asarray(model.stage_start, dtype=np.intp))
+        self.emails = []
+        self.rows = {}
+        self.matrix = np.zeros((0, len(model)), dtype=bool)
+        self._offsets = {}
+        self.loaded_at = None
+
+    def _row_from_bits(self, bits):
+        raw = bits.to_bytes((len(self.model) + 7) // 8, "little")
+        return np.unpackbits(np.frombuffer(raw, dtype=np.uint8), bitorder="little")[:len(self.model)]
+
+    def _topic_ids(self, rows):
+        # (stage, topic) pairs -> model topic IDs; unknown topics give -1
+        topic_id = self.model.topic_id
+        return np.fromiter((-1 if (tid := topic_id(stage, topic)) is None else tid
+                            for stage, topic in rows), dtype=np.intp, count=len(rows))
+
+    def load(self, conn):
+        # One pass over the whole cohort: every user, then every progress row.
+        # SQLite maps names to topic IDs and groups them per user, so Python
+        # only touches one row per user.
+        _take_changed()
+        self.emails = [email for (email,) in conn.execute(db.SELECT_ALL_EMAILS)]
+        self.rows = {email: i for i, email in enumerate(self.emails)}
+        self.matrix = np.zeros((len(self.emails), len(self.model)), dtype=bool)
+        if db.PROGRESS_ENCODING == "events" and self.reader is not None:
+            for row, email in enumerate(self.emails):
+                self._set_progress(row, email)
+            self.loaded_at = time.time()
+            return len(self.emails)
+        conn.execute(db.CREATE_COHORT_TOPICS)
+        conn.execute(db.CLEAR_COHORT_TOPICS)
+        conn.executemany(db.INSERT_COHORT_TOPIC,
+                         ((stage, self.model.topic_names[tid], tid)
+                          for stage in self.model.stages for tid in self.model.topic_range(stage)))
+        for email, tids in conn.execute(db.SELECT_ALL_PROGRESS):
+            row = self.rows.get(email)
+            if row is not None:
+                self.matrix[row, np.array(tids.split(","), dtype=np.intp)] = True
+        if db.PROGRESS_ENCODING == "bitset" and self.registry is not None:
+            for email, blob in conn.execute(db.SELECT_ALL_PROGRESS_BITS):
+                if email in self.rows:
+                    self._set_blob(self.rows[email], blob)
+        self.loaded_at = time.time()
+        return len(self.emails)
+
+    def _set_blob(self, row, blob):
+        bits = progress_codec.to_model_bits(blob, self.registry, self.model, self._offsets)
+        self.matrix[row] = self._row_from_bits(bits)
+
+    def _set_progress(self, row, email):
+        self.matrix[row] = self._row_from_bits(self.model.encode(self.reader(email)))
+
+    def refresh(self, conn):
+        # Re-read only users saved since the last load/refresh; new users
+        # are appended as rows. Returns how many users were re-read.
+        changed = _take_changed()
+        if not changed:
+            return 0
+        new = [email for email in changed if email not in self.rows]
+        if new:
+            for email in new:
+                self.rows[email] = len(self.emails)
+                self.emails.append(email)
+            self.matrix = np.vstack([self.matrix,
+                                     np.zeros((len(new), len(self.model)), dtype=bool)])
+        for email in changed:
+            row = self.rows[email]
+            if db.PROGRESS_ENCODING == "events" and self.reader is not None:
+                self._set_progress(row, email)
+                continue
+            blob = None
+            if db.PROGRESS_ENCODING == "bitset" and self.registry is not None:
+                blob = conn.execute(db.SELECT_PROGRESS_BITS, (email,)).fetchone()
+            if blob:
+                self._set_blob(row, blob[0])
+                continue
+            self.matrix[row] = False
+            topics = self._topic_ids(conn.execute(db.SELECT_PROGRESS, (email,)).fetchall())
+            self.matrix[row, topics[topics >= 0]] = True
+        self.loaded_at = time.time()
+        return len(changed)
+
+    # Aggregates
+    def completed_hours(self):
+        return self.matrix @ self.hours
+
+    def stage_completed_hours(self):
+        # users x stages
+        if not len(self.model):
+            return np.zeros((len(self.emails), 0), dtype=np.int64)
+        return np.add.reduceat(self.matrix * self.hours, self.stage_start, axis=1)
+
+    def stage_percent(self):
+        hours = self.stage_completed_hours()
+        return np.divide(hours * 100.0, self.stage_hours,
+                         out=np.zeros(hours.shape), where=self.stage_hours > 0)
+
+    def summary(self):
+        hours = self.completed_hours()
+        if not len(hours):
+            return {"users": 0, "active": 0, "median_hours": 0, "mean_hours": 0,
+                    "p90_hours": 0, "total_hours": self.model.total_hours}
+        return {"users": len(hours),
+                "active": int(np.count_nonzero(self.matrix.any(axis=1))),
+                "median_hours": float(np.median(hours)),
+                "mean_hours": float(hours.mean()),
+                "p90_hours": float(np.percentile(hours, 90)),
+                "total_hours": self.model.total_hours}
+
+    def stage_distribution(self):
+        # {stage: users per completion bucket (BUCKET_LABELS)}
+        percent = self.stage_percent()
+        buckets = np.digitize(percent, STAGE_BUCKETS, right=True)
+        # digitize puts 100% in the 75-100 bucket; give it its own
+        buckets[percent >= 100] = len(BUCKET_LABELS) - 1
+        counts = np.stack([(buckets == b).sum(axis=0) for b in range(len(BUCKET_LABELS))], axis=1)
+        return {stage: counts[i].tolist() for i, stage in enumerate(self.model.stages)}
+
+    def stage_funnel(self):
+        # Users who started (any topic) and finished (every topic) each stage
+        if not len(self.model):
+            return {}
+        done = np.add.reduceat(self.matrix.astype(np.int32), self.stage_start, axis=1)
+        started = (done > 0).sum(axis=0)
+        finished = (done >= self.stage_sizes).sum(axis=0)
+        return {stage: {"started": int(started[i]), "finished": int(finished[i])}
+                for i, stage in enumerate(self.model.stages)}
+
+    def topic_rates(self):
+        # Share of users who completed each topic, in roadmap order
+        if not len(self.emails):
+            return np.zeros(len(self.model))
+        return self.matrix.mean(axis=0)
+
+    def drop_offs(self, limit=10):
+        # Topics where the completion rate falls most from the previous topic
+        # in the same stage: [(stage, topic, rate, drop)]
+        rates = self.topic_rates()
+        drops = np.zeros(len(rates))
+        drops[1:] = rates[:-1] - rates[1:]
+        drops[self.stage_start] = 0
+        order = np.argsort(-drops, kind="stable")[:limit]
+        stage_of = np.searchsorted(self.stage_start, order, side="right") - 1
+        return [(self.model.stages[s], self.model.topic_names[t], float(rates[t]), float(drops[t]))
+                for t, s in zip(order, stage_of) if drops[t] > 0]
+
+
+_cohorts = {}
+_lock = threading.Lock()
+
+def get_cohort(model, registry=None, reader=None):
+    # One cohort per roadmap model, shared by every admin session
+    with _lock:
+        cohort = _cohorts.get(model.version)
+        if cohort is None or cohort.model is not model:
+            _cohorts.clear()
+            cohort = _cohorts[model.version] = Cohort(model, registry, reader)
+        return cohort
+
+def reset():
+    # Drop the cohorts, so the next dashboard does a full load
+    with _lock:
+        _cohorts.clear()
@@ -0,0 +1,97 @@
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Password hashing with salted scrypt. Stored hashes carry their own cost
+# parameters ("scrypt$N$r$p$salt$hash"), so the cost can be raised later and
+# old hashes are upgraded on the next successful login, the same way legacy
+# unsalted SHA-256 hashes are.
+SCRYPT_N = int(os.environ.get("ROADMAP_SCRYPT_N", str(2 ** 14)))
+SCRYPT_R = int(os.environ.get("ROADMAP_SCRYPT_R", "8"))
+SCRYPT_P = int(os.environ.get("ROADMAP_SCRYPT_P", "1"))
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+# scrypt releases the GIL, so a small pool keeps logins off the Streamlit
+# script threads while bounding CPU and memory (128 * N * r bytes each).
+# New accounts hash on a pool of their own, so a burst of sign-ups queues
+# there instead of in front of logins.
+HASH_WORKERS = int(os.environ.get("ROADMAP_HASH_WORKERS", "4"))
+SIGNUP_HASH_WORKERS = int(os.environ.get("ROADMAP_SIGNUP_HASH_WORKERS", str(max(HASH_WORKERS // 2, 1))))
+
+# Recently verified logins skip scrypt. Entries hold an HMAC of the password
+# under a per-process key, never the password or its scrypt hash.
+LOGIN_CACHE_SIZE = int(os.environ.get("ROADMAP_LOGIN_CACHE_SIZE", "1024"))
+LOGIN_CACHE_TTL = float(os.environ.get("ROADMAP_LOGIN_CACHE_TTL", "300"))
+
+# Accounts allowed to see operator tools (profiling panel), comma separated
+ADMINS = {e.strip() for e in os.environ.get("ROADMAP_ADMINS", "").split(",") if e.strip()}
+
+_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="roadmap-hash")
+_signup_executor = ThreadPoolExecutor(max_workers=SIGNUP_HASH_WORKERS,
+                                      thread_name_prefix="roadmap-signup-hash")
+_cache_key = secrets.token_bytes(32)
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def legacy_hash(password):
+    return hashlib.sha256(password.encode()).hexdigest()
+
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=128 * r * (n + p) + 2 ** 20, dklen=KEY_BYTES)
+
+def _hash(password, n, r, p):
+    salt = secrets.token_bytes(SALT_BYTES)
+    key = _scrypt(password, salt, n, r, p)
+    return f"scrypt${n}${r}${p}${salt.hex()}${key.hex()}"
+
+def _verify(password, stored):
+    # -> (matches, needs_rehash)
+    if stored.startswith("scrypt$"):
+        _, n, r, p, salt, key = stored.split("$")
+        n, r, p = int(n), int(r), int(p)
+        ok = hmac.compare_digest(_scrypt(password, bytes.fromhex(salt), n, r, p),
+                                 bytes.fromhex(key))
+        return ok, ok and (n, r, p) != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    ok = hmac.compare_digest(legacy_hash(password), stored)
+    return ok, ok
+
+def hash_password(password, n=None, r=None, p=None):
+    return _executor.submit(_hash, password, n or SCRYPT_N, r or SCRYPT_R, p or SCRYPT_P).result()
+
+def hash_new_password(password):
+    return _signup_executor.submit(_hash, password, SCRYPT_N, SCRYPT_R, SCRYPT_P).result()
+
+def _cache_token(email, stored, password):
+    return hmac.new(_cache_key, f"{email}\0{stored}\0{password}".encode(), "sha256").digest()
+
+def verify_password(email, password, stored):
+    token = _cache_token(email, stored, password) if LOGIN_CACHE_TTL > 0 else None
+    if token is not None:
+        with _cache_lock:
+            hit = _cache.get(email)
+            if hit is not None and hmac.compare_digest(hit[0], token) and hit[1] > time.monotonic():
+                _cache.move_to_end(email)
+                return True, False
+    ok, needs_rehash = _executor.submit(_verify, password, stored).result()
+    if ok and token is not None and not needs_rehash:
+        with _cache_lock:
+            _cache[email] = (token, time.monotonic() + LOGIN_CACHE_TTL)
+            _cache.move_to_end(email)
+            while len(_cache) > LOGIN_CACHE_SIZE:
+                _cache.popitem(last=False)
+    return ok, needs_rehash
+
+def is_admin(email):
+    return email in ADMINS
+
+def forget(email):
+    with _cache_lock:
+        _cache.pop(email, None)
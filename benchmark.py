@@ -0,0 +1,1093 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import analytics
+import auth
+import db
+import forecast
+import metrics
+import overrides
+import progress_codec
+import roadmap_loader
+import roadmap_model
+import search
+import user_cache
+
+# Micro-benchmarks for the tracker's hot paths. Each benchmark works on its own
+# throwaway database so roadmap.db is never touched.
+#   python benchmark.py connections --sessions 16 --ops 500
+#   python benchmark.py --output results/load.json load --users 50 --concurrency 4
+
+def _temp_db():
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    return path
+
+def _remove_db(path):
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+def _seed_users(path, users):
+    conn = sqlite3.connect(path)
+    conn.execute(db.CREATE_USERS)
+    db.migrate(conn)
+    conn.executemany(db.INSERT_USER,
+                     [(f"user{i}@example.com", "x", json.dumps({}), datetime.now())
+                      for i in range(users)])
+    conn.commit()
+    conn.close()
+
+def _toggle(email, i):
+    # Alternate completing and un-completing one topic, like a user clicking
+    if i % 2 == 0:
+        return db.UPSERT_TOPIC, (email, "Stage 1", "Python Basics", datetime.now())
+    return db.DELETE_TOPIC, (email, "Stage 1", "Python Basics")
+
+def _run_sessions(sessions, work):
+    # Run `work(session_id)` in one thread per simulated Streamlit session
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(sessions)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start
+
+def _synthetic_roadmap(stages, topics_per_stage):
+    return {
+        f"Stage {s}": {
+            "topics": [{"name": f"Topic {s}.{t}", "time": 1 + (s + t) % 15}
+                       for t in range(topics_per_stage)],
+            "resources": {"books": [], "documentation": [], "youtube": [],
+                          "practice_sites": [], "research_papers": []}
+        }
+        for s in range(stages)
+    }
+
+def _synthetic_progress(roadmap, every=2):
+    return {stage: [t["name"] for t in data["topics"][::every]]
+            for stage, data in roadmap.items()}
+
+def _calculate_progress_lists(roadmap, progress):
+    # The original list-scanning calculate_progress, kept as the baseline
+    metrics = {"total": {"hours": 0, "completed": 0}, "stages": {}}
+    for stage, data in roadmap.items():
+        stage_hours = sum(t["time"] for t in data["topics"])
+        completed_hours = sum(t["time"] for t in data["topics"]
+                              if t["name"] in progress.get(stage, []))
+        metrics["stages"][stage] = {
+            "total": stage_hours,
+            "completed": completed_hours,
+            "percent": (completed_hours / stage_hours * 100) if stage_hours > 0 else 0
+        }
+        metrics["total"]["hours"] += stage_hours
+        metrics["total"]["completed"] += completed_hours
+    return metrics
+
+def _best_of(repeat, fn):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def bench_metrics(stages=100, topics_per_stage=100, toggles=1000, repeat=3):
+    roadmap = _synthetic_roadmap(stages, topics_per_stage)
+    progress = _synthetic_progress(roadmap)
+    stage = next(iter(roadmap))
+    topic = roadmap[stage]["topics"][1]["name"]
+
+    baseline = _best_of(repeat, lambda: _calculate_progress_lists(roadmap, progress))
+    model = roadmap_model.Roadmap(roadmap)
+    build = _best_of(repeat, lambda: metrics.ProgressMetrics(model, progress))
+    engine = metrics.ProgressMetrics(model, progress)
+
+    def toggle_all():
+        for i in range(toggles):
+            engine.toggle(stage, topic, i % 2 == 0)
+
+    incremental = _best_of(repeat, toggle_all) / toggles
+    snapshot = _best_of(repeat, engine.as_dict)
+    return {
+        "topics": stages * topics_per_stage,
+        "list_scan_ms": round(baseline * 1000, 3),
+        "model_build_ms": round(_best_of(repeat, lambda: roadmap_model.Roadmap(roadmap)) * 1000, 3),
+        "session_build_ms": round(build * 1000, 3),
+        "toggle_us": round(incremental * 1e6, 3),
+        "snapshot_ms": round(snapshot * 1000, 3),
+    }
+
+def _container_sizeof(obj):
+    # Memory of the nested dicts/lists themselves; strings are shared with
+    # the model and small ints are cached, so neither is counted
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(_container_sizeof(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sys.getsizeof(obj) + sum(_container_sizeof(v) for v in obj)
+    return 0
+
+def bench_model(stages=100, topics_per_stage=100):
+    roadmap = _synthetic_roadmap(stages, topics_per_stage)
+    model = roadmap_model.Roadmap(roadmap)
+    progress = _synthetic_progress(roadmap)
+    stage = model.stages[-1]
+    name = model.topic_names[model.topic_range(stage)[-1]]
+
+    def scan_lookup():
+        return next(t for t in roadmap[stage]["topics"] if t["name"] == name)
+
+    # The model keeps nothing of the dicts it was built from, so it replaces
+    # them (roadmap_loader keeps only the model)
+    return {
+        "topics": len(model),
+        "dict_bytes": _container_sizeof(roadmap),
+        "model_bytes": model.nbytes(),
+        "progress_list_bytes": _container_sizeof(progress),
+        "progress_bitset_bytes": sys.getsizeof(model.encode(progress)),
+        "scan_lookup_us": round(_best_of(5, scan_lookup) * 1e6, 3),
+        "id_lookup_us": round(_best_of(5, lambda: model.topic_id(stage, name)) * 1e6, 3),
+    }
+
+def bench_overrides(users=256, stages=100, topics_per_stage=100):
+    # One customized view per user, each renaming a different topic: a full
+    # model rebuilt from the user's stages vs one derived from the base
+    # model. Reports each user's own bytes (shared indexes not counted).
+    model = roadmap_model.Roadmap(_synthetic_roadmap(stages, topics_per_stage), "bench@" + "0" * 16)
+    base = roadmap_loader.LoadedRoadmap("bench", "Bench", 1, "0" * 16, model)
+    names = list(base.stages)
+    views = []
+    for i in range(users):
+        stage = names[i % len(names)]
+        topic = base.stages[stage]["topics"][i % topics_per_stage]["name"]
+        deltas = [{"op": "edit_topic", "stage": stage, "topic": topic, "name": f"{topic}*", "time": 1}]
+        views.append((overrides.apply(base.stages, deltas), overrides.digest(deltas)))
+    # The full build gets every stage as a plain dict, as if parsed
+    plain = [({stage: dict(data) for stage, data in stages.items()}, digest) for stages, digest in views]
+    start = time.perf_counter()
+    full = [roadmap_model.Roadmap(stages, digest) for stages, digest in plain]
+    full_build = time.perf_counter() - start
+    start = time.perf_counter()
+    derived = [roadmap_model.Roadmap(stages, digest) for stages, digest in views]
+    derived_build = time.perf_counter() - start
+    for a, b in zip(full, derived):
+        assert a.topic_names == b.topic_names and a.stage_hours == b.stage_hours
+        assert all(a.topic_id(s, n) == b.topic_id(s, n) for s in (b.stages[0], b.stages[-1])
+                   for n in b.topic_names[b.topic_range(s).start:b.topic_range(s).stop])
+    return {
+        "topics": len(model),
+        "base_model_bytes": model.nbytes(),
+        "full_bytes_per_user": round(sum(m.nbytes() for m in full) / users),
+        "derived_bytes_per_user": round(sum(m.nbytes(model) for m in derived) / users),
+        "full_build_ms": round(full_build / users * 1000, 3),
+        "derived_build_ms": round(derived_build / users * 1000, 3),
+    }
+
+def bench_encoding(stages=100, topics_per_stage=100, repeat=5):
+    roadmap = _synthetic_roadmap(stages, topics_per_stage)
+    progress = _synthetic_progress(roadmap)
+    model = roadmap_model.Roadmap(roadmap)
+    registry = progress_codec.TopicRegistry()
+    registry.register(model)
+    text = json.dumps(progress)
+    blob = progress_codec.encode(progress, registry)
+
+    def json_load():
+        return metrics.ProgressMetrics(model, json.loads(text)).as_dict()
+
+    offsets = {}
+    stage = next(iter(roadmap))
+    flip = (stage, roadmap[stage]["topics"][1]["name"], True)
+
+    def blob_load():
+        bits = progress_codec.to_model_bits(blob, registry, model, offsets)
+        return metrics.ProgressMetrics(model, bits=bits).as_dict()
+
+    return {
+        "topics": len(model),
+        "json_bytes": len(text.encode()),
+        "bitset_bytes": len(blob),
+        "json_parse_ms": round(_best_of(repeat, lambda: json.loads(text)) * 1000, 3),
+        "bitset_decode_ms": round(_best_of(repeat, lambda: progress_codec.decode(blob, registry)) * 1000, 3),
+        "bitset_to_model_bits_ms": round(_best_of(repeat, lambda: progress_codec.to_model_bits(blob, registry, model, offsets)) * 1000, 3),
+        "bitset_encode_ms": round(_best_of(repeat, lambda: progress_codec.encode(progress, registry)) * 1000, 3),
+        "bitset_apply_flip_ms": round(_best_of(repeat, lambda: progress_codec.apply_changes(blob, [flip], registry)) * 1000, 3),
+        "json_load_and_metrics_ms": round(_best_of(repeat, json_load) * 1000, 3),
+        "bitset_load_and_metrics_ms": round(_best_of(repeat, blob_load) * 1000, 3),
+    }
+
+def _element_protos(node):
+    proto = getattr(node, "proto", None)
+    if proto is not None:
+        yield proto
+    children = getattr(node, "children", None) or {}
+    for child in children.values():
+        yield from _element_protos(child)
+
+def bench_render(repeat=3):
+    # Renders every stage of the default roadmap headlessly, once with eager
+    # st.video players and once with lazy thumbnails, and reports Streamlit
+    # payload size, players created and script time per stage
+    from streamlit.testing.v1 import AppTest
+    import roadmap_loader
+
+    path = _temp_db()
+    db.configure(path)
+    user_cache.clear()
+    app = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+    stages = list(roadmap_loader.load().stages)
+    results = {}
+    try:
+        for mode, lazy in (("eager_videos", "0"), ("lazy_videos", "1")):
+            os.environ["ROADMAP_LAZY_VIDEOS"] = lazy
+            per_stage = {}
+            for stage in stages:
+                at = AppTest.from_file(app, default_timeout=60)
+                at.session_state.user = "bench@example.com"
+                at.session_state.progress = {}
+                at.session_state.selected_stage = stage
+                at.run()
+                seconds = _best_of(repeat, at.run)
+                protos = list(_element_protos(at._tree))
+                per_stage[stage] = {
+                    "render_ms": round(seconds * 1000, 2),
+                    "payload_bytes": sum(len(p.SerializeToString()) for p in protos),
+                    "video_players": len(at.get("video")),
+                    "thumbnails": sum("](https://img.youtube.com/" in m.value for m in at.markdown),
+                }
+            results[mode] = per_stage
+    finally:
+        os.environ.pop("ROADMAP_LAZY_VIDEOS", None)
+        db.configure(db.DB_PATH)
+        user_cache.clear()
+        _remove_db(path)
+    return results
+
+def bench_navigation(stages=(10, 100, 1000, 5000), topics_per_stage=5, repeat=3):
+    # Full rerun time and sidebar widget count as the roadmap grows, listing
+    # every stage (ROADMAP_NAV_PAGE_SIZE=0) vs the paged navigation
+    from streamlit.testing.v1 import AppTest
+    import roadmap_loader
+
+    path = _temp_db()
+    db.configure(path)
+    user_cache.clear()
+    app = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+    roadmap_dir = tempfile.mkdtemp()
+    saved_dir = roadmap_loader.ROADMAP_DIR
+    roadmap_loader.ROADMAP_DIR = roadmap_dir
+    results = {}
+    try:
+        for count in stages:
+            with open(os.path.join(roadmap_dir, "bench.json"), "w") as f:
+                json.dump({"name": "Bench", "version": count,
+                           "stages": _synthetic_roadmap(count, topics_per_stage)}, f)
+            for mode, page_size in (("all_stages", "0"), ("paged", None)):
+                if page_size is None:
+                    os.environ.pop("ROADMAP_NAV_PAGE_SIZE", None)
+                else:
+                    os.environ["ROADMAP_NAV_PAGE_SIZE"] = page_size
+                at = AppTest.from_file(app, default_timeout=120)
+                at.session_state.user = "bench@example.com"
+                at.session_state.progress = {}
+                at.session_state.roadmap_name = "bench"
+                at.run()
+                seconds = _best_of(repeat, at.run)
+                results.setdefault(count, {})[mode] = {
+                    "rerun_ms": round(seconds * 1000, 2),
+                    "sidebar_buttons": len(at.sidebar.button),
+                }
+    finally:
+        os.environ.pop("ROADMAP_NAV_PAGE_SIZE", None)
+        roadmap_loader.ROADMAP_DIR = saved_dir
+        shutil.rmtree(roadmap_dir, ignore_errors=True)
+        db.configure(db.DB_PATH)
+        user_cache.clear()
+        _remove_db(path)
+    return results
+
+def bench_logins(threads=4, logins=40, costs=(2 ** 12, 2 ** 13, 2 ** 14, 2 ** 15)):
+    # Logins/sec through the bounded hashing pool at each scrypt cost, with
+    # the verified-login cache off so every login pays for scrypt
+    ttl = auth.LOGIN_CACHE_TTL
+    auth.LOGIN_CACHE_TTL = 0
+    results = {}
+    try:
+        for n in costs:
+            stored = auth.hash_password("correct horse", n=n)
+            per_thread = max(logins // threads, 1)
+
+            def work(session):
+                for _ in range(per_thread):
+                    assert auth.verify_password(f"user{session}@example.com",
+                                                "correct horse", stored)[0]
+
+            elapsed = _run_sessions(threads, work)
+            results[f"N={n}"] = {"logins_per_sec": round(threads * per_thread / elapsed, 1),
+                                 "ms_per_login": round(elapsed / per_thread * 1000, 2),
+                                 "memory_mb": round(128 * auth.SCRYPT_R * n / 2 ** 20, 1)}
+        return results
+    finally:
+        auth.LOGIN_CACHE_TTL = ttl
+
+def bench_auth(users=24, attackers=4, signups=16, seconds=20.0, victims=200, interval=6.0):
+    # Real users logging in every `interval` seconds (inside the per-email
+    # limit) while `attackers` threads
+    # stuff credentials against `victims` existing accounts from one address
+    # and `signups` clients create accounts at once, with the rate limits
+    # off and on. Reports the real users' login latency, how many guesses
+    # were checked against a password hash, and the sign-ups' latency and
+    # writer transactions.
+    import random
+    import accounts
+
+    enabled, ttl = accounts.ENABLED, auth.LOGIN_CACHE_TTL
+    auth.LOGIN_CACHE_TTL = 0  # every real login pays for scrypt
+    stored = auth.hash_password("correct horse")
+    results = {}
+    try:
+        for mode, on in (("no_limits", False), ("rate_limited", True)):
+            path = _temp_db()
+            _seed_users(path, 0)
+            conn = sqlite3.connect(path)
+            conn.executemany(db.INSERT_USER, [(email, stored, json.dumps({}), datetime.now())
+                                              for email in [f"user{i}@example.com" for i in range(users)] +
+                                              [f"victim{i}@example.com" for i in range(victims)]])
+            conn.commit()
+            conn.close()
+            db.configure(path)
+            user_cache.clear()
+            accounts.ENABLED = on
+            accounts.clients = accounts.TokenBuckets(accounts.CLIENT_PER_MINUTE / 60, accounts.CLIENT_BURST)
+            accounts.logins = accounts.TokenBuckets(accounts.LOGINS_PER_MINUTE / 60, accounts.LOGIN_BURST)
+            accounts.signups = accounts.TokenBuckets(accounts.SIGNUPS_PER_MINUTE / 60, accounts.SIGNUP_BURST)
+            accounts.failures = accounts.FailureCounter(accounts.FAILURE_LIMIT, accounts.FAILURE_WINDOW)
+            deadline = time.monotonic() + seconds
+            latency, checked, refused, created, signup_latency = [], [0], [0], [0], []
+            lock = threading.Lock()
+
+            def user(i):
+                time.sleep(interval * i / users)
+                while time.monotonic() < deadline:
+                    start = time.perf_counter()
+                    assert accounts.login(f"user{i}@example.com", "correct horse", f"10.0.0.{i}")
+                    with lock:
+                        latency.append(time.perf_counter() - start)
+                    time.sleep(max(interval - (time.perf_counter() - start), 0))
+
+            def attacker(i):
+                rng = random.Random(i)
+                while time.monotonic() < deadline:
+                    try:
+                        accounts.login(f"victim{rng.randrange(victims)}@example.com",
+                                       f"guess{rng.random()}", "203.0.113.7")
+                        with lock:
+                            checked[0] += 1
+                    except accounts.RateLimited:
+                        with lock:
+                            refused[0] += 1
+                        time.sleep(0.001)
+
+            def signup(i):
+                for n in range(accounts.SIGNUP_BURST):
+                    start = time.perf_counter()
+                    try:
+                        accounts.sign_up(f"new{i}.{n}@example.com", "pw", f"198.51.100.{i}")
+                    except accounts.RateLimited:
+                        continue
+                    with lock:
+                        created[0] += 1
+                        signup_latency.append(time.perf_counter() - start)
+
+            writes = dict(db.get_writer().stats)
+            threads = ([threading.Thread(target=user, args=(i,)) for i in range(users)] +
+                       [threading.Thread(target=attacker, args=(i,)) for i in range(attackers)] +
+                       [threading.Thread(target=signup, args=(i,)) for i in range(signups)])
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            stats = db.get_writer().stats
+            results[mode] = {
+                "login_latency": _percentiles(latency),
+                "attacker_guesses_checked": checked[0],
+                "attacker_guesses_refused": refused[0],
+                "signups": created[0],
+                "signup_latency": _percentiles(signup_latency),
+                "signup_transactions": stats["transactions"] - writes["transactions"],
+            }
+            db.configure(db.DB_PATH)
+            _remove_db(path)
+        return results
+    finally:
+        accounts.ENABLED, auth.LOGIN_CACHE_TTL = enabled, ttl
+        user_cache.clear()
+
+def bench_user_cache(users=200, loads=5000, cache_size=50, stages=20, topics_per_stage=50):
+    # Progress loads as on login/reload: read the blob and decode it every
+    # time, vs through the shared cache. `cache_size` below `users` makes the
+    # LRU evict, like a working set larger than the cache.
+    roadmap = _synthetic_roadmap(stages, topics_per_stage)
+    registry = progress_codec.TopicRegistry()
+    registry.register(roadmap_model.Roadmap(roadmap))
+    blob = progress_codec.encode(_synthetic_progress(roadmap), registry)
+    path = _temp_db()
+    _seed_users(path, users)
+    conn = sqlite3.connect(path)
+    conn.executemany(db.UPSERT_PROGRESS_BITS,
+                     [(f"user{i}@example.com", blob) for i in range(users)])
+    conn.commit()
+    conn.close()
+    # Most loads come from a small set of active users
+    emails = [f"user{(i * i) % users if i % 4 else i % users}@example.com" for i in range(loads)]
+    pool = db.ConnectionPool(path)
+
+    def read(email):
+        with pool.connection() as c:
+            row = c.execute(db.SELECT_PROGRESS_BITS, (email,)).fetchone()
+        return progress_codec.decode(row[0], registry)
+
+    try:
+        start = time.perf_counter()
+        for email in emails:
+            read(email)
+        uncached = time.perf_counter() - start
+        cache = user_cache.TTLCache(size=cache_size, copy=user_cache.copy_progress)
+        start = time.perf_counter()
+        for email in emails:
+            cache.get(email, read)
+        cached = time.perf_counter() - start
+        return {"loads": loads,
+                "uncached_loads_per_sec": round(loads / uncached),
+                "cached_loads_per_sec": round(loads / cached),
+                "cache_stats": dict(cache.stats, size=len(cache))}
+    finally:
+        pool.close()
+        _remove_db(path)
+
+def bench_connections(sessions=8, ops=500):
+    path = _temp_db()
+    _seed_users(path, sessions)
+
+    def per_call(session):
+        email = f"user{session}@example.com"
+        for i in range(ops):
+            conn = sqlite3.connect(path, timeout=30)
+            conn.execute(db.SELECT_PROGRESS, (email,)).fetchall()
+            conn.execute(*_toggle(email, i))
+            conn.commit()
+            conn.close()
+
+    pool = db.ConnectionPool(path, size=sessions)
+
+    def pooled(session):
+        email = f"user{session}@example.com"
+        for i in range(ops):
+            with pool.connection() as conn:
+                conn.execute(db.SELECT_PROGRESS, (email,)).fetchall()
+                conn.execute(*_toggle(email, i))
+
+    try:
+        results = {}
+        for name, work in (("per_call_connect", per_call), ("pooled", pooled)):
+            elapsed = _run_sessions(sessions, work)
+            results[name] = {"seconds": round(elapsed, 4),
+                             "ops_per_sec": round(sessions * ops / elapsed, 1)}
+        results["pool_stats"] = dict(pool.stats)
+        return results
+    finally:
+        pool.close()
+        _remove_db(path)
+
+def bench_writes(sessions=16, ops=200):
+    def direct(path):
+        def work(session):
+            email = f"user{session}@example.com"
+            for i in range(ops):
+                conn = sqlite3.connect(path, timeout=30)
+                conn.execute(*_toggle(email, i))
+                conn.commit()
+                conn.close()
+        return work
+
+    def queued(writer):
+        def work(session):
+            email = f"user{session}@example.com"
+            for i in range(ops):
+                writer.submit(*_toggle(email, i))
+        return work
+
+    results = {}
+    path = _temp_db()
+    _seed_users(path, sessions)
+    try:
+        elapsed = _run_sessions(sessions, direct(path))
+        results["rollback_journal_direct"] = {
+            "seconds": round(elapsed, 4),
+            "writes_per_sec": round(sessions * ops / elapsed, 1)}
+    finally:
+        _remove_db(path)
+
+    path = _temp_db()
+    _seed_users(path, sessions)
+    writer = db.WriteQueue(path)
+    try:
+        elapsed = _run_sessions(sessions, queued(writer))
+        results["wal_write_queue"] = {
+            "seconds": round(elapsed, 4),
+            "writes_per_sec": round(sessions * ops / elapsed, 1),
+            "writes_per_transaction": round(writer.stats["writes"] /
+                                            max(writer.stats["transactions"], 1), 2)}
+    finally:
+        writer.close()
+        _remove_db(path)
+    return results
+
+def bench_persistence(sessions=16, clicks=200):
+    # Time spent inside a checkbox click's save: a synchronous commit through
+    # the write queue vs queueing for the write-behind flusher. Every session
+    # keeps re-toggling a handful of topics, which write-behind coalesces.
+    def clicks_of(save):
+        latencies = []
+
+        def work(session):
+            email = f"user{session}@example.com"
+            for i in range(clicks):
+                sql, params = _toggle(email, i)
+                params = (email, "Stage 1", f"Topic {i % 5}") + params[3:]
+                start = time.perf_counter()
+                save(((email, "Stage 1", params[2]), [(sql, params)]))
+                latencies.append(time.perf_counter() - start)
+        return work, latencies
+
+    results = {}
+    for mode in ("sync", "write_behind"):
+        path = _temp_db()
+        _seed_users(path, sessions)
+        writer = db.WriteQueue(path)
+        behind = db.WriteBehind(writer)
+        if mode == "sync":
+            save = lambda item: writer.submit_many(item[1])
+        else:
+            save = lambda item: behind.put([item])
+        work, latencies = clicks_of(save)
+        try:
+            elapsed = _run_sessions(sessions, work)
+            behind.close()
+            latencies.sort()
+            results[mode] = {
+                "clicks_per_sec": round(sessions * clicks / elapsed, 1),
+                "p50_click_ms": round(latencies[len(latencies) // 2] * 1000, 4),
+                "p99_click_ms": round(latencies[int(len(latencies) * 0.99)] * 1000, 4),
+                "statements_written": writer.stats["writes"] if mode == "sync"
+                                      else behind.stats["statements"],
+                "transactions": writer.stats["transactions"]}
+        finally:
+            writer.close()
+            _remove_db(path)
+    return results
+
+def bench_analytics(users=2000, stages=20, topics_per_stage=50):
+    # Cohort aggregates: looping per user (load rows, calculate_progress,
+    # then aggregate in Python) vs one bulk load into the NumPy matrix
+    import statistics
+
+    roadmap = _synthetic_roadmap(stages, topics_per_stage)
+    model = roadmap_model.Roadmap(roadmap)
+    path = _temp_db()
+    _seed_users(path, users)
+    conn = sqlite3.connect(path)
+    conn.executemany(db.UPSERT_TOPIC, [(f"user{i}@example.com", stage, topic, None)
+                                       for i in range(users)
+                                       for stage, topics in _synthetic_progress(roadmap, 2 + i % 5).items()
+                                       for topic in topics[:(i * 7) % (topics_per_stage // 2 + 1)]])
+    conn.commit()
+    conn.close()
+    pool = db.ConnectionPool(path)
+    try:
+        def per_user():
+            with pool.connection() as c:
+                emails = [email for (email,) in c.execute(db.SELECT_ALL_EMAILS)]
+                hours, started = [], [0] * stages
+                for email in emails:
+                    progress = {}
+                    for stage, topic in c.execute(db.SELECT_PROGRESS, (email,)):
+                        progress.setdefault(stage, []).append(topic)
+                    result = metrics.ProgressMetrics(model, progress).as_dict()
+                    hours.append(result["total"]["completed"])
+                    for i, stage in enumerate(model.stages):
+                        started[i] += result["stages"][stage]["completed"] > 0
+            return statistics.median(hours), started
+
+        cohort = analytics.Cohort(model)
+
+        def bulk_load():
+            with pool.connection() as c:
+                cohort.load(c)
+
+        def aggregate():
+            return (cohort.summary()["median_hours"], cohort.stage_funnel(),
+                    cohort.stage_distribution(), cohort.drop_offs())
+
+        bulk_load()
+        loop_median = per_user()[0]
+        assert loop_median == aggregate()[0], (loop_median, aggregate()[0])
+
+        def refresh():
+            for i in range(10):
+                analytics.mark_changed(f"user{i}@example.com")
+            with pool.connection() as c:
+                cohort.refresh(c)
+
+        return {"users": users, "topics": len(model),
+                "per_user_loop_ms": round(_best_of(3, per_user) * 1000, 2),
+                "bulk_load_ms": round(_best_of(3, bulk_load) * 1000, 2),
+                "vectorized_aggregates_ms": round(_best_of(3, aggregate) * 1000, 2),
+                "refresh_10_changed_users_ms": round(_best_of(3, refresh) * 1000, 3),
+                "matrix_bytes": cohort.matrix.nbytes}
+    finally:
+        pool.close()
+        _remove_db(path)
+
+def bench_forecast(events=100000, stages=20, topics_per_stage=50, repeat=5):
+    # Per-render forecast cost: rescanning a user's event history vs the
+    # rolling pace statistics, which cost the same at any history length
+    roadmap = _synthetic_roadmap(stages, topics_per_stage)
+    model = roadmap_model.Roadmap(roadmap)
+    engine = metrics.ProgressMetrics(model, _synthetic_progress(roadmap))
+    start = time.time() - 90 * 86400
+    history = [(start + i * 90 * 86400 / events, 1 + i % 15 if i % 4 else -(1 + i % 15))
+               for i in range(events)]
+    path = _temp_db()
+    _seed_users(path, 1)
+    conn = sqlite3.connect(path)
+    conn.executemany(db.INSERT_EVENT, [("user0@example.com", "Stage 1", "Topic", int(h > 0), abs(h), at)
+                                       for at, h in history])
+    conn.commit()
+
+    def rescan():
+        pace = forecast.Pace()
+        for at, hours in conn.execute('SELECT at, CASE done WHEN 1 THEN hours ELSE -hours END '
+                                      'FROM progress_events WHERE email = ? ORDER BY id',
+                                      ("user0@example.com",)):
+            pace.record(hours, at)
+        return forecast.project(pace, engine, model.stages[-1])
+
+    pace = forecast.Pace()
+    for at, hours in history:
+        pace.record(hours, at)
+    try:
+        return {"events": events,
+                "rescan_history_ms": round(_best_of(repeat, rescan) * 1000, 3),
+                "rolling_stats_ms": round(_best_of(repeat, lambda: forecast.project(pace, engine, model.stages[-1])) * 1000, 4),
+                "record_toggle_us": round(_best_of(repeat, lambda: pace.record(0, time.time())) * 1e6, 2)}
+    finally:
+        conn.close()
+        _remove_db(path)
+
+def _synthetic_texts(entries, vocabulary=20000, seed=7):
+    # Topic/resource-like strings: 2-8 words drawn with a Zipf-ish skew, so
+    # some words are in thousands of entries and most in a handful
+    import random
+    rng = random.Random(seed)
+    syllables = ["da", "ta", "ne", "ur", "al", "re", "gres", "sion", "py", "thon", "lin", "ear",
+                 "mo", "del", "clus", "ter", "vec", "tor", "gra", "dient", "boost", "ing"]
+    words = sorted({"".join(rng.choice(syllables) for _ in range(rng.randint(2, 4)))
+                    for _ in range(vocabulary)})
+    weights = [1 / (rank + 1) for rank in range(len(words))]
+    return words, [" ".join(rng.choices(words, weights, k=rng.randint(2, 8))) for _ in range(entries)]
+
+def bench_search(entries=100000, stages=500, queries=200):
+    # Query latency on a roadmap with `entries` topics and resources: a
+    # linear substring scan vs the inverted index (exact, prefix and fuzzy)
+    import random
+    rng = random.Random(3)
+    words, texts = _synthetic_texts(entries)
+    kinds = ("topic", "books", "documentation", "youtube", "practice_sites", "research_papers")
+    docs = [(f"Stage {i % stages}", kinds[i % len(kinds)], text) for i, text in enumerate(texts)]
+    start = time.perf_counter()
+    index = search.Index(docs)
+    build = time.perf_counter() - start
+    picks = [rng.choice(words) for _ in range(queries)]
+    typo = lambda w: w[:len(w) // 2] + w[len(w) // 2 + 1:] if len(w) > 4 else w
+    workloads = {"exact": picks,
+                 "prefix": [w[:3] for w in picks],
+                 "typo": [typo(w) for w in picks],
+                 "two_words": [f"{w} {rng.choice(words)}" for w in picks]}
+
+    def scan(query):
+        terms = query.lower().split()
+        return [doc for doc in docs if any(term in doc[2] for term in terms)][:search.RESULT_LIMIT]
+
+    def timed(fn, qs):
+        samples = []
+        for q in qs:
+            t0 = time.perf_counter()
+            fn(q)
+            samples.append(time.perf_counter() - t0)
+        return _percentiles(samples)
+
+    results = {"entries": entries, "tokens": len(index._postings),
+               "build_s": round(build, 2),
+               "scan_ms": timed(scan, picks[:20])}
+    for name, qs in workloads.items():
+        results[f"index_{name}_ms"] = timed(index.search, qs)
+    # Incremental updates: one edit, and syncing a changed roadmap file
+    t0 = time.perf_counter()
+    for i in range(100):
+        index.remove(docs[i])
+        index.add((docs[i][0], docs[i][1], docs[i][2] + " edited"))
+    results["edit_us"] = round((time.perf_counter() - t0) / 100 * 1e6, 1)
+    changed = docs[:]
+    for i in range(0, entries, 100):
+        changed[i] = (docs[i][0], docs[i][1], f"{docs[i][2]} v2")
+    t0 = time.perf_counter()
+    added, removed = index.sync(changed)
+    results["sync_1pct_s"] = round(time.perf_counter() - t0, 3)
+    results["sync_changes"] = added + removed
+    return results
+
+def _percentiles(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {}
+    pick = lambda q: round(samples[min(int(len(samples) * q), len(samples) - 1)] * 1000, 2)
+    return {"count": len(samples), "p50_ms": pick(0.50), "p95_ms": pick(0.95),
+            "p99_ms": pick(0.99), "max_ms": round(samples[-1] * 1000, 2)}
+
+def _load_worker(learners, path, roadmap_dir, password, toggles, stages):
+    # Runs in its own process: drives each learner's AppTest session in turn
+    # and returns the rerun timings and this process's database write stats
+    from streamlit.testing.v1 import AppTest
+    import roadmap_loader
+
+    roadmap_loader.ROADMAP_DIR, roadmap_loader.DEFAULT_ROADMAP = roadmap_dir, "load_test"
+    db.configure(path)
+    app = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+    timings = {"login": [], "render": [], "navigate": [], "toggle": []}
+    errors = []
+
+    def timed_run(kind, at):
+        start = time.perf_counter()
+        at.run()
+        elapsed = time.perf_counter() - start
+        if at.exception:
+            raise RuntimeError(at.exception[0].value)
+        timings[kind].append(elapsed)
+
+    for i in learners:
+        try:
+            at = AppTest.from_file(app, default_timeout=120)
+            at.run()
+            at.text_input[0].input(f"user{i}@example.com")
+            at.text_input[1].input(password)
+            at.button[0].click()
+            timed_run("login", at)
+            if "user" not in at.session_state:
+                raise RuntimeError("login failed")
+            timed_run("render", at)
+            at.sidebar.button[1 + i % (stages - 1)].click()
+            timed_run("navigate", at)
+            for n in range(toggles):
+                box = at.checkbox[n % len(at.checkbox)]
+                box.set_value(not box.value)
+                timed_run("toggle", at)
+            at.sidebar.button[-1].click()  # Logout flushes deferred writes
+            at.run()
+        except Exception as e:
+            errors.append(f"user{i}: {e}")
+    db.flush()
+    stats = dict(db.get_writer().stats)
+    db.configure(path)
+    return timings, errors, stats
+
+def bench_load(users=20, concurrency=4, toggles=10, stages=10, topics_per_stage=20):
+    # End-to-end request path: every simulated learner is one AppTest session
+    # that logs in through auth_page, renders main_app, jumps to a stage and
+    # toggles checkboxes, against a seeded throwaway database and a synthetic
+    # roadmap. AppTest swaps a process-global mock Runtime on every run, so
+    # concurrent learners are spread over `concurrency` worker processes that
+    # share the database (each with its own caches and write-behind).
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    roadmap = _synthetic_roadmap(stages, topics_per_stage)
+    roadmap_dir = tempfile.mkdtemp()
+    with open(os.path.join(roadmap_dir, "load_test.json"), "w") as f:
+        json.dump({"name": "Load Test", "version": 1, "stages": roadmap}, f)
+
+    # One hash at the real scrypt cost, shared by all seeded users
+    password = "load-test"
+    stored = auth.hash_password(password)
+    path = _temp_db()
+    _seed_users(path, 0)
+    conn = sqlite3.connect(path)
+    conn.executemany(db.INSERT_USER, [(f"user{i}@example.com", stored, json.dumps({}), datetime.now())
+                                      for i in range(users)])
+    conn.executemany(db.UPSERT_TOPIC, [(f"user{i}@example.com", stage, topic, None)
+                                       for i in range(users)
+                                       for stage, topics in _synthetic_progress(roadmap, 3).items()
+                                       for topic in topics])
+    conn.commit()
+    conn.close()
+
+    timings = {"login": [], "render": [], "navigate": [], "toggle": []}
+    errors = []
+    statements = transactions = 0
+    try:
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=concurrency,
+                                 mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = [pool.submit(_load_worker, range(k, users, concurrency), path,
+                                   roadmap_dir, password, toggles, stages)
+                       for k in range(concurrency)]
+            for future in futures:
+                worker_timings, worker_errors, stats = future.result()
+                for kind, samples in worker_timings.items():
+                    timings[kind] += samples
+                errors += worker_errors
+                statements += stats["statements"]
+                transactions += stats["transactions"]
+        elapsed = time.perf_counter() - start
+        return {
+            "users": users, "concurrency": concurrency, "toggles_per_user": toggles,
+            "topics": stages * topics_per_stage,
+            "seconds": round(elapsed, 3),
+            "reruns_per_sec": round(sum(map(len, timings.values())) / elapsed, 2),
+            "db_writes_per_sec": round(statements / elapsed, 2),
+            "db_transactions": transactions,
+            "rerun_latency": {kind: _percentiles(samples) for kind, samples in timings.items()},
+            "all_reruns": _percentiles([t for samples in timings.values() for t in samples]),
+            "errors": errors[:10],
+        }
+    finally:
+        shutil.rmtree(roadmap_dir, ignore_errors=True)
+        _remove_db(path)
+
+# Runs in a fresh interpreter (python -c), so nothing is imported yet:
+# argv is the app path, the roadmap and the number of reruns to time
+_STARTUP_PROBE = '''
+import json, statistics, sys, time
+start = time.time()
+from streamlit.testing.v1 import AppTest
+app, roadmap, reruns = sys.argv[1], sys.argv[2], int(sys.argv[3])
+imported = time.time()
+at = AppTest.from_file(app, default_timeout=120)
+at.session_state.user = "bench@example.com"
+at.session_state.progress = {}
+at.session_state.roadmap_name = roadmap
+at.run()
+rendered = time.time()
+if at.exception:
+    raise SystemExit(at.exception[0].value)
+
+def timed(fn):
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+rerun = statistics.median(timed(at.run) for _ in range(reruns))
+# What every rerun executes before the page itself: main.py's top level
+# and, where there is one, the startup() main() calls first; run inside a
+# script context like Streamlit does
+probe = AppTest.from_string(f"""
+import time
+import streamlit as st
+import db
+@st.cache_resource
+def code():
+    with open({app!r}) as f:
+        return compile(f.read(), {app!r}, "exec")
+start = time.perf_counter()
+module = {{"__name__": "startup_probe", "__file__": {app!r}}}
+exec(code(), module)
+if "startup" in module:
+    module["startup"](db.DB_PATH)
+st.session_state.module_seconds = time.perf_counter() - start
+""", default_timeout=120)
+module = []
+for _ in range(reruns + 1):
+    probe.run()
+    module.append(probe.session_state.module_seconds)
+print(json.dumps({"imported": imported, "rendered": rendered, "rerun": rerun,
+                  "module": statistics.median(module[1:]), "modules": sorted(sys.modules)}))
+'''
+
+def bench_startup(stages=5000, topics_per_stage=20, reruns=20, starts=3):
+    # Time to first render for a new server process (interpreter start to a
+    # logged-in page), with nothing on disk but the roadmap file and again
+    # as a restart; plus the full rerun time and the part of it spent before
+    # the page itself. Medians over `starts` processes, for the default
+    # roadmap and a large synthetic one.
+    import statistics
+    import roadmap_loader
+
+    path = _temp_db()
+    app = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+    roadmap_dir = tempfile.mkdtemp()
+    shutil.copy(roadmap_loader.path_for(roadmap_loader.DEFAULT_ROADMAP), roadmap_dir)
+    with open(os.path.join(roadmap_dir, "large.json"), "w") as f:
+        json.dump({"name": "Large", "version": 1,
+                   "stages": _synthetic_roadmap(stages, topics_per_stage)}, f)
+    env = {**os.environ, "ROADMAP_DB": path, "ROADMAP_DIR": roadmap_dir}
+    results = {}
+    try:
+        for name in (roadmap_loader.DEFAULT_ROADMAP, "large"):
+            for run in ("first_start", "restart"):
+                samples = []
+                for _ in range(starts):
+                    if run == "first_start":
+                        shutil.rmtree(os.path.join(roadmap_dir, "__pycache__"), ignore_errors=True)
+                    start = time.time()
+                    out = subprocess.run([sys.executable, "-c", _STARTUP_PROBE, app, name, str(reruns)],
+                                         env=env, cwd=os.path.dirname(app), capture_output=True,
+                                         text=True, check=True)
+                    probe = json.loads(out.stdout.strip().splitlines()[-1])
+                    samples.append({
+                        "time_to_first_render_ms": (probe["rendered"] - start) * 1000,
+                        "streamlit_import_ms": (probe["imported"] - start) * 1000,
+                        "first_run_ms": (probe["rendered"] - probe["imported"]) * 1000,
+                        "rerun_ms": probe["rerun"] * 1000,
+                        "module_overhead_ms": probe["module"] * 1000,
+                    })
+                results.setdefault(name, {})[run] = {
+                    **{key: round(statistics.median(s[key] for s in samples), 2) for key in samples[0]},
+                    "numpy_loaded": "numpy" in probe["modules"],
+                }
+    finally:
+        shutil.rmtree(roadmap_dir, ignore_errors=True)
+        _remove_db(path)
+    return results
+
+def _run_info():
+    # Enough context to line up results from different commits and machines
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ""
+    return {"commit": commit or None,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform()}
+
+def main():
+    parser = argparse.ArgumentParser(description="Roadmap tracker benchmarks")
+    parser.add_argument("--output", help="also write the results, with commit and run info, to this JSON file")
+    sub = parser.add_subparsers(dest="benchmark", required=True)
+
+    p = sub.add_parser("connections", help="per-call connect vs pooled connections")
+    p.add_argument("--sessions", type=int, default=8)
+    p.add_argument("--ops", type=int, default=500)
+    p.set_defaults(func=lambda a: bench_connections(a.sessions, a.ops))
+
+    p = sub.add_parser("writes", help="direct commits vs the WAL write queue")
+    p.add_argument("--sessions", type=int, default=16)
+    p.add_argument("--ops", type=int, default=200)
+    p.set_defaults(func=lambda a: bench_writes(a.sessions, a.ops))
+
+    p = sub.add_parser("metrics", help="list-scan calculate_progress vs the metrics engine")
+    p.add_argument("--stages", type=int, default=100)
+    p.add_argument("--topics-per-stage", type=int, default=100)
+    p.add_argument("--toggles", type=int, default=1000)
+    p.set_defaults(func=lambda a: bench_metrics(a.stages, a.topics_per_stage, a.toggles))
+
+    p = sub.add_parser("model", help="memory and lookups: nested dicts vs the roadmap model")
+    p.add_argument("--stages", type=int, default=100)
+    p.add_argument("--topics-per-stage", type=int, default=100)
+    p.set_defaults(func=lambda a: bench_model(a.stages, a.topics_per_stage))
+
+    p = sub.add_parser("overrides", help="per-user customized roadmap models: full rebuild vs derived from the base")
+    p.add_argument("--users", type=int, default=256)
+    p.add_argument("--stages", type=int, default=100)
+    p.add_argument("--topics-per-stage", type=int, default=100)
+    p.set_defaults(func=lambda a: bench_overrides(a.users, a.stages, a.topics_per_stage))
+
+    p = sub.add_parser("encoding", help="JSON progress vs the bitset blob encoding")
+    p.add_argument("--stages", type=int, default=100)
+    p.add_argument("--topics-per-stage", type=int, default=100)
+    p.set_defaults(func=lambda a: bench_encoding(a.stages, a.topics_per_stage))
+
+    p = sub.add_parser("render", help="per-stage page payload and render time, eager vs lazy videos")
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=lambda a: bench_render(a.repeat))
+
+    p = sub.add_parser("navigation", help="rerun cost vs stage count: every stage button vs paged navigation")
+    p.add_argument("--stages", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    p.set_defaults(func=lambda a: bench_navigation(tuple(a.stages)))
+
+    p = sub.add_parser("logins", help="scrypt logins/sec at each cost setting")
+    p.add_argument("--threads", type=int, default=4)
+    p.add_argument("--logins", type=int, default=40)
+    p.set_defaults(func=lambda a: bench_logins(a.threads, a.logins))
+
+    p = sub.add_parser("auth", help="real users' login latency under credential stuffing and a sign-up burst, limits off vs on")
+    p.add_argument("--users", type=int, default=24)
+    p.add_argument("--attackers", type=int, default=4)
+    p.add_argument("--signups", type=int, default=16)
+    p.add_argument("--seconds", type=float, default=20.0)
+    p.set_defaults(func=lambda a: bench_auth(a.users, a.attackers, a.signups, a.seconds))
+
+    p = sub.add_parser("user-cache", help="progress loads with and without the shared user cache")
+    p.add_argument("--users", type=int, default=200)
+    p.add_argument("--loads", type=int, default=5000)
+    p.add_argument("--cache-size", type=int, default=50)
+    p.set_defaults(func=lambda a: bench_user_cache(a.users, a.loads, a.cache_size))
+
+    p = sub.add_parser("persistence", help="click save latency, synchronous vs write-behind")
+    p.add_argument("--sessions", type=int, default=16)
+    p.add_argument("--clicks", type=int, default=200)
+    p.set_defaults(func=lambda a: bench_persistence(a.sessions, a.clicks))
+
+    p = sub.add_parser("analytics", help="cohort aggregates: per-user loop vs the NumPy matrix")
+    p.add_argument("--users", type=int, default=2000)
+    p.add_argument("--stages", type=int, default=20)
+    p.add_argument("--topics-per-stage", type=int, default=50)
+    p.set_defaults(func=lambda a: bench_analytics(a.users, a.stages, a.topics_per_stage))
+
+    p = sub.add_parser("forecast", help="finish-date forecast: rescanning events vs rolling stats")
+    p.add_argument("--events", type=int, default=100000)
+    p.set_defaults(func=lambda a: bench_forecast(a.events))
+
+    p = sub.add_parser("search", help="topic/resource search: linear scan vs the inverted index")
+    p.add_argument("--entries", type=int, default=100000)
+    p.add_argument("--queries", type=int, default=200)
+    p.set_defaults(func=lambda a: bench_search(a.entries, queries=a.queries))
+
+    p = sub.add_parser("startup", help="time to first render in a new process and per-rerun module overhead")
+    p.add_argument("--stages", type=int, default=5000, help="stages in the large synthetic roadmap")
+    p.add_argument("--reruns", type=int, default=20)
+    p.add_argument("--starts", type=int, default=3, help="processes started per case")
+    p.set_defaults(func=lambda a: bench_startup(a.stages, reruns=a.reruns, starts=a.starts))
+
+    p = sub.add_parser("load", help="concurrent learners through login, renders and toggles (AppTest)")
+    p.add_argument("--users", type=int, default=20)
+    p.add_argument("--concurrency", type=int, default=4)
+    p.add_argument("--toggles", type=int, default=10)
+    p.add_argument("--stages", type=int, default=10)
+    p.add_argument("--topics-per-stage", type=int, default=20)
+    p.set_defaults(func=lambda a: bench_load(a.users, a.concurrency, a.toggles,
+                                             a.stages, a.topics_per_stage))
+
+    args = parser.parse_args()
+    results = args.func(args)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        params = {k: v for k, v in vars(args).items() if k not in ("func", "output")}
+        with open(args.output, "w") as f:
+            json.dump({**_run_info(), "params": params, "results": results}, f, indent=2)
+            f.write("\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import os
+import threading
+import time
+import uuid
+
+import db
+
+# Multi-process mode (ROADMAP_MULTI_PROCESS=1): several Streamlit workers
+# share roadmap.db, each with its own process-wide caches. Every write other
+# workers may have cached also inserts a change_log row in the same
+# transaction, as (scope, key, origin):
+#   "progress", email   progress, pace and the event log
+#   "user", email       the users row (sign-up, password rehash)
+#   "overrides", email  roadmap customizations
+#   "*", "*"            anything (bulk imports); drop every cache
+# A watcher thread per process polls for rows past the last ID it has seen,
+# runs the local invalidation listeners for other workers' changes and
+# records the latest change per key, which sessions compare against what
+# they loaded. A worker is at most about FLUSH_INTERVAL + POLL_INTERVAL
+# behind another one.
+ENABLED = os.environ.get("ROADMAP_MULTI_PROCESS", "0") == "1"
+POLL_INTERVAL = float(os.environ.get("ROADMAP_POLL_INTERVAL", "0.5"))
+POLL_BATCH = 1000
+# Change rows older than this are pruned; a worker that falls further
+# behind than that (e.g. suspended) drops all of its caches instead
+RETENTION = float(os.environ.get("ROADMAP_CHANGE_RETENTION", "3600"))
+
+WORKER = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+_listeners = {}
+_versions = {}
+_lock = threading.Lock()
+_last_id = None
+_generation = 0
+
+
+def origin(session=None):
+    return WORKER if session is None else f"{WORKER}/{session}"
+
+def is_local(change_origin):
+    return change_origin == WORKER or change_origin.startswith(WORKER + "/")
+
+def notify(scope, key, session=None):
+    # -> statements to add to the write that changes (scope, key)
+    if not ENABLED:
+        return []
+    return [(db.INSERT_CHANGE, (scope, key, origin(session), time.time()))]
+
+def on_change(scope, listener):
+    # listener(key) runs in the watcher thread for other workers' changes;
+    # "*" listeners run when every cache has to go
+    _listeners.setdefault(scope, []).append(listener)
+
+def version(scope, key):
+    # -> (change ID, origin) of the newest change seen, or None
+    return _versions.get((scope, key))
+
+def generation():
+    # Bumped whenever every cache was dropped; sessions reload everything
+    return _generation
+
+def poll(conn):
+    # Apply every change row past the last seen; returns how many
+    global _last_id
+    with _lock:
+        if _last_id is None:
+            # Start from now: this process has not cached anything yet
+            _last_id = conn.execute(db.SELECT_CHANGE_RANGE).fetchone()[1]
+            return 0
+        rows = conn.execute(db.SELECT_CHANGES_AFTER, (_last_id, POLL_BATCH)).fetchall()
+        if rows and rows[0][0] > _last_id + 1:
+            first = conn.execute(db.SELECT_CHANGE_RANGE).fetchone()[0]
+            if first > _last_id + 1:
+                _drop_all()
+        for change_id, scope, key, change_origin in rows:
+            if scope == "*":
+                _drop_all()
+            elif not is_local(change_origin):
+                for listener in _listeners.get(scope, ()):
+                    listener(key)
+            _versions[(scope, key)] = (change_id, change_origin)
+        if rows:
+            _last_id = rows[-1][0]
+        return len(rows)
+
+def _drop_all():
+    global _generation
+    for listener in _listeners.get("*", ()):
+        listener("*")
+    _generation += 1
+
+
+class Watcher:
+    def __init__(self, interval=POLL_INTERVAL):
+        self.interval = interval
+        self.stats = {"polls": 0, "changes": 0, "pruned": 0, "failed": 0}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="roadmap-watcher", daemon=True)
+
+    def start(self):
+        self.run_once()
+        self._thread.start()
+        return self
+
+    def _run(self):
+        prune_every = max(int(60 / self.interval), 1)
+        while not self._stop.wait(self.interval):
+            self.run_once()
+            if self.stats["polls"] % prune_every == 0:
+                self.prune()
+
+    def run_once(self):
+        try:
+            with db.connection() as conn:
+                self.stats["changes"] += poll(conn)
+        except Exception:
+            self.stats["failed"] += 1
+        self.stats["polls"] += 1
+
+    def prune(self):
+        try:
+            db.write(db.DELETE_CHANGES_BEFORE, (time.time() - RETENTION,))
+            self.stats["pruned"] += 1
+        except Exception:
+            self.stats["failed"] += 1
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,657 @@
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Shared data-access layer: every Streamlit session (and every rerun) borrows a
+# long-lived connection from one process-wide pool instead of paying for
+# sqlite3.connect()/close() on each call.
+DB_PATH = os.environ.get("ROADMAP_DB", "roadmap.db")
+POOL_SIZE = int(os.environ.get("ROADMAP_DB_POOL_SIZE", "8"))
+POOL_TIMEOUT = float(os.environ.get("ROADMAP_DB_POOL_TIMEOUT", "30"))
+
+# Storage engine tuning. WAL lets readers run alongside the single writer, and
+# synchronous=NORMAL is durable across application crashes in WAL mode.
+WAL_MODE = os.environ.get("ROADMAP_DB_WAL", "1") == "1"
+MMAP_SIZE = int(os.environ.get("ROADMAP_DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+WRITE_BATCH_SIZE = int(os.environ.get("ROADMAP_DB_WRITE_BATCH", "256"))
+
+# Write-behind for progress saves: clicks only queue their statements, and a
+# background flusher commits them every FLUSH_INTERVAL seconds or once
+# FLUSH_SIZE updates are pending. ROADMAP_WRITE_BEHIND=0 writes synchronously.
+WRITE_BEHIND = os.environ.get("ROADMAP_WRITE_BEHIND", "1") == "1"
+FLUSH_INTERVAL = float(os.environ.get("ROADMAP_FLUSH_INTERVAL", "1.0"))
+FLUSH_SIZE = int(os.environ.get("ROADMAP_FLUSH_SIZE", "500"))
+FLUSH_RETRIES = int(os.environ.get("ROADMAP_FLUSH_RETRIES", "3"))
+
+# "rows" keeps one progress row per topic; "bitset" stores each user's
+# progress as one compact blob (see progress_codec.py); "events" derives it
+# from the toggle log, folded into per-user snapshots (see event_log.py).
+PROGRESS_ENCODING = os.environ.get("ROADMAP_PROGRESS_ENCODING", "rows")
+
+# SQL is kept in module constants so the exact same text is reused on every
+# call and served from each connection's prepared-statement cache.
+CREATE_USERS = '''CREATE TABLE IF NOT EXISTS users
+                 (email TEXT PRIMARY KEY,
+                  password TEXT,
+                  progress TEXT,
+                  created_at TIMESTAMP)'''
+INSERT_USER = 'INSERT INTO users VALUES (?,?,?,?)'
+SELECT_USER = 'SELECT * FROM users WHERE email = ?'
+SELECT_ALL_EMAILS = 'SELECT email FROM users'
+# Bulk export/import (transfer.py)
+SELECT_ALL_USERS = 'SELECT email, password, created_at FROM users'
+INSERT_USER_IGNORE = 'INSERT OR IGNORE INTO users VALUES (?,?,?,?)'
+UPDATE_PASSWORD = 'UPDATE users SET password = ? WHERE email = ?'
+
+# Normalized progress: one row per completed topic, so a toggle is a single
+# upsert/delete and the cohort dashboard reads every user in one query
+# (SELECT_ALL_PROGRESS, see analytics.py).
+# users.progress is no longer written; it is kept only so a rollback can read it.
+SCHEMA_VERSION = 6
+CREATE_PROGRESS = '''CREATE TABLE IF NOT EXISTS progress
+                    (email TEXT NOT NULL,
+                     stage TEXT NOT NULL,
+                     topic TEXT NOT NULL,
+                     completed_at TIMESTAMP,
+                     PRIMARY KEY (email, stage, topic)) WITHOUT ROWID'''
+CREATE_PROGRESS_TOPIC_INDEX = '''CREATE INDEX IF NOT EXISTS idx_progress_stage_topic
+                                ON progress (stage, topic)'''
+UPSERT_TOPIC = '''INSERT INTO progress (email, stage, topic, completed_at) VALUES (?,?,?,?)
+                 ON CONFLICT (email, stage, topic) DO NOTHING'''
+DELETE_TOPIC = 'DELETE FROM progress WHERE email = ? AND stage = ? AND topic = ?'
+DELETE_USER_PROGRESS = 'DELETE FROM progress WHERE email = ?'
+SELECT_PROGRESS = 'SELECT stage, topic FROM progress WHERE email = ?'
+SELECT_ALL_PROGRESS_ROWS = 'SELECT email, stage, topic, completed_at FROM progress'
+# Cohort analytics: the caller fills temp.cohort_topics with its roadmap's
+# topic IDs, so the bulk read returns each user's completed topic IDs as one
+# comma-separated string (progress is scanned in primary key order, so the
+# GROUP BY needs no sort)
+CREATE_COHORT_TOPICS = '''CREATE TEMP TABLE IF NOT EXISTS cohort_topics
+                         (stage TEXT NOT NULL,
+                          topic TEXT NOT NULL,
+                          tid INTEGER NOT NULL,
+                          PRIMARY KEY (stage, topic)) WITHOUT ROWID'''
+CLEAR_COHORT_TOPICS = 'DELETE FROM temp.cohort_topics'
+INSERT_COHORT_TOPIC = 'INSERT OR IGNORE INTO temp.cohort_topics VALUES (?,?,?)'
+SELECT_ALL_PROGRESS = '''SELECT p.email, group_concat(t.tid) FROM progress p
+                        JOIN temp.cohort_topics t ON t.stage = p.stage AND t.topic = p.topic
+                        GROUP BY p.email'''
+
+# Bitset progress encoding: stable topic numbers and one blob per user
+CREATE_TOPIC_IDS = '''CREATE TABLE IF NOT EXISTS topic_ids
+                     (stage TEXT NOT NULL,
+                      topic TEXT NOT NULL,
+                      stage_id INTEGER NOT NULL,
+                      topic_no INTEGER NOT NULL,
+                      PRIMARY KEY (stage, topic),
+                      UNIQUE (stage_id, topic_no))'''
+CREATE_PROGRESS_BITS = '''CREATE TABLE IF NOT EXISTS progress_bits
+                         (email TEXT PRIMARY KEY,
+                          bits BLOB NOT NULL)'''
+INSERT_TOPIC_ID = 'INSERT OR IGNORE INTO topic_ids VALUES (?,?,?,?)'
+SELECT_TOPIC_IDS = 'SELECT stage, topic, stage_id, topic_no FROM topic_ids'
+UPSERT_PROGRESS_BITS = '''INSERT INTO progress_bits (email, bits) VALUES (?,?)
+                         ON CONFLICT (email) DO UPDATE SET bits = excluded.bits'''
+SELECT_PROGRESS_BITS = 'SELECT bits FROM progress_bits WHERE email = ?'
+SELECT_ALL_PROGRESS_BITS = 'SELECT email, bits FROM progress_bits'
+
+# Per-user roadmap customizations, as a JSON list of deltas (see overrides.py)
+CREATE_OVERRIDES = '''CREATE TABLE IF NOT EXISTS roadmap_overrides
+                     (email TEXT NOT NULL,
+                      roadmap TEXT NOT NULL,
+                      deltas TEXT NOT NULL,
+                      updated_at TIMESTAMP,
+                      PRIMARY KEY (email, roadmap))'''
+UPSERT_OVERRIDES = '''INSERT INTO roadmap_overrides (email, roadmap, deltas, updated_at)
+                     VALUES (?,?,?,?)
+                     ON CONFLICT (email, roadmap) DO UPDATE
+                     SET deltas = excluded.deltas, updated_at = excluded.updated_at'''
+SELECT_OVERRIDES = 'SELECT deltas FROM roadmap_overrides WHERE email = ? AND roadmap = ?'
+DELETE_OVERRIDES = 'DELETE FROM roadmap_overrides WHERE email = ? AND roadmap = ?'
+
+# Append-only log of topic toggles, plus each user's rolling pace statistics
+# (see forecast.py) so forecasts never rescan the log
+CREATE_EVENTS = '''CREATE TABLE IF NOT EXISTS progress_events
+                  (id INTEGER PRIMARY KEY,
+                   email TEXT NOT NULL,
+                   stage TEXT NOT NULL,
+                   topic TEXT NOT NULL,
+                   done INTEGER NOT NULL,
+                   hours INTEGER NOT NULL,
+                   at TIMESTAMP NOT NULL)'''
+CREATE_EVENTS_EMAIL_INDEX = '''CREATE INDEX IF NOT EXISTS idx_progress_events_email
+                              ON progress_events (email, id)'''
+INSERT_EVENT = '''INSERT INTO progress_events (email, stage, topic, done, hours, at)
+                 VALUES (?,?,?,?,?,?)'''
+CREATE_PACE = '''CREATE TABLE IF NOT EXISTS progress_pace
+                (email TEXT PRIMARY KEY,
+                 first_at REAL NOT NULL,
+                 last_at REAL NOT NULL,
+                 hours REAL NOT NULL,
+                 seconds REAL NOT NULL,
+                 events INTEGER NOT NULL) WITHOUT ROWID'''
+UPSERT_PACE = '''INSERT INTO progress_pace VALUES (?,?,?,?,?,?)
+                ON CONFLICT (email) DO UPDATE
+                SET first_at = excluded.first_at, last_at = excluded.last_at,
+                    hours = excluded.hours, seconds = excluded.seconds,
+                    events = excluded.events'''
+SELECT_PACE = 'SELECT first_at, last_at, hours, seconds, events FROM progress_pace WHERE email = ?'
+SELECT_EVENTS_AFTER = '''SELECT id, stage, topic, done FROM progress_events
+                        WHERE email = ? AND id > ? ORDER BY id'''
+SELECT_EVENTS_BETWEEN = '''SELECT id, stage, topic, done FROM progress_events
+                          WHERE email = ? AND id > ? AND id <= ? ORDER BY id'''
+SELECT_RECENT_EVENTS = '''SELECT id, stage, topic, done, hours, at FROM progress_events
+                         WHERE email = ? ORDER BY id DESC LIMIT ?'''
+
+# Snapshot of each user's progress as of event `event_id` (progress_codec
+# blob); loading reads it plus the events after it. Outside the "events"
+# mode the only snapshot is the one at event 0, taken before a user's
+# first logged change, which history replays start from.
+CREATE_SNAPSHOTS = '''CREATE TABLE IF NOT EXISTS progress_snapshots
+                     (email TEXT PRIMARY KEY,
+                      event_id INTEGER NOT NULL,
+                      bits BLOB NOT NULL,
+                      taken_at TIMESTAMP) WITHOUT ROWID'''
+UPSERT_SNAPSHOT = '''INSERT INTO progress_snapshots VALUES (?,?,?,?)
+                    ON CONFLICT (email) DO UPDATE
+                    SET event_id = excluded.event_id, bits = excluded.bits,
+                        taken_at = excluded.taken_at
+                    WHERE excluded.event_id > progress_snapshots.event_id'''
+SELECT_SNAPSHOT = 'SELECT event_id, bits FROM progress_snapshots WHERE email = ?'
+# Users whose tail of events since their snapshot has reached a length
+SELECT_LONG_TAILS = '''SELECT e.email FROM progress_events e
+                      LEFT JOIN progress_snapshots s ON s.email = e.email
+                      WHERE e.id > COALESCE(s.event_id, 0)
+                      GROUP BY e.email HAVING COUNT(*) >= ?'''
+
+# Multi-process mode (coherence.py): every write that other workers may have
+# cached also inserts a change row in the same transaction. The row ID is
+# the database's version counter; workers poll for IDs past the last seen.
+CREATE_CHANGES = '''CREATE TABLE IF NOT EXISTS change_log
+                   (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    scope TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    origin TEXT NOT NULL,
+                    at REAL NOT NULL)'''
+INSERT_CHANGE = 'INSERT INTO change_log (scope, key, origin, at) VALUES (?,?,?,?)'
+SELECT_CHANGES_AFTER = '''SELECT id, scope, key, origin FROM change_log
+                         WHERE id > ? ORDER BY id LIMIT ?'''
+SELECT_CHANGE_RANGE = 'SELECT COALESCE(MIN(id), 0), COALESCE(MAX(id), 0) FROM change_log'
+DELETE_CHANGES_BEFORE = 'DELETE FROM change_log WHERE at < ?'
+# Topic numbers assigned by SQLite under the write lock, so two workers can
+# never hand out the same number; the caller reads back what was stored
+INSERT_TOPIC_ID_NEXT = '''INSERT OR IGNORE INTO topic_ids
+                         SELECT ?1, ?2,
+                                COALESCE((SELECT stage_id FROM topic_ids WHERE stage = ?1),
+                                         (SELECT COALESCE(MAX(stage_id) + 1, 0) FROM topic_ids)),
+                                COALESCE((SELECT MAX(topic_no) + 1 FROM topic_ids WHERE stage = ?1), 0)'''
+SELECT_TOPIC_ID = 'SELECT stage_id, topic_no FROM topic_ids WHERE stage = ? AND topic = ?'
+
+STATEMENT_CACHE_SIZE = 256
+
+def connect(path=DB_PATH, timeout=POOL_TIMEOUT):
+    conn = sqlite3.connect(path,
+                           timeout=timeout,
+                           check_same_thread=False,
+                           cached_statements=STATEMENT_CACHE_SIZE)
+    conn.execute(f"PRAGMA busy_timeout = {int(timeout * 1000)}")
+    if WAL_MODE:
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    return conn
+
+
+class ConnectionPool:
+    def __init__(self, path=DB_PATH, size=POOL_SIZE, timeout=POOL_TIMEOUT):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+        self._all = []
+        self.stats = {"connects": 0, "checkouts": 0, "waits": 0}
+
+    def _connect(self):
+        conn = connect(self.path, self.timeout)
+        self.stats["connects"] += 1
+        self._all.append(conn)
+        return conn
+
+    def _acquire(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                if len(self._all) < self.size:
+                    conn = self._connect()
+                else:
+                    conn = None
+            if conn is None:
+                self.stats["waits"] += 1
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise sqlite3.OperationalError(
+                        f"No free connection in pool after {self.timeout}s")
+        self.stats["checkouts"] += 1
+        return conn
+
+    @contextmanager
+    def connection(self):
+        # Commits on success and rolls back on error, like `with conn:`, but
+        # hands the connection back to the pool instead of closing it.
+        conn = self._acquire()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait()
+                except queue.Empty:
+                    break
+            for conn in self._all:
+                conn.close()
+            self._all = []
+
+
+class _Write:
+    __slots__ = ("statements", "done", "error")
+
+    def __init__(self, statements):
+        self.statements = statements
+        self.done = threading.Event()
+        self.error = None
+
+
+class WriteQueue:
+    # One background thread owns the only writing connection. Whatever is
+    # pending when it wakes up is applied in a single transaction, so many
+    # sessions saving at once cost one commit instead of one lock fight each.
+    def __init__(self, path=DB_PATH, max_batch=WRITE_BATCH_SIZE):
+        self.path = path
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.stats = {"writes": 0, "statements": 0, "transactions": 0, "failed": 0}
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run,
+                                                    name="roadmap-db-writer",
+                                                    daemon=True)
+                    self._thread.start()
+
+    def submit(self, sql, params=(), wait=True):
+        return self.submit_many([(sql, params)], wait)
+
+    def submit_many(self, statements, wait=True):
+        # All statements of one submission commit or fail together
+        item = _Write(statements)
+        self._ensure_started()
+        self._queue.put(item)
+        if wait:
+            item.done.wait()
+            if item.error is not None:
+                raise item.error
+        return item
+
+    def _run(self):
+        conn = connect(self.path)
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                batch = [item]
+                stop = False
+                while len(batch) < self.max_batch:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stop = True
+                        break
+                    batch.append(item)
+                self._apply(conn, batch)
+                if stop:
+                    break
+        finally:
+            conn.close()
+
+    def _apply(self, conn, batch):
+        # Each submission runs under a savepoint, so one that breaks a
+        # constraint (e.g. a duplicate sign-up) is undone and reported alone
+        # while the rest of the batch still commits together
+        rejected = []
+        try:
+            conn.execute("BEGIN")
+            for item in batch:
+                conn.execute("SAVEPOINT submission")
+                try:
+                    for sql, params in item.statements:
+                        conn.execute(sql, params)
+                except sqlite3.IntegrityError as e:
+                    conn.execute("ROLLBACK TO submission")
+                    rejected.append((item, e))
+                conn.execute("RELEASE submission")
+            conn.commit()
+            self.stats["transactions"] += 1
+            for item, e in rejected:
+                item.error = e
+            self.stats["failed"] += len(rejected)
+        except Exception:
+            # Anything else (a bad statement, a full disk) rolls the batch
+            # back: replay it one submission at a time and report per item
+            conn.rollback()
+            for item in batch:
+                try:
+                    with conn:
+                        for sql, params in item.statements:
+                            conn.execute(sql, params)
+                    self.stats["transactions"] += 1
+                except Exception as e:
+                    item.error = e
+                    self.stats["failed"] += 1
+        self.stats["writes"] += len(batch)
+        self.stats["statements"] += sum(len(item.statements) for item in batch)
+        for item in batch:
+            item.done.set()
+
+    def close(self):
+        with self._lock:
+            if self._thread is not None:
+                self._queue.put(None)
+                self._thread.join()
+                self._thread = None
+
+
+class WriteBehind:
+    # Pending updates are keyed by email first, so that a newer update
+    # replaces an older one for the same thing: (email, stage, topic) for a
+    # single topic flip, (email,) for a user's whole progress, which also
+    # drops that user's pending flips, and (email, name) for other per-user
+    # rows. Each update is its own WriteQueue submission, so a flush still
+    # commits in one transaction but one failing update is rolled back and
+    # retried alone; after FLUSH_RETRIES failures it is dropped.
+    def __init__(self, writer, interval=FLUSH_INTERVAL, max_pending=FLUSH_SIZE,
+                 retries=FLUSH_RETRIES):
+        self.writer = writer
+        self.interval = interval
+        self.max_pending = max_pending
+        self.retries = retries
+        self._pending = OrderedDict()   # key -> (statements, failures)
+        self._appended = []             # [(email, statements, failures)]
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = None
+        self.listeners = []
+        self.stats = {"updates": 0, "coalesced": 0, "flushes": 0, "statements": 0,
+                      "failed": 0, "dropped": 0}
+
+    def put(self, items):
+        # items: [(key, [(sql, params), ...]), ...]
+        with self._lock:
+            for key, statements in items:
+                if key in self._pending:
+                    del self._pending[key]
+                    self.stats["coalesced"] += 1
+                if len(key) == 1:
+                    for old in [k for k in self._pending if len(k) == 3 and k[0] == key[0]]:
+                        del self._pending[old]
+                        self.stats["coalesced"] += 1
+                self._pending[key] = (statements, 0)
+                self.stats["updates"] += 1
+            full = self.pending() >= self.max_pending
+            if self._thread is None and not self._stopped:
+                self._thread = threading.Thread(target=self._run,
+                                                name="roadmap-write-behind",
+                                                daemon=True)
+                self._thread.start()
+        if full:
+            self._wake.set()
+
+    def append(self, email, statements):
+        # Unkeyed statements (log inserts) that never replace each other;
+        # they commit in the same transaction as the next flush
+        with self._lock:
+            self._appended.append((email, statements, 0))
+            self.stats["updates"] += len(statements)
+        self.put([])
+
+    def pending(self):
+        return len(self._pending) + len(self._appended)
+
+    def _run(self):
+        while not self._stopped:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                # Already counted and re-queued by flush(); retry next round
+                pass
+
+    def flush(self, email=None):
+        # Commit what is pending, or only `email`'s updates; raises the first
+        # error after re-queueing whatever failed
+        with self._flush_lock:
+            with self._lock:
+                if email is None:
+                    batch, self._pending = self._pending, OrderedDict()
+                    appended, self._appended = self._appended, []
+                else:
+                    batch = OrderedDict((k, self._pending.pop(k))
+                                        for k in [k for k in self._pending if k[0] == email])
+                    appended = [entry for entry in self._appended if entry[0] == email]
+                    self._appended = [entry for entry in self._appended if entry[0] != email]
+            if not batch and not appended:
+                return 0
+            # (key, email, statements, failures); appended entries have no key
+            updates = ([(key, key[0], statements, failures)
+                        for key, (statements, failures) in batch.items()] +
+                       [(None,) + entry for entry in appended])
+            submitted = [self.writer.submit_many(statements, wait=False)
+                         for _, _, statements, _ in updates]
+            retry, flushed, error = [], set(), None
+            for update, item in zip(updates, submitted):
+                item.done.wait()
+                if item.error is None:
+                    flushed.add(update[1])
+                    self.stats["statements"] += len(update[2])
+                    continue
+                error = error or item.error
+                self.stats["failed"] += 1
+                if update[3] + 1 < self.retries:
+                    retry.append(update)
+                else:
+                    self.stats["dropped"] += 1
+            if retry:
+                # Put them back unless something newer replaced them
+                with self._lock:
+                    for key, owner, statements, failures in retry:
+                        if key is not None:
+                            self._pending.setdefault(key, (statements, failures + 1))
+                    self._appended[:0] = [(owner, statements, failures + 1)
+                                          for key, owner, statements, failures in retry
+                                          if key is None]
+            self.stats["flushes"] += 1
+            for listener in self.listeners:
+                listener(flushed)
+            if error is not None:
+                raise error
+            return len(updates)
+
+    def close(self):
+        self._stopped = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+
+_pool = None
+_writer = None
+_write_behind = None
+_flush_listeners = []
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_PATH)
+    return _pool
+
+def get_writer():
+    global _writer
+    if _writer is None:
+        with _pool_lock:
+            if _writer is None:
+                _writer = WriteQueue(DB_PATH)
+                atexit.register(_writer.close)
+    return _writer
+
+def get_write_behind():
+    global _write_behind
+    if _write_behind is None:
+        writer = get_writer()
+        with _pool_lock:
+            if _write_behind is None:
+                # Registered after the writer, so atexit flushes it first
+                _write_behind = WriteBehind(writer)
+                _write_behind.listeners = _flush_listeners
+                atexit.register(_write_behind.close)
+    return _write_behind
+
+def configure(path):
+    # Point the shared pool and writer at another database file (benchmarks
+    # and load tests use throwaway databases)
+    global DB_PATH, _pool, _writer, _write_behind
+    with _pool_lock:
+        if _write_behind is not None:
+            _write_behind.close()
+        if _writer is not None:
+            _writer.close()
+        if _pool is not None:
+            _pool.close()
+        DB_PATH = path
+        _pool = _writer = _write_behind = None
+
+def connection():
+    return get_pool().connection()
+
+def write(sql, params=(), wait=True):
+    return get_writer().submit(sql, params, wait)
+
+def write_many(statements, wait=True):
+    return get_writer().submit_many(statements, wait)
+
+def defer(items):
+    # Queue keyed updates for the write-behind flusher (see WriteBehind), or
+    # write them now when write-behind is off
+    if not WRITE_BEHIND:
+        return write_many([statement for _, statements in items for statement in statements])
+    get_write_behind().put(items)
+
+def append(email, statements):
+    # Queue unkeyed statements (e.g. event log inserts) the same way
+    if not WRITE_BEHIND:
+        return write_many(statements)
+    get_write_behind().append(email, statements)
+
+def on_flush(callback):
+    # callback(emails) runs on the flushing thread after deferred updates
+    # for those users have committed
+    _flush_listeners.append(callback)
+
+def flush(email=None):
+    # Commit deferred updates now: one user's before a read that must see
+    # them, or everyone's (shutdown, background jobs)
+    if _write_behind is not None:
+        _write_behind.flush(email)
+
+# Schema migrations, tracked with PRAGMA user_version
+def _migrate_progress_table(conn):
+    # One-time copy of the JSON blobs in users.progress into per-topic rows.
+    # Blobs may repeat a topic, which the primary key quietly collapses.
+    conn.execute(CREATE_PROGRESS)
+    conn.execute(CREATE_PROGRESS_TOPIC_INDEX)
+    rows = conn.execute('SELECT email, progress FROM users WHERE progress IS NOT NULL')
+    conn.executemany(UPSERT_TOPIC,
+                     ((email, stage, topic, None)
+                      for email, blob in rows.fetchall()
+                      for stage, topics in json.loads(blob or "{}").items()
+                      for topic in topics))
+
+def _create_bitset_tables(conn):
+    conn.execute(CREATE_TOPIC_IDS)
+    conn.execute(CREATE_PROGRESS_BITS)
+
+def _create_overrides_table(conn):
+    conn.execute(CREATE_OVERRIDES)
+
+def _create_event_tables(conn):
+    conn.execute(CREATE_EVENTS)
+    conn.execute(CREATE_EVENTS_EMAIL_INDEX)
+    conn.execute(CREATE_PACE)
+
+def _create_snapshots_table(conn):
+    conn.execute(CREATE_SNAPSHOTS)
+
+def _create_changes_table(conn):
+    conn.execute(CREATE_CHANGES)
+
+MIGRATIONS = {
+    1: _migrate_progress_table,
+    2: _create_bitset_tables,
+    3: _create_overrides_table,
+    4: _create_event_tables,
+    5: _create_snapshots_table,
+    6: _create_changes_table,
+}
+
+def migrate(conn):
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    for version in sorted(MIGRATIONS):
+        if version > current:
+            MIGRATIONS[version](conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def init_db():
+    with connection() as conn:
+        conn.execute(CREATE_USERS)
+        migrate(conn)
+
+if __name__ == "__main__":
+    # Migrate an existing database file in place: python db.py [path]
+    import sys
+    path = sys.argv[1] if len(sys.argv) > 1 else DB_PATH
+    conn = connect(path)
+    with conn:
+        conn.execute(CREATE_USERS)
+        version = migrate(conn)
+    conn.close()
+    print(f"{path} is at schema version {version}")
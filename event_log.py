@@ -0,0 +1,87 @@
+import os
+import threading
+from datetime import datetime
+
+import db
+import progress_codec
+
+# Progress as an append-only log. Every toggle is a progress_events row
+# (written by main.record_changes); a user's current progress is their
+# latest snapshot plus the events after it. The compactor folds long tails
+# into fresh snapshots, so a load reads one snapshot and at most about
+# COMPACT_EVENTS events. Events are never deleted, which keeps the full
+# history for auditing, undo and time travel: load(..., to_id=) replays
+# it forward to any past event.
+COMPACT_EVENTS = int(os.environ.get("ROADMAP_COMPACT_EVENTS", "32"))
+COMPACT_INTERVAL = float(os.environ.get("ROADMAP_COMPACT_INTERVAL", "300"))
+
+
+def apply(progress, events):
+    # Fold (id, stage, topic, done, ...) events into {stage: [topics]}
+    for event in events:
+        stage, topic, done = event[1], event[2], event[3]
+        topics = progress.setdefault(stage, [])
+        if done and topic not in topics:
+            topics.append(topic)
+        elif not done and topic in topics:
+            topics.remove(topic)
+    return progress
+
+def load(conn, email, registry, base, to_id=None):
+    # -> (progress, id of the last event folded in). Users without a
+    # snapshot yet start from `base(email, conn)`, the stored progress
+    # from before the log; replaying events over it is idempotent.
+    # With `to_id`, the progress right after that event: replayed forward
+    # from a snapshot no newer than it, or from `base`. Events carry the
+    # absolute `done`, so one logged by a stale tab (checking an already
+    # done topic) replays as the no-op it was.
+    row = conn.execute(db.SELECT_SNAPSHOT, (email,)).fetchone()
+    if row and (to_id is None or row[0] <= to_id):
+        after, progress = row[0], progress_codec.decode(row[1], registry)
+    else:
+        after, progress = 0, base(email, conn)
+    if to_id is None:
+        events = conn.execute(db.SELECT_EVENTS_AFTER, (email, after)).fetchall()
+    else:
+        events = conn.execute(db.SELECT_EVENTS_BETWEEN, (email, after, to_id)).fetchall()
+    return apply(progress, events), events[-1][0] if events else after
+
+def compact(registry, base, min_events=COMPACT_EVENTS):
+    # Snapshot every user whose tail reached `min_events`; returns how many
+    with db.connection() as conn:
+        emails = [email for (email,) in conn.execute(db.SELECT_LONG_TAILS, (min_events,))]
+    for email in emails:
+        with db.connection() as conn:
+            progress, event_id = load(conn, email, registry, base)
+        db.write(db.UPSERT_SNAPSHOT,
+                 (email, event_id, progress_codec.encode(progress, registry), datetime.now()))
+    return len(emails)
+
+
+class Compactor:
+    def __init__(self, registry, base, interval=COMPACT_INTERVAL):
+        self.registry = registry
+        self.base = base
+        self.interval = interval
+        self.stats = {"runs": 0, "snapshots": 0, "failed": 0}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="roadmap-compactor", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+    def run_once(self):
+        try:
+            db.flush()
+            self.stats["snapshots"] += compact(self.registry, self.base)
+        except Exception:
+            self.stats["failed"] += 1
+        self.stats["runs"] += 1
+
+    def stop(self):
+        self._stop.set()
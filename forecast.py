@@ -0,0 +1,85 @@
+import os
+import time
+from datetime import datetime, timedelta
+
+# Completion forecasts from a user's toggle history. Instead of rescanning
+# progress_events, each user keeps exponentially decayed sums of hours
+# completed and time elapsed, updated in O(1) per toggle. Their ratio is the
+# recent pace: older activity fades with a half-life of HALF_LIFE_DAYS, and
+# idle time since the last toggle slows the pace down.
+HALF_LIFE_DAYS = float(os.environ.get("ROADMAP_PACE_HALF_LIFE_DAYS", "14"))
+# Below this much history a pace is too noisy to project from
+MIN_EVENTS = 3
+MIN_SECONDS = 3600
+# Slower than this (a few minutes a week) is idleness rather than a pace,
+# and finish dates further out than MAX_DAYS are not shown
+MIN_PER_DAY = 0.01
+MAX_DAYS = 100 * 365
+DAY = 86400
+
+
+class Pace:
+    __slots__ = ("first_at", "last_at", "hours", "seconds", "events")
+
+    def __init__(self, first_at=None, last_at=None, hours=0.0, seconds=0.0, events=0):
+        self.first_at = first_at
+        self.last_at = last_at
+        self.hours = hours
+        self.seconds = seconds
+        self.events = events
+
+    def as_row(self, email):
+        return (email, self.first_at, self.last_at, self.hours, self.seconds, self.events)
+
+    def _decay(self, now):
+        return 0.5 ** ((now - self.last_at) / (HALF_LIFE_DAYS * DAY))
+
+    def record(self, hours, at=None):
+        # One toggle: +hours for a completed topic, -hours when un-checked
+        at = time.time() if at is None else at
+        if self.last_at is None:
+            self.first_at = self.last_at = at
+        else:
+            decay = self._decay(at)
+            self.hours *= decay
+            self.seconds = self.seconds * decay + max(at - self.last_at, 0)
+            self.last_at = at
+        self.hours += hours
+        self.events += 1
+
+    def per_day(self, now=None):
+        # Recent hours completed per day, or None without enough history
+        if self.events < MIN_EVENTS:
+            return None
+        now = time.time() if now is None else now
+        decay = self._decay(now)
+        seconds = self.seconds * decay + max(now - self.last_at, 0)
+        if seconds < MIN_SECONDS:
+            return None
+        per_day = self.hours * decay / seconds * DAY
+        return per_day if per_day >= MIN_PER_DAY else None
+
+
+def project(pace, metrics, stage=None, now=None):
+    # Finish dates assuming the recent pace holds and stages are worked
+    # through in roadmap order: {"per_day": h, "finish": dt, "stage_finish":
+    # dt}, where stage_finish is for `stage` and None once it is done. Only
+    # the two dates shown are computed, from the metrics engine's running
+    # totals: O(log stages) whatever the roadmap size.
+    now = time.time() if now is None else now
+    per_day = pace.per_day(now)
+    if not per_day:
+        return {"per_day": per_day, "finish": None, "stage_finish": None}
+    start = datetime.fromtimestamp(now)
+    stage_finish = None
+    if stage is not None:
+        i = metrics.model.stage_id(stage)
+        if metrics.model.stage_hours[i] > metrics.completed_hours[i]:
+            stage_finish = _finish(start, metrics.remaining_through(i), per_day)
+    return {"per_day": per_day, "finish": _finish(start, metrics.total()["remaining"], per_day),
+            "stage_finish": stage_finish}
+
+def _finish(start, hours, per_day):
+    # None past MAX_DAYS, which also keeps the date inside datetime's range
+    days = hours / per_day
+    return start + timedelta(days=days) if days <= MAX_DAYS else None
@@ -0,0 +1,174 @@
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# Hot-path timing and counters. Off unless ROADMAP_PROFILE=1, in which case
+# @timed functions and section() blocks add their wall time to process-wide
+# totals and to a breakdown of the current rerun. When off, @timed returns
+# the function itself and section() a shared no-op context, so the only cost
+# is one attribute lookup per section.
+#   ROADMAP_METRICS_FILE=metrics.prom   rewrite this file every interval
+#   ROADMAP_METRICS_PORT=9464           serve /metrics on 127.0.0.1
+ENABLED = os.environ.get("ROADMAP_PROFILE", os.environ.get("ROADMAP_RENDER_TIMINGS", "0")) == "1"
+METRICS_FILE = os.environ.get("ROADMAP_METRICS_FILE")
+METRICS_PORT = int(os.environ.get("ROADMAP_METRICS_PORT", "0"))
+EXPORT_INTERVAL = float(os.environ.get("ROADMAP_METRICS_INTERVAL", "15"))
+
+_totals = {}      # name -> [calls, seconds, max seconds]
+_counters = {}    # name -> count
+_collectors = {}  # prefix -> function returning {name: number}
+_lock = threading.Lock()
+_local = threading.local()
+_exporting = False
+_NULL = nullcontext()
+
+
+def _record(name, seconds):
+    with _lock:
+        total = _totals.get(name)
+        if total is None:
+            _totals[name] = [1, seconds, seconds]
+        else:
+            total[0] += 1
+            total[1] += seconds
+            if seconds > total[2]:
+                total[2] = seconds
+    # Streamlit runs each session's script on its own thread
+    rerun = getattr(_local, "rerun", None)
+    if rerun is not None:
+        rerun[name] = rerun.get(name, 0) + seconds
+
+def timed(name):
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _record(name, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+@contextmanager
+def _section(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(name, time.perf_counter() - start)
+
+def section(name):
+    return _section(name) if ENABLED else _NULL
+
+def count(name, n=1):
+    if ENABLED:
+        with _lock:
+            _counters[name] = _counters.get(name, 0) + n
+
+def register(prefix, collect):
+    # `collect()` returns current numbers (e.g. a stats dict) to export
+    _collectors[prefix] = collect
+
+# Per-rerun breakdown, bracketing one run of the script
+def begin_rerun():
+    if ENABLED:
+        _local.rerun = {}
+        _local.started = time.perf_counter()
+
+def end_rerun():
+    # -> {name: seconds} for this rerun, including "rerun" for the whole run
+    rerun = getattr(_local, "rerun", None)
+    if not ENABLED or rerun is None:
+        return {}
+    _local.rerun = None
+    elapsed = time.perf_counter() - _local.started
+    _record("rerun", elapsed)
+    rerun["rerun"] = elapsed
+    return rerun
+
+def snapshot():
+    with _lock:
+        return ({name: tuple(total) for name, total in _totals.items()}, dict(_counters))
+
+# Prometheus text exposition format
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+def prometheus_text():
+    totals, counters = snapshot()
+    lines = ["# TYPE roadmap_calls_total counter",
+             "# TYPE roadmap_seconds_total counter",
+             "# TYPE roadmap_seconds_max gauge"]
+    for name, (calls, seconds, longest) in sorted(totals.items()):
+        label = f'{{name="{_label(name)}"}}'
+        lines.append(f"roadmap_calls_total{label} {calls}")
+        lines.append(f"roadmap_seconds_total{label} {seconds:.6f}")
+        lines.append(f"roadmap_seconds_max{label} {longest:.6f}")
+    lines.append("# TYPE roadmap_events_total counter")
+    for name, value in sorted(counters.items()):
+        lines.append(f'roadmap_events_total{{name="{_label(name)}"}} {value}')
+    for prefix, collect in sorted(_collectors.items()):
+        try:
+            values = collect()
+        except Exception:
+            continue
+        for name, value in sorted(values.items()):
+            if isinstance(value, (int, float)):
+                lines.append(f"roadmap_{prefix}_{name} {value}")
+    return "\n".join(lines) + "\n"
+
+def write_file(path):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        f.write(prometheus_text())
+    os.replace(tmp, path)
+
+def _serve(port):
+    # http.server is only imported by processes that export over HTTP
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ThreadingHTTPServer(("127.0.0.1", port), MetricsHandler)
+
+def start_exporters():
+    # Once per process; no-op unless profiling and an export target are set
+    global _exporting
+    if not ENABLED or _exporting or not (METRICS_FILE or METRICS_PORT):
+        return
+    with _lock:
+        if _exporting:
+            return
+        _exporting = True
+    if METRICS_FILE:
+        def export():
+            while True:
+                time.sleep(EXPORT_INTERVAL)
+                try:
+                    write_file(METRICS_FILE)
+                except OSError:
+                    pass
+        threading.Thread(target=export, name="roadmap-metrics-file", daemon=True).start()
+    if METRICS_PORT:
+        server = _serve(METRICS_PORT)
+        threading.Thread(target=server.serve_forever, name="roadmap-metrics-http",
+                         daemon=True).start()
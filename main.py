@@ -1,502 +1,369 @@
 import streamlit as st
 import sqlite3
-import hashlib
 import json
+import os
+import uuid
 from datetime import datetime
-
-# Database setup
-def init_db():
-    conn = sqlite3.connect('roadmap.db')
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS users
-                 (email TEXT PRIMARY KEY, 
-                  password TEXT, 
-                  progress TEXT,
-                  created_at TIMESTAMP)''')
-    conn.commit()
-    conn.close()
-
-init_db()
-
-# Authentication functions
-def make_hashes(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+from urllib.parse import parse_qs, urlparse
+
+import accounts
+import analytics
+import auth
+import coherence
+import db
+from db import init_db
+import event_log
+import forecast
+import instrument
+import metrics as metrics_engine
+import overrides
+import progress_codec
+import roadmap_loader
+import roadmap_model
+import search
+import user_cache
+from progress_store import ProgressStore
+
+# Startup: Streamlit re-executes this file on every rerun, so work that only
+# has to happen once per process lives here and main() calls it first; every
+# later rerun is a cache lookup. Keyed by the database path, so a process
+# pointed at another file (db.configure) initializes that one too.
+@st.cache_resource(show_spinner=False)
+def startup(db_path):
+    init_db()
+    # Profiling (ROADMAP_PROFILE=1): exported alongside the timings
+    instrument.register("user_cache_progress", lambda: user_cache.progress.stats)
+    instrument.register("user_cache_users", lambda: user_cache.users.stats)
+    instrument.register("db_pool", lambda: db.get_pool().stats)
+    instrument.register("db_writer", lambda: db.get_writer().stats)
+    instrument.register("db_write_behind", lambda: db.get_write_behind().stats)
+    instrument.register("rate_limits", accounts.stats)
+    instrument.register("roadmap_views", lambda: overrides.effective.stats)
+    # The cohort dashboard reads without flushing: re-read users once their
+    # deferred saves are committed
+    db.on_flush(lambda emails: [analytics.mark_changed(email) for email in emails])
+    if db.PROGRESS_ENCODING == "events":
+        instrument.register("compactor", lambda: get_compactor().stats)
+    if coherence.ENABLED:
+        instrument.register("coherence", lambda: get_watcher().stats)
+        get_watcher()
+    instrument.start_exporters()
+
+# Multi-process mode (ROADMAP_MULTI_PROCESS=1, see coherence.py): writes
+# announce themselves in the change log; other workers' changes drop the
+# entries from this process's caches
+def session_id():
+    sid = st.session_state.get("session_id")
+    if sid is None:
+        sid = st.session_state.session_id = uuid.uuid4().hex[:8]
+    return sid
+
+def notify(scope, email):
+    return coherence.notify(scope, email, session_id())
+
+def forget_progress(email):
+    user_cache.progress.invalidate(email)
+    user_cache.progress_bits.invalidate(email)
+    user_cache.pace.invalidate(email)
+    analytics.mark_changed(email)
+
+def forget_user(email):
+    user_cache.users.invalidate(email)
+    auth.forget(email)
+    analytics.mark_changed(email)
+
+def forget_all(_):
+    user_cache.clear()
+    analytics.reset()
+
+@st.cache_resource
+def get_watcher():
+    coherence.on_change("progress", forget_progress)
+    coherence.on_change("user", forget_user)
+    coherence.on_change("*", forget_all)
+    return coherence.Watcher().start()
+
+# Authentication: rate-limited sign-up and login (see accounts.py)
+def client_id():
+    # Who rate limits apply to: the connecting address (behind trusted
+    # proxies, the X-Forwarded-For hop the outermost one added), or this
+    # session
+    context = getattr(st, "context", None)
+    if accounts.TRUST_PROXY and context is not None:
+        hops = [hop.strip() for hop in context.headers.get("X-Forwarded-For", "").split(",")]
+        hops = [hop for hop in hops if hop]
+        if hops:
+            return hops[-min(accounts.TRUST_PROXY, len(hops))]
+    address = getattr(context, "ip_address", None)  # None for localhost
+    return address if isinstance(address, str) and address else f"session:{session_id()}"
 
 def create_user(email, password):
-    conn = sqlite3.connect('roadmap.db')
-    c = conn.cursor()
-    c.execute('INSERT INTO users VALUES (?,?,?,?)',
-              (email, make_hashes(password), json.dumps({}), datetime.now()))
-    conn.commit()
-    conn.close()
+    accounts.sign_up(email, password, client_id(), session_id())
 
+@instrument.timed("login_user")
 def login_user(email, password):
-    conn = sqlite3.connect('roadmap.db')
-    c = conn.cursor()
-    c.execute('SELECT * FROM users WHERE email = ? AND password = ?',
-              (email, make_hashes(password)))
-    data = c.fetchone()
-    conn.close()
-    return data
+    return accounts.login(email, password, client_id(), session_id())
 
 # Progress management
-def save_progress(email, progress):
-    conn = sqlite3.connect('roadmap.db')
-    c = conn.cursor()
-    c.execute('UPDATE users SET progress = ? WHERE email = ?',
-              (json.dumps(progress), email))
-    conn.commit()
-    conn.close()
+def read_topic_ids():
+    with db.connection() as conn:
+        return conn.execute(db.SELECT_TOPIC_IDS).fetchall()
+
+def assign_topic_id(stage, topic, stage_id, topic_no):
+    if not coherence.ENABLED:
+        db.write(db.INSERT_TOPIC_ID, (stage, topic, stage_id, topic_no))
+        return None
+    # Other workers number topics too: SQLite picks the numbers under its
+    # write lock and the registry uses whatever was stored
+    db.write(db.INSERT_TOPIC_ID_NEXT, (stage, topic))
+    with db.connection() as conn:
+        return conn.execute(db.SELECT_TOPIC_ID, (stage, topic)).fetchone()
+
+@st.cache_resource
+def get_topic_registry():
+    registry = progress_codec.TopicRegistry(
+        read_topic_ids(), on_assign=assign_topic_id,
+        source=read_topic_ids if coherence.ENABLED else None)
+    loaded = current_roadmap()
+    registry.register(loaded.model)
+    return registry
+
+@instrument.timed("save_progress")
+def save_progress(email, changes):
+    # "bitset" mode: set the (stage, topic, done) flips in the user's blob.
+    # Writes go through db.defer(), so with write-behind on they are only
+    # queued here; the shared blob cache serves reads in the meantime.
+    with instrument.section("progress_encode"):
+        blob = progress_codec.apply_changes(load_progress_bits(email), changes,
+                                            get_topic_registry())
+    db.defer([((email,), [(db.UPSERT_PROGRESS_BITS, (email, blob))] + notify("progress", email))])
+    user_cache.progress_bits.put(email, blob)
+    analytics.mark_changed(email)
+
+@instrument.timed("save_topic_changes")
+def save_topic_changes(email, changes):
+    # Apply (stage, topic, done) flips as single-row upserts/deletes. In
+    # "events" mode the event log written by record_changes is the storage.
+    now = datetime.now()
+    if db.PROGRESS_ENCODING != "events":
+        db.defer([((email, stage, topic),
+                   [(db.UPSERT_TOPIC, (email, stage, topic, now)) if done
+                    else (db.DELETE_TOPIC, (email, stage, topic))])
+                  for stage, topic, done in changes])
+    # After the writes it announces, so it lands in the same flush
+    announce = notify("progress", email)
+    if announce:
+        db.defer([((email, "change"), announce)])
+    user_cache.progress.update(email, user_cache.apply_changes(changes))
+    analytics.mark_changed(email)
 
 def load_progress(email):
-    conn = sqlite3.connect('roadmap.db')
-    c = conn.cursor()
-    c.execute('SELECT progress FROM users WHERE email = ?', (email,))
-    data = c.fetchone()
-    conn.close()
-    return json.loads(data[0]) if data else {}
+    # Shared across sessions: a reload or second tab reuses the decoded copy
+    if db.PROGRESS_ENCODING == "bitset":
+        with instrument.section("progress_decode"):
+            return progress_codec.decode(load_progress_bits(email), get_topic_registry())
+    return user_cache.progress.get(email, read_progress)
+
+def session_progress(email):
+    # What a new session starts from. In "bitset" mode that is nothing: the
+    # metrics engine is built straight from the blob (get_metrics) and the
+    # progress store fills in each stage from it when shown, so a login
+    # decodes no topic names
+    if db.PROGRESS_ENCODING == "bitset":
+        load_progress_bits(email)
+        return {}
+    return load_progress(email)
+
+@instrument.timed("read_progress")
+def read_progress(email):
+    # The user's deferred saves must land before reading past the cache
+    db.flush(email)
+    with db.connection() as conn:
+        if db.PROGRESS_ENCODING == "events":
+            with instrument.section("event_replay"):
+                return event_log.load(conn, email, get_topic_registry(), read_stored)[0]
+        return read_stored(email, conn)
+
+def read_stored(email, conn):
+    if db.PROGRESS_ENCODING == "bitset":
+        data = conn.execute(db.SELECT_PROGRESS_BITS, (email,)).fetchone()
+        if data:
+            with instrument.section("progress_decode"):
+                return progress_codec.decode(data[0], get_topic_registry())
+    return read_rows(email, conn)
+
+def read_rows(email, conn):
+    # Users without a blob yet start from their per-topic rows
+    rows = conn.execute(db.SELECT_PROGRESS, (email,)).fetchall()
+    progress = {}
+    for stage, topic in rows:
+        progress.setdefault(stage, []).append(topic)
+    return progress
+
+def load_progress_bits(email):
+    return user_cache.progress_bits.get(email, read_progress_bits)
+
+@instrument.timed("read_progress")
+def read_progress_bits(email):
+    db.flush(email)
+    with db.connection() as conn:
+        data = conn.execute(db.SELECT_PROGRESS_BITS, (email,)).fetchone()
+        if data:
+            return bytes(data[0])
+        return progress_codec.encode(read_rows(email, conn), get_topic_registry())
+
+@st.cache_resource(max_entries=roadmap_model.MAX_CACHED_VERSIONS)
+def model_offsets(version):
+    # progress_codec.to_model_bits()'s stage offsets for one roadmap model
+    return {}
+
+@st.cache_resource
+def get_compactor():
+    # One background compactor per process for the "events" storage mode
+    return event_log.Compactor(get_topic_registry(), read_stored).start()
+
+# Toggle history: an append-only event log plus rolling pace statistics
+def read_pace(email):
+    db.flush(email)
+    with db.connection() as conn:
+        row = conn.execute(db.SELECT_PACE, (email,)).fetchone()
+    return forecast.Pace(*row) if row else forecast.Pace()
+
+def get_pace(email):
+    return user_cache.pace.get(email, read_pace)
+
+@instrument.timed("record_changes")
+def record_changes(email, changes):
+    # Log each (stage, topic, done) flip and fold it into the user's pace
+    model = get_roadmap()
+    pace = get_pace(email)
+    now = datetime.now()
+    events = []
+    if not pace.events and db.PROGRESS_ENCODING != "events":
+        # First logged change: keep the progress from before it as the
+        # event 0 snapshot that history replays start from (in "events"
+        # mode the stored progress is never updated, so it already is that)
+        events.append((db.UPSERT_SNAPSHOT, (email, 0, stored_blob(email), now)))
+    for stage, topic, done in changes:
+        tid = model.topic_id(stage, topic)
+        hours = model.topic_hours[tid] if tid is not None else 0
+        pace.record(hours if done else -hours, now.timestamp())
+        events.append((db.INSERT_EVENT, (email, stage, topic, int(done), hours, now)))
+    db.append(email, events)
+    db.defer([((email, "pace"), [(db.UPSERT_PACE, pace.as_row(email))])])
+
+def stored_blob(email):
+    if db.PROGRESS_ENCODING == "bitset":
+        return load_progress_bits(email)
+    return progress_codec.encode(load_progress(email), get_topic_registry())
+
+def get_progress_store():
+    store = st.session_state.get("progress_store")
+    if store is None or store.email != st.session_state.user:
+        def save(email, changes):
+            record_changes(email, changes)
+            if db.PROGRESS_ENCODING == "bitset":
+                save_progress(email, changes)
+            else:
+                save_topic_changes(email, changes)
 
-# Progress calculation
-def calculate_progress(roadmap, progress):
-    metrics = {
-        "total": {"hours": 0, "completed": 0},
-        "stages": {}
-    }
-    
-    for stage, data in roadmap.items():
-        stage_hours = sum(t["time"] for t in data["topics"])
-        completed_hours = sum(t["time"] for t in data["topics"] 
-                              if t["name"] in progress.get(stage, []))
-        
-        metrics["stages"][stage] = {
-            "total": stage_hours,
-            "completed": completed_hours,
-            "percent": (completed_hours / stage_hours * 100) if stage_hours > 0 else 0
-        }
-        
-        metrics["total"]["hours"] += stage_hours
-        metrics["total"]["completed"] += completed_hours
-    
-    metrics["total"]["percent"] = (metrics["total"]["completed"] / metrics["total"]["hours"] * 100 
-                                   if metrics["total"]["hours"] > 0 else 0)
-    metrics["total"]["remaining"] = metrics["total"]["hours"] - metrics["total"]["completed"]
-    
-    return metrics
-
-# Roadmap data structure
-ROADMAP = {
-    # Stage 1: Python for Data Science
-    "Stage 1: Python for Data Science": {
-        "topics": [
-            {"name": "Python Basics (variables, data types, loops, conditionals)", "time": 15},
-            {"name": "Functions & Modules", "time": 10},
-            {"name": "Data Structures: Lists, Tuples, Sets, Dictionaries", "time": 15},
-            {"name": "File Handling (open/read/write)", "time": 8},
-            {"name": "Error Handling (try-except)", "time": 6},
-            {"name": "Object-Oriented Programming (OOP)", "time": 20},
-            {"name": "Working with Libraries (math, os, datetime)", "time": 12},
-            {"name": "Lambda, List Comprehensions", "time": 10},
-            {"name": "Basic Unit Testing with assert or pytest", "time": 14},
-            {"name": "Decorators and Generators", "time": 10}
-        ],
-        "resources": {
-            "books": [
-                "Python for Data Analysis - Wes McKinney",
-                "Fluent Python - Luciano Ramalho",
-                "Effective Python - Brett Slatkin"
-            ],
-            "documentation": [
-                "https://docs.python.org/3/",
-                "https://pandas.pydata.org/docs/",
-                "https://numpy.org/doc/stable/"
-            ],
-            "youtube": [
-                "https://youtu.be/_uQrJ0TkZlc (Python Full Course)",
-                "https://youtu.be/rfscVS0vtbw (Learn Python)",
-                "https://youtu.be/Z1Yd7upQsXY (Python OOP)"
-            ],
-            "practice_sites": [
-                "https://exercism.org/tracks/python",
-                "https://www.codewars.com/kata/search/python",
-                "https://leetcode.com/problemset/all/?topicSlugs=python"
-            ],
-            "research_papers": [
-                "https://doi.org/10.5555/1953048.2078195 (Scikit-learn Paper)",
-                "https://doi.org/10.25080/Majora-92bf1922-011 (Pandas Whitepaper)",
-                "https://peps.python.org/pep-0020/ (Zen of Python)"
-            ],
-            "time": "80-120 hours",
-            "difficulty": "4/10 → 6/10"
-        }
-    },
-
-    # Stage 2: SQL for Data Science
-    "Stage 2: SQL for Data Science": {
-        "topics": [
-            {"name": "SELECT, WHERE, ORDER BY", "time": 10},
-            {"name": "JOINs (INNER, LEFT, RIGHT)", "time": 12},
-            {"name": "GROUP BY, Aggregation", "time": 8},
-            {"name": "Subqueries & Nested SELECT", "time": 10},
-            {"name": "Window Functions", "time": 12},
-            {"name": "CTEs (WITH clause)", "time": 8},
-            {"name": "Date/time functions", "time": 6},
-            {"name": "CASE Statements", "time": 6}
-        ],
-        "resources": {
-            "books": [
-                "SQL Cookbook - Anthony Molinaro",
-                "Learning SQL - Alan Beaulieu",
-                "SQL Performance Explained - Markus Winand"
-            ],
-            "documentation": [
-                "https://www.postgresql.org/docs/current/",
-                "https://docs.snowflake.com/",
-                "https://duckdb.org/docs/"
-            ],
-            "youtube": [
-                "https://youtu.be/p3qvj9hO_Bo (SQL Basics)",
-                "https://youtu.be/7S_tz1z_5bA (Advanced SQL)",
-                "https://youtu.be/HXV3zeQKqGY (SQL Full Course)"
-            ],
-            "practice_sites": [
-                "https://datalemur.com/sql-interview-questions",
-                "https://www.stratascratch.com/sql-questions",
-                "https://www.hackerrank.com/domains/sql"
-            ],
-            "research_papers": [
-                "https://doi.org/10.1145/362384.362685 (Relational Model)",
-                "https://doi.org/10.1145/2723372.2742797 (Spark SQL)",
-                "https://doi.org/10.48550/arXiv.2304.06178 (DuckDB)"
-            ],
-            "time": "40-60 hours",
-            "difficulty": "5/10 → 8/10"
-        }
-    },
-
-    # Stage 3: Exploratory Data Analysis (EDA)
-    "Stage 3: Exploratory Data Analysis (EDA)": {
-        "topics": [
-            {"name": "Pandas: loading, indexing, filtering, sorting", "time": 10},
-            {"name": "Handling missing values", "time": 8},
-            {"name": "Duplicates, renaming, reindexing", "time": 6},
-            {"name": "String operations, datetime operations", "time": 10},
-            {"name": "Data profiling (ydata-profiling)", "time": 8},
-            {"name": "Outlier detection (IQR, Z-score)", "time": 10},
-            {"name": "Descriptive statistics", "time": 8}
-        ],
-        "resources": {
-            "books": [
-                "Python Data Science Handbook - Jake VanderPlas",
-                "Storytelling with Data - Cole Nussbaumer Knaflic",
-                "Pandas in Action - Boris Paskhaver"
-            ],
-            "documentation": [
-                "https://pandas.pydata.org/docs/",
-                "https://seaborn.pydata.org/",
-                "https://ydata-profiling.ydata.ai/"
-            ],
-            "youtube": [
-                "https://youtu.be/0hs6_K1Ni4s (Pandas EDA)",
-                "https://youtu.be/ZyhVh-qRZPA (EDA Techniques)",
-                "https://youtu.be/xi0vhXFPegw (Advanced EDA)"
-            ],
-            "practice_sites": [
-                "https://www.kaggle.com/learn/data-visualization",
-                "https://app.datacamp.com/learn/courses/foundations-of-exploratory-data-analysis-with-python",
-                "https://www.kaggle.com/datasets?search=EDA"
-            ],
-            "research_papers": [
-                "https://doi.org/10.1109/TVCG.2006.143 (Visualization Layers)",
-                "https://doi.org/10.1007/978-3-540-73545-8_6 (Outlier Detection)",
-                "https://doi.org/10.48550/arXiv.2301.02028 (AutoEDA)"
-            ],
-            "time": "60-80 hours",
-            "difficulty": "6/10"
-        }
-    },
-
-    # Stage 4: Data Wrangling & Manipulation
-    "Stage 4: Data Wrangling & Manipulation": {
-        "topics": [
-            {"name": "Merging, joining, concatenation", "time": 10},
-            {"name": "Melting, pivoting, reshaping", "time": 8},
-            {"name": "Mapping & replacing values", "time": 6},
-            {"name": "Datetime parsing/manipulation", "time": 10},
-            {"name": "Memory optimization techniques", "time": 8}
-        ],
-        "resources": {
-            "books": [
-                "Data Wrangling with Python - Jacqueline Kazil",
-                "Python Data Cleaning Cookbook - Michael Walker",
-                "Fluent Python - Luciano Ramalho"
-            ],
-            "documentation": [
-                "https://pandas.pydata.org/docs/user_guide/merging.html",
-                "https://arrow.apache.org/docs/python/",
-                "https://pola-rs.github.io/polars/py-polars/html/"
-            ],
-            "youtube": [
-                "https://youtu.be/KdmPqFGJRL0 (Data Cleaning)",
-                "https://youtu.be/0uBirYFhizE (Pandas Transformations)",
-                "https://youtu.be/5rNu16O3YNE (Memory Optimization)"
-            ],
-            "practice_sites": [
-                "https://www.codewars.com/kata/search/python?q=data+manipulation",
-                "https://www.kaggle.com/learn/data-cleaning",
-                "https://www.hackerrank.com/domains/data-processing"
-            ],
-            "research_papers": [
-                "https://doi.org/10.18637/jss.v059.i10 (Tidy Data)",
-                "https://doi.org/10.1145/2882903.2903721 (Apache Arrow)",
-                "https://doi.org/10.48550/arXiv.2209.15089 (Polars)"
-            ],
-            "time": "70-90 hours",
-            "difficulty": "7/10"
-        }
-    },
-
-    # Stage 5: Data Visualization
-    "Stage 5: Data Visualization": {
-        "topics": [
-            {"name": "Matplotlib & Seaborn Fundamentals", "time": 10},
-            {"name": "Plotly/Altair Interactive Charts", "time": 12},
-            {"name": "Tableau/Power BI Dashboards", "time": 15},
-            {"name": "Visual Storytelling Techniques", "time": 8},
-            {"name": "Color Theory & Layout Design", "time": 6}
-        ],
-        "resources": {
-            "books": [
-                "Interactive Data Visualization with Python - Abigail Mosca",
-                "Storytelling with Data - Cole Nussbaumer Knaflic",
-                "The Visual Display... - Edward Tufte"
-            ],
-            "documentation": [
-                "https://matplotlib.org/stable/",
-                "https://plotly.com/python-api-reference/",
-                "https://altair-viz.github.io/"
-            ],
-            "youtube": [
-                "https://youtu.be/DAQNHzOcO5A (Matplotlib)",
-                "https://youtu.be/6GUZXDef2U0 (Plotly Dash)",
-                "https://youtu.be/pJ1kpd_0G7I (Seaborn)"
-            ],
-            "practice_sites": [
-                "https://www.codewars.com/kata/search/python?q=data+visualization",
-                "https://app.datacamp.com/learn/courses/introduction-to-data-visualization-with-python",
-                "https://www.kaggle.com/learn/data-visualization"
-            ],
-            "research_papers": [
-                "https://doi.org/10.1002/wics.147 (Grammar of Graphics)",
-                "https://doi.org/10.1109/TVCG.2011.185 (D3.js)",
-                "https://doi.org/10.1145/3411764.3445605 (AI Visualization)"
-            ],
-            "time": "50-70 hours",
-            "difficulty": "6/10 → 9/10"
-        }
-    },
-
-    # Stage 6: Statistics & Probability
-    "Stage 6: Statistics & Probability": {
-        "topics": [
-            {"name": "Sampling & Distributions", "time": 10},
-            {"name": "Hypothesis Testing", "time": 12},
-            {"name": "Confidence Intervals", "time": 8},
-            {"name": "Regression Analysis", "time": 10},
-            {"name": "Bayesian Methods", "time": 12},
-            {"name": "Causal Inference", "time": 8}
-        ],
-        "resources": {
-            "books": [
-                "Practical Statistics... - Peter Bruce",
-                "Statistical Rethinking - Richard McElreath",
-                "Introduction to... Learning - James et al."
-            ],
-            "documentation": [
-                "https://docs.scipy.org/doc/scipy/reference/stats.html",
-                "https://www.statsmodels.org/stable/index.html",
-                "https://pymc.io/"
-            ],
-            "youtube": [
-                "https://youtu.be/xxpc-HPKN28 (StatQuest)",
-                "https://youtu.be/9FtHB7V14Fo (Khan Academy)",
-                "https://youtu.be/zRUliXuwJCQ (Stanford)"
-            ],
-            "practice_sites": [
-                "https://brilliant.org/courses/probability-fundamentals/",
-                "https://leetcode.com/problemset/all/?topicSlugs=math-statistics",
-                "https://www.kaggle.com/learn/statistical-experimental-design"
-            ],
-            "research_papers": [
-                "https://doi.org/10.2307/2333958 (Fisher's Exact Test)",
-                "https://doi.org/10.1214/aos/1176347963 (Bayesian Data Analysis)",
-                "https://doi.org/10.1162/0899766053729669 (Causal Inference)"
-            ],
-            "time": "90-120 hours",
-            "difficulty": "8/10"
-        }
-    },
-
-    # Stage 7: Feature Engineering
-    "Stage 7: Feature Engineering": {
-        "topics": [
-            {"name": "Categorical Encoding Techniques", "time": 10},
-            {"name": "Feature Scaling Methods", "time": 8},
-            {"name": "Polynomial Feature Creation", "time": 6},
-            {"name": "Text Feature Extraction", "time": 10},
-            {"name": "Automated Feature Selection", "time": 8}
-        ],
-        "resources": {
-            "books": [
-                "Feature Engineering... - Max Kuhn",
-                "Designing ML Systems - Chip Huyen",
-                "Applied Predictive Modeling - Kuhn"
-            ],
-            "documentation": [
-                "https://scikit-learn.org/stable/modules/preprocessing.html",
-                "https://feature-engine.readthedocs.io/",
-                "https://featuretools.alteryx.com/"
-            ],
-            "youtube": [
-                "https://youtu.be/ZiKMIuYidY0 (Abhishek Thakur)",
-                "https://youtu.be/0HOqOcln3Z4 (Kaggle)",
-                "https://youtu.be/5QDJL2KX7EQ (Data School)"
-            ],
-            "practice_sites": [
-                "https://www.kaggle.com/learn/feature-engineering",
-                "https://www.hackerearth.com/practice/machine-learning/feature-engineering/problems/",
-                "https://www.openml.org/search?type=data"
-            ],
-            "research_papers": [
-                "https://doi.org/10.1145/2783258.2788615 (Feature Tools)",
-                "https://doi.org/10.1109/DSAA.2015.7344872 (Deep Feature Synthesis)",
-                "https://doi.org/10.1145/3371158.3371164 (Neural Feature Selection)"
-            ],
-            "time": "80-100 hours",
-            "difficulty": "8/10"
-        }
-    },
-
-    # Stage 8: ETL (Extract, Transform, Load)
-    "Stage 8: ETL (Extract, Transform, Load)": {
-        "topics": [
-            {"name": "File Format Handling (CSV/JSON/Excel)", "time": 10},
-            {"name": "Database Ingestion", "time": 12},
-            {"name": "Workflow Automation", "time": 8},
-            {"name": "CLI Application Development", "time": 10},
-            {"name": "Data Pipeline Orchestration", "time": 12}
-        ],
-        "resources": {
-            "books": [
-                "Data Pipelines... - Bas Harenslak",
-                "Python for DevOps - Noah Gift",
-                "Effective Python - Brett Slatkin"
-            ],
-            "documentation": [
-                "https://airflow.apache.org/docs/",
-                "https://docs.prefect.io/",
-                "https://docs.sqlalchemy.org/"
-            ],
-            "youtube": [
-                "https://youtu.be/ahSvcpg_PBM (Airflow)",
-                "https://youtu.be/LTDAja0q_bo (ETL Python)",
-                "https://youtu.be/8Xri8B9tn_s (PyData)"
-            ],
-            "practice_sites": [
-                "https://www.hackerrank.com/domains/data-processing",
-                "https://www.kaggle.com/learn/data-pipelines",
-                "https://www.codewars.com/kata/search/sql?q=ETL"
-            ],
-            "research_papers": [
-                "https://doi.org/10.1145/3299869.3314041 (Apache Airflow)",
-                "https://doi.org/10.14778/3157794.3157797 (Data Pipelines)",
-                "https://doi.org/10.1145/3448016.3452830 (ETL Optimization)"
-            ],
-            "time": "70-90 hours",
-            "difficulty": "7/10"
-        }
-    },
-
-    # Stage 9: Machine Learning (Core)
-    "Stage 9: Machine Learning (Core)": {
-        "topics": [
-            {"name": "Supervised Learning Algorithms", "time": 15},
-            {"name": "Model Evaluation Metrics", "time": 10},
-            {"name": "Cross-Validation Strategies", "time": 8},
-            {"name": "Hyperparameter Tuning", "time": 10},
-            {"name": "ML Pipeline Design", "time": 12}
-        ],
-        "resources": {
-            "books": [
-                "Hands-On ML... - Aurélien Géron",
-                "Pattern Recognition... - Bishop",
-                "Machine Learning... - Andrew Ng"
-            ],
-            "documentation": [
-                "https://scikit-learn.org/stable/",
-                "https://www.tensorflow.org/",
-                "https://xgboost.readthedocs.io/"
-            ],
-            "youtube": [
-                "https://youtu.be/pqNCD_5r0IU (Scikit-learn)",
-                "https://youtu.be/aircAruvnKk (Neural Nets)",
-                "https://youtu.be/nKW8Ndu7Mjw (Google ML)"
-            ],
-            "practice_sites": [
-                "https://www.kaggle.com/learn/machine-learning",
-                "https://www.openml.org/search?type=task&sort=runs",
-                "https://www.hackerearth.com/practice/machine-learning/"
-            ],
-            "research_papers": [
-                "https://doi.org/10.1038/nature14539 (Deep Learning)",
-                "https://doi.org/10.1145/2783258.2788613 (ML Pipelines)",
-                "https://doi.org/10.1109/TPAMI.2016.2572683 (Supervised Learning)"
-            ],
-            "time": "120-150 hours",
-            "difficulty": "9/10"
-        }
-    },
-
-    # Stage 10: Communication & Git
-    "Stage 10: Communication & Git": {
-        "topics": [
-            {"name": "Git Version Control", "time": 8},
-            {"name": "Technical Documentation", "time": 6},
-            {"name": "Data Storytelling", "time": 10},
-            {"name": "Notebook Versioning", "time": 6}
-        ],
-        "resources": {
-            "books": [
-                "Data Science... - Provost & Fawcett",
-                "The Pragmatic Programmer - Hunt",
-                "Effective Python - Slatkin"
-            ],
-            "documentation": [
-                "https://git-scm.com/doc",
-                "https://dvc.org/doc",
-                "https://www.markdownguide.org/"
-            ],
-            "youtube": [
-                "https://youtu.be/USjZcfj8yxE (Git for DS)",
-                "https://youtu.be/RGOj5yH7evk (Git Tutorial)",
-                "https://youtu.be/pJ1kpd_0G7I (Storytelling)"
-            ],
-            "practice_sites": [
-                "https://lab.github.com/",
-                "https://app.datacamp.com/learn/courses/reporting-in-sql",
-                "https://www.kaggle.com/learn/data-visualization"
-            ],
-            "research_papers": [
-                "https://doi.org/10.1145/3377811.3381725 (Version Control Systems)",
-                "https://doi.org/10.1145/319583.319594 (Collaborative Software Development)",
-                "https://doi.org/10.1109/TVCG.2019.2934267 (Data Storytelling)"
-            ],
-            "time": "30-50 hours",
-            "difficulty": "5/10"
-        }
-    }
-}
-    # Add other stages here...
+        def load_stage(stage):
+            return get_metrics().completed_topics(stage)
+        store = ProgressStore(st.session_state.user, st.session_state.progress, save,
+                              load_stage if db.PROGRESS_ENCODING == "bitset" else None)
+        st.session_state.progress_store = store
+    return store
 
+# Progress calculation
+@instrument.timed("calculate_progress")
+def calculate_progress(roadmap, progress, version=None):
+    if version is None:
+        model = roadmap_model.Roadmap(roadmap)
+    else:
+        model = roadmap_model.get_model(roadmap, version)
+    return metrics_engine.ProgressMetrics(model, progress).as_dict()
+
+# Roadmap definitions (roadmaps/*.json, hot-reloaded on change)
+def current_roadmap():
+    name = st.session_state.get("roadmap_name", roadmap_loader.DEFAULT_ROADMAP)
+    return roadmap_loader.load(name)
+
+# Per-user customizations: deltas over the shared roadmap (see overrides.py)
+@instrument.timed("get_overrides")
+def get_overrides():
+    key = (st.session_state.user, current_roadmap().name)
+    cached = st.session_state.get("overrides")
+    if cached is None or cached[0] != key:
+        with db.connection() as conn:
+            row = conn.execute(db.SELECT_OVERRIDES, key).fetchone()
+        with instrument.section("overrides_json"):
+            deltas = json.loads(row[0]) if row else []
+        cached = (key, deltas, overrides.digest(deltas))
+        st.session_state.overrides = cached
+    return cached
+
+def add_override(delta):
+    key, deltas, old_digest = get_overrides()
+    deltas = deltas + [delta]
+    with instrument.section("overrides_json"):
+        text = json.dumps(deltas)
+    db.write_many([(db.UPSERT_OVERRIDES, (*key, text, datetime.now()))] + notify("overrides", key[0]))
+    digest = overrides.digest(deltas)
+    st.session_state.overrides = (key, deltas, digest)
+    # The search overlay takes the one new delta instead of being rebuilt
+    cached = st.session_state.get("search_overlay")
+    if cached is not None and cached[0] == (current_roadmap().key, old_digest):
+        cached[1].apply(delta)
+        st.session_state.search_overlay = ((cached[0][0], digest), cached[1])
+
+def reset_overrides():
+    key, _, _ = get_overrides()
+    db.write_many([(db.DELETE_OVERRIDES, key)] + notify("overrides", key[0]))
+    st.session_state.overrides = (key, [], overrides.digest([]))
+    st.session_state.pop("search_overlay", None)
+
+def get_user_roadmap():
+    # Kept in the session too, so a view evicted from the shared LRU is not
+    # rebuilt on every call while its user is still active
+    _, deltas, digest = get_overrides()
+    loaded = current_roadmap()
+    cached = st.session_state.get("user_roadmap")
+    if cached is None or cached[0] != (loaded.key, digest):
+        cached = ((loaded.key, digest), overrides.effective.get(loaded, deltas, digest))
+        st.session_state.user_roadmap = cached
+    return cached[1]
+
+def get_roadmap():
+    return get_user_roadmap().model
+
+# Search: the roadmap's shared index, seen through the user's customizations
+def get_search():
+    loaded = current_roadmap()
+    index = search.get_index(loaded)
+    _, deltas, digest = get_overrides()
+    if not deltas:
+        return index
+    cached = st.session_state.get("search_overlay")
+    if cached is None or cached[0] != (loaded.key, digest):
+        cached = ((loaded.key, digest), search.Overlay(index, loaded.stages, deltas))
+        st.session_state.search_overlay = cached
+    return cached[1]
+
+def get_metrics():
+    # Per-session metrics, rebuilt only when the roadmap model changes
+    model = get_roadmap()
+    engine = st.session_state.get("metrics")
+    if engine is None or engine.model is not model:
+        with instrument.section("metrics_build"):
+            if db.PROGRESS_ENCODING == "bitset":
+                bits = progress_codec.to_model_bits(load_progress_bits(st.session_state.user),
+                                                    get_topic_registry(), model,
+                                                    model_offsets(model.version))
+                engine = metrics_engine.ProgressMetrics(model, bits=bits)
+            else:
+                engine = metrics_engine.ProgressMetrics(model, st.session_state.progress)
+        st.session_state.metrics = engine
+    return engine
 
 # UI Components
 def progress_sidebar(metrics):
@@ -508,8 +375,54 @@ def progress_sidebar(metrics):
         st.progress(metrics["total"]["percent"]/100)
         
         st.header("Quick Navigation")
-        for stage in ROADMAP.keys():
-            st.button(f"{stage} ({metrics['stages'][stage]['percent']:.1f}%)")
+        stage_navigation(get_roadmap(), get_metrics())
+
+# Stage navigation: the sidebar shows a window of NAV_PAGE_SIZE stages, and
+# long roadmaps are split into sections of NAV_SECTION_SIZE stages picked
+# from one selectbox, so a rerun builds the same few widgets however many
+# stages there are. Labels come from the metrics engine, which reformats
+# only stages whose progress changed. NAV_PAGE_SIZE=0 lists every stage.
+NAV_PAGE_SIZE = int(os.environ.get("ROADMAP_NAV_PAGE_SIZE", "15"))
+NAV_SECTION_SIZE = int(os.environ.get("ROADMAP_NAV_SECTION_SIZE", "150"))
+
+def nav_section_size():
+    # Whole pages, so a window never straddles two sections
+    return max(NAV_SECTION_SIZE // NAV_PAGE_SIZE, 1) * NAV_PAGE_SIZE
+
+def select_stage(stage):
+    st.session_state.selected_stage = stage
+
+def show_nav_window(start):
+    st.session_state.nav_start = start
+
+def show_nav_section():
+    st.session_state.nav_start = st.session_state.nav_section * nav_section_size()
+
+def stage_navigation(model, engine):
+    count = len(model.stages)
+    selected = model.stage_id(st.session_state.get("selected_stage"))
+    if NAV_PAGE_SIZE <= 0 or count <= NAV_PAGE_SIZE:
+        window = range(count)
+    else:
+        page, section = NAV_PAGE_SIZE, nav_section_size()
+        start = min(max(st.session_state.get("nav_start", selected or 0), 0), count - 1)
+        start -= start % page
+        window = range(start, min(start + page, count))
+        sections = -(-count // section)
+        if sections > 1:
+            st.session_state.nav_section = start // section
+            st.selectbox("Section", range(sections), key="nav_section", on_change=show_nav_section,
+                         format_func=lambda s: f"Stages {s * section + 1}–{min((s + 1) * section, count)}")
+    for i in window:
+        st.button(engine.label(i), key=f"nav_{i}", on_click=select_stage, args=(model.stages[i],),
+                  type="primary" if i == selected else "secondary")
+    if len(window) < count:
+        cols = st.columns([1, 2, 1])
+        cols[0].button("◀", key="nav_prev", disabled=window.start == 0,
+                       on_click=show_nav_window, args=(window.start - NAV_PAGE_SIZE,))
+        cols[1].caption(f"{window.start + 1}–{window.stop} of {count}")
+        cols[2].button("▶", key="nav_next", disabled=window.stop >= count,
+                       on_click=show_nav_window, args=(window.stop,))
 
 def stage_section(stage, data, progress, metrics):
     with st.expander(f"{stage} - {metrics['stages'][stage]['percent']:.1f}% Complete"):
@@ -524,23 +437,20 @@ def stage_section(stage, data, progress, metrics):
                       f"{metrics['stages'][stage]['total'] - metrics['stages'][stage]['completed']}h")
         
         # Checklist for topics
-        stage_progress = progress.get(stage, [])
+        store = get_progress_store()
         for topic in data["topics"]:
             cols = st.columns([1, 4])
             checked = cols[0].checkbox(
                 " ", 
-                value=topic["name"] in stage_progress,
+                value=store.is_completed(stage, topic["name"]),
                 key=f"{stage}_{topic['name']}"
             )
             cols[1].markdown(f"**{topic['name']}** ({topic['time']}h)")
             
-            # Update progress based on checkbox state
-            if checked and topic["name"] not in stage_progress:
-                stage_progress.append(topic["name"])
-            elif not checked and topic["name"] in stage_progress:
-                stage_progress.remove(topic["name"])
-            st.session_state.progress[stage] = stage_progress
-            save_progress(st.session_state.user, st.session_state.progress)
+            # Record only real flips; they are saved once after the loop
+            if store.set_completed(stage, topic["name"], checked):
+                get_metrics().toggle(stage, topic["name"], checked)
+        store.flush()
         
         # Resources
         st.subheader("Learning Resources")
@@ -550,42 +460,65 @@ def stage_section(stage, data, progress, metrics):
         with tabs[1]:
             st.markdown("\n".join([f"- [{link.split(' ')[0]}]({link})" for link in data["resources"]["documentation"]]))
         with tabs[2]:
-            for video in data["resources"]["youtube"]:
-                st.video(video.split(" ")[0])
+            for i, video in enumerate(data["resources"]["youtube"]):
+                lazy_video(f"video_{stage}_{i}", parse_video(video))
         with tabs[3]:
             st.markdown("\n".join([f"- [{site}]({site})" for site in data["resources"]["practice_sites"]]))
         with tabs[4]:
             st.markdown("\n".join([f"- {paper}" for paper in data["resources"].get("research_papers", [])]))
 
 def edit_roadmap():
-    st.title("Edit Data Science Roadmap ✏️")
+    loaded = current_roadmap()
+    st.title(f"Edit {loaded.title} Roadmap ✏️")
+    st.caption("Changes are saved as your personal customizations of the shared roadmap.")
     
     # Select stage to edit
-    stage = st.selectbox("Select Stage to Edit", list(ROADMAP.keys()))
+    user_roadmap = get_user_roadmap()
+    model = user_roadmap.model
+    if st.session_state.get("edit_stage") not in model.stages:
+        st.session_state.pop("edit_stage", None)
+    stage = st.selectbox("Select Stage to Edit", model.stages, key="edit_stage")
     if stage:
-        data = ROADMAP[stage]
+        data = user_roadmap.stages[stage]
         
         # Edit topics
         st.subheader("Edit Topics")
-        for i, topic in enumerate(data["topics"]):
-            with st.expander(f"Topic {i+1}: {topic['name']}"):
-                new_name = st.text_input(f"Edit Name for Topic {i+1}", topic["name"], key=f"{stage}_topic_{i}_name")
-                new_time = st.number_input(f"Edit Time (hours) for Topic {i+1}", value=topic["time"], key=f"{stage}_topic_{i}_time")
+        first = model.topic_range(stage).start
+        for tid in model.topic_range(stage):
+            i = tid - first
+            name, time = model.topic_names[tid], model.topic_hours[tid]
+            with st.expander(f"Topic {i+1}: {name}"):
+                new_name = st.text_input(f"Edit Name for Topic {i+1}", name, key=f"{stage}_topic_{i}_name")
+                new_time = st.number_input(f"Edit Time (hours) for Topic {i+1}", value=time, key=f"{stage}_topic_{i}_time")
                 if st.button(f"Save Changes to Topic {i+1}", key=f"{stage}_topic_{i}_save"):
-                    if new_name.strip():
-                        topic["name"] = new_name
-                        topic["time"] = new_time
+                    if new_name != name and model.topic_id(stage, new_name) is not None:
+                        st.error(f"This stage already has a topic named {new_name}")
+                    elif new_name.strip():
+                        add_override({"op": "edit_topic", "stage": stage, "topic": name,
+                                      "name": new_name, "time": new_time})
+                        # Carry completion over to the renamed topic
+                        store = get_progress_store()
+                        if new_name != name and store.is_completed(stage, name):
+                            store.set_completed(stage, name, False)
+                            store.set_completed(stage, new_name, True)
+                            store.flush()
                         st.success(f"Updated Topic {i+1}")
                     else:
                         st.error("Topic name cannot be empty")
+                if st.button(f"Remove Topic {i+1}", key=f"{stage}_topic_{i}_remove"):
+                    add_override({"op": "remove_topic", "stage": stage, "topic": name})
+                    st.success(f"Removed Topic {i+1}")
         
         # Add a new topic
         st.subheader("Add New Topic")
         new_topic_name = st.text_input("New Topic Name", key=f"{stage}_new_topic_name")
         new_topic_time = st.number_input("New Topic Time (hours)", min_value=1, key=f"{stage}_new_topic_time")
         if st.button("Add Topic", key=f"{stage}_add_topic"):
-            if new_topic_name.strip():
-                data["topics"].append({"name": new_topic_name, "time": new_topic_time})
+            if model.topic_id(stage, new_topic_name) is not None:
+                st.error(f"This stage already has a topic named {new_topic_name}")
+            elif new_topic_name.strip():
+                add_override({"op": "add_topic", "stage": stage,
+                              "name": new_topic_name, "time": new_topic_time})
                 st.success(f"Added New Topic: {new_topic_name}")
             else:
                 st.error("Topic name cannot be empty")
@@ -593,12 +526,15 @@ def edit_roadmap():
         # Edit resources
         st.subheader("Edit Resources")
         for resource_type, resources in data["resources"].items():
+            if not isinstance(resources, list):
+                continue  # "time" and "difficulty" are labels, not lists
             with st.expander(f"Edit {resource_type.capitalize()}"):
                 for i, resource in enumerate(resources):
                     new_resource = st.text_input(f"Edit {resource_type.capitalize()} {i+1}", resource, key=f"{stage}_{resource_type}_{i}")
                     if st.button(f"Save Changes to {resource_type.capitalize()} {i+1}", key=f"{stage}_{resource_type}_{i}_save"):
                         if new_resource.strip():
-                            resources[i] = new_resource
+                            add_override({"op": "edit_resource", "stage": stage, "kind": resource_type,
+                                          "old": resource, "value": new_resource})
                             st.success(f"Updated {resource_type.capitalize()} {i+1}")
                         else:
                             st.error(f"{resource_type.capitalize()} cannot be empty")
@@ -607,95 +543,270 @@ def edit_roadmap():
                 new_resource = st.text_input(f"Add New {resource_type.capitalize()}", key=f"{stage}_new_{resource_type}")
                 if st.button(f"Add {resource_type.capitalize()}", key=f"{stage}_add_{resource_type}"):
                     if new_resource.strip():
-                        resources.append(new_resource)
+                        add_override({"op": "add_resource", "stage": stage, "kind": resource_type,
+                                      "value": new_resource})
                         st.success(f"Added New {resource_type.capitalize()}: {new_resource}")
                     else:
                         st.error(f"{resource_type.capitalize()} cannot be empty")
         
-        # Save changes to ROADMAP
-        if st.button("Save All Changes", key=f"{stage}_save_all"):
-            ROADMAP[stage] = data
-            st.success(f"All changes saved for {stage}")
+        # Drop all personal changes and follow the shared roadmap again
+        if st.button("Reset to Shared Roadmap", key=f"{stage}_reset"):
+            reset_overrides()
+            st.success("Your customizations were removed")
+
+# Sidebar search over topics and resources (search.py)
+SEARCH_ICONS = {"topic": "📘", "books": "📚", "documentation": "📄", "youtube": "🎬",
+                "practice_sites": "🏋️", "research_papers": "🔬"}
+
+def open_stage(stage):
+    # Search result callback: show the stage, in the editor too when it is
+    # open, and move the navigation window to it
+    st.session_state.selected_stage = stage
+    st.session_state.edit_stage = stage
+    st.session_state.nav_start = get_roadmap().stage_id(stage)
+
+def search_box():
+    query = st.text_input("🔎 Search topics and resources", key="search_query",
+                          placeholder="e.g. pandas, regresion, scikit")
+    if not query.strip():
+        return
+    with instrument.section("search"):
+        results = get_search().search(query)
+    if not results:
+        st.caption("No matches")
+    for i, (stage, kind, text, _) in enumerate(results):
+        label = text if len(text) <= 60 else text[:57] + "..."
+        st.button(f"{SEARCH_ICONS.get(kind, '🔗')} {label} · {stage}", key=f"search_result_{i}",
+                  on_click=open_stage, args=(stage,))
+
+# Stage rendering
+# Checkbox toggles re-run only the topic list (a fragment) instead of the
+# whole page; Streamlit releases without fragments render it inline.
+fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda f: f)
+
+@st.cache_data(max_entries=512)
+def resource_markdown(version, stage, _resources):
+    # Resource lists only change with the roadmap, so their markdown is built
+    # once per roadmap version and stage
+    return {
+        "books": "\n".join([f"- {book}" for book in _resources["books"]]),
+        "documentation": "\n".join([f"- [{link.split(' ')[0]}]({link})" for link in _resources["documentation"]]),
+        "practice_sites": "\n".join([f"- [{site}]({site})" for site in _resources["practice_sites"]]),
+        "research_papers": "\n".join([f"- {paper}" for paper in _resources.get("research_papers", [])]),
+    }
+
+# Videos: a thumbnail placeholder until the user asks for the player, since
+# every st.video is a full YouTube iframe the browser has to load
+LAZY_VIDEOS = os.environ.get("ROADMAP_LAZY_VIDEOS", "1") == "1"
+
+def parse_video(entry):
+    # "https://youtu.be/<id> (Label)" -> url, label and thumbnail
+    url, _, label = entry.partition(" ")
+    label = label.strip().strip("()") or url
+    parsed = urlparse(url)
+    video_id = None
+    if parsed.netloc.endswith("youtu.be"):
+        video_id = parsed.path.lstrip("/")
+    elif parsed.netloc.endswith("youtube.com"):
+        video_id = parse_qs(parsed.query).get("v", [None])[0]
+    thumbnail = f"https://img.youtube.com/vi/{video_id}/mqdefault.jpg" if video_id else None
+    return {"url": url, "label": label, "thumbnail": thumbnail}
+
+@st.cache_data(max_entries=512)
+def stage_videos(version, stage, _resources):
+    return [parse_video(video) for video in _resources.get("youtube", [])]
+
+@fragment
+def lazy_video(key, video):
+    if not st.session_state.get(key):
+        placeholder = st.empty()
+        with placeholder.container():
+            if video["thumbnail"]:
+                # Markdown rather than st.image: the browser fetches the URL
+                # either way, and st.image imports NumPy and PIL to pass it on
+                st.markdown(f"![{video['label']}]({video['thumbnail']})")
+                st.caption(video["label"])
+            else:
+                st.markdown(f"[{video['label']}]({video['url']})")
+            clicked = st.button(f"▶ Play {video['label']}", key=f"{key}_play")
+        if not clicked:
+            return
+        st.session_state[key] = True
+        placeholder.empty()
+    st.video(video["url"])
+
+def video_list(version, stage, resources):
+    for i, video in enumerate(stage_videos(version, stage, resources)):
+        if LAZY_VIDEOS:
+            lazy_video(f"video_{version}_{stage}_{i}", video)
+        else:
+            st.video(video["url"])
+
+@fragment
+def topic_list(stage):
+    with instrument.section("render_topics"):
+        st.markdown("### Topics")
+        model = get_roadmap()
+        engine = get_metrics()
+        store = get_progress_store()
+        for tid in model.topic_range(stage):
+            name = model.topic_names[tid]
+            cols = st.columns([1, 4])
+            checked = cols[0].checkbox(
+                " ", 
+                value=engine.is_completed(tid),
+                key=f"{stage}_{name}"
+            )
+            cols[1].markdown(f"**{name}** ({model.topic_hours[tid]}h)")
+            if store.set_completed(stage, name, checked):
+                engine.toggle(stage, name, checked)
+        store.flush()
+        # Live stage progress, since the page header only refreshes on a full rerun
+        stage_metrics = engine.stage(stage)
+        st.progress(stage_metrics["percent"] / 100)
+        st.caption(f"{stage_metrics['completed']}h of {stage_metrics['total']}h completed · "
+                   f"Progress writes this session: {store.writes}")
+
+# Change history: undo and time travel over the event log
+HISTORY_LIMIT = 50
+
+def apply_flips(flips):
+    # Button callback: apply (stage, topic, done) flips as new changes, so
+    # an undo is itself logged. Runs before the rerun, so dropping the
+    # checkbox states lets them re-render from the new progress.
+    store = get_progress_store()
+    engine = get_metrics()
+    for stage, topic, done in flips:
+        if store.set_completed(stage, topic, done):
+            engine.toggle(stage, topic, done)
+            st.session_state.pop(f"{stage}_{topic}", None)
+    store.flush()
+
+def history_view(engine):
+    st.markdown("### History")
+    if not st.toggle("Show change history", key="show_history"):
+        st.caption("Every checkbox change is kept, so it can be undone or rewound.")
+        return
+    user = st.session_state.user
+    db.flush(user)
+    with db.connection() as conn:
+        events = conn.execute(db.SELECT_RECENT_EVENTS, (user, HISTORY_LIMIT)).fetchall()
+    if not events:
+        st.info("No changes recorded yet.")
+        return
+    latest = events[0]
+    labels = {event[0]: f"#{event[0]} {str(event[5])[:19]} · {'✅' if event[3] else '⬜'} {event[2]}"
+              for event in events}
+    choice = st.select_slider("Rewind to", options=[event[0] for event in reversed(events)],
+                              value=latest[0], format_func=labels.get, key="rewind_to")
+    with db.connection() as conn:
+        before = past_progress(conn, user, latest[0] - 1)
+        then = past_progress(conn, user, choice)
+    # Undo and restore set each topic changed since to its state back then
+    stage, topic = latest[1], latest[2]
+    st.button(f"↩ Undo {'completing' if latest[3] else 'unchecking'} {topic}",
+              on_click=apply_flips, args=([(stage, topic, topic in before.get(stage, ()))],))
+
+    past = metrics_engine.ProgressMetrics(engine.model, then)
+    st.metric("Completed at that point", f"{past.total_completed}h",
+              delta=f"{past.total_completed - engine.total_completed}h")
+    for stage in engine.model.stages:
+        before, now = past.stage(stage), engine.stage(stage)
+        if before["completed"] != now["completed"]:
+            st.write(f"- {stage}: {before['percent']:.1f}% then, {now['percent']:.1f}% now")
+    if choice != latest[0]:
+        changed = {(event[1], event[2]) for event in events if event[0] > choice}
+        flips = [(stage, topic, topic in then.get(stage, ())) for stage, topic in changed]
+        st.button(f"Restore this point ({len(flips)} topics)", on_click=apply_flips, args=(flips,))
+
+def past_progress(conn, email, to_id):
+    return event_log.load(conn, email, get_topic_registry(), read_stored, to_id)[0]
 
 def main_app():
     st.title("🚀 Data Science Roadmap Tracker")
     st.markdown("### Track your progress and achieve your data science goals!")
 
     # Sidebar with progress metrics
-    with st.sidebar:
+    with st.sidebar, instrument.section("render_sidebar"):
+        names = roadmap_loader.available()
+        if len(names) > 1:
+            st.selectbox("Roadmap", names, key="roadmap_name")
         st.header("📊 Progress Overview")
-        metrics = calculate_progress(ROADMAP, st.session_state.progress)
-        st.metric("Total Hours", f"{metrics['total']['hours']}h")
-        st.metric("Completed", f"{metrics['total']['completed']}h")
-        st.metric("Remaining", f"{metrics['total']['remaining']}h")
-        st.progress(metrics["total"]["percent"] / 100)
+        model = get_roadmap()
+        engine = get_metrics()
+        selected_stage = st.session_state.get("selected_stage")
+        if model.stage_id(selected_stage) is None:
+            selected_stage = model.stages[0]
+        total = engine.total()
+        st.metric("Total Hours", f"{total['hours']}h")
+        st.metric("Completed", f"{total['completed']}h")
+        st.metric("Remaining", f"{total['remaining']}h")
+        st.progress(total["percent"] / 100)
+        projection = forecast.project(get_pace(st.session_state.user), engine, selected_stage)
+        if projection["finish"]:
+            st.metric("Projected Finish", f"{projection['finish']:%b %d, %Y}",
+                      help=f"At your recent pace of {projection['per_day'] * 7:.1f}h per week")
+        else:
+            st.caption("Complete a few more topics to see a projected finish date.")
 
         st.markdown("---")
+        search_box()
         st.header("🔍 Quick Navigation")
-        for stage in ROADMAP.keys():
-            if st.button(f"{stage} ({metrics['stages'][stage]['percent']:.1f}%)"):
-                st.session_state.selected_stage = stage
-
-    # Main content
-    selected_stage = st.session_state.get("selected_stage", list(ROADMAP.keys())[0])
-    data = ROADMAP[selected_stage]
-    metrics = calculate_progress(ROADMAP, st.session_state.progress)
-
-    # Tabs for stage details
-    st.markdown(f"## {selected_stage} - {metrics['stages'][selected_stage]['percent']:.1f}% Complete")
-    tabs = st.tabs(["Overview", "Topics", "Resources", "Progress"])
+        stage_navigation(model, engine)
+
+    # Main content: tabs for stage details
+    stage_metrics = engine.stage(selected_stage)
+    st.markdown(f"## {selected_stage} - {stage_metrics['percent']:.1f}% Complete")
+    tabs = st.tabs(["Overview", "Topics", "Resources", "Progress", "History"])
     
     # Overview Tab
-    with tabs[0]:
+    with tabs[0], instrument.section("render_overview"):
         st.markdown("### Overview")
-        st.write(f"**Total Hours:** {metrics['stages'][selected_stage]['total']}h")
-        st.write(f"**Completed Hours:** {metrics['stages'][selected_stage]['completed']}h")
-        st.write(f"**Remaining Hours:** {metrics['stages'][selected_stage]['total'] - metrics['stages'][selected_stage]['completed']}h")
-        st.progress(metrics['stages'][selected_stage]['percent'] / 100)
+        st.write(f"**Total Hours:** {stage_metrics['total']}h")
+        st.write(f"**Completed Hours:** {stage_metrics['completed']}h")
+        st.write(f"**Remaining Hours:** {stage_metrics['total'] - stage_metrics['completed']}h")
+        st.progress(stage_metrics['percent'] / 100)
+        if projection["finish"]:
+            finish = projection["stage_finish"]
+            st.write(f"**Projected Finish:** {'✅ Done' if finish is None else f'{finish:%b %d, %Y}'}")
 
     # Topics Tab
     with tabs[1]:
-        st.markdown("### Topics")
-        for topic in data["topics"]:
-            cols = st.columns([1, 4])
-            checked = cols[0].checkbox(
-                " ", 
-                value=topic["name"] in st.session_state.progress.get(selected_stage, []),
-                key=f"{selected_stage}_{topic['name']}"
-            )
-            cols[1].markdown(f"**{topic['name']}** ({topic['time']}h)")
-            if checked:
-                st.session_state.progress[selected_stage] = st.session_state.progress.get(selected_stage, []) + [topic["name"]]
-            else:
-                st.session_state.progress[selected_stage] = [t for t in st.session_state.progress.get(selected_stage, []) if t != topic["name"]]
-        save_progress(st.session_state.user, st.session_state.progress)
+        topic_list(selected_stage)
 
     # Resources Tab
-    with tabs[2]:
+    with tabs[2], instrument.section("render_resources"):
         st.markdown("### Resources")
+        markdown = resource_markdown(model.version, selected_stage, model.stage_resources(selected_stage))
         resource_tabs = st.tabs(["Books", "Documentation", "Videos", "Practice", "Research"])
         with resource_tabs[0]:
-            st.markdown("\n".join([f"- {book}" for book in data["resources"]["books"]]))
+            st.markdown(markdown["books"])
         with resource_tabs[1]:
-            st.markdown("\n".join([f"- [{link.split(' ')[0]}]({link})" for link in data["resources"]["documentation"]]))
+            st.markdown(markdown["documentation"])
         with resource_tabs[2]:
-            for video in data["resources"]["youtube"]:
-                st.video(video.split(" ")[0])
+            video_list(model.version, selected_stage, model.stage_resources(selected_stage))
         with resource_tabs[3]:
-            st.markdown("\n".join([f"- [{site}]({site})" for site in data["resources"]["practice_sites"]]))
+            st.markdown(markdown["practice_sites"])
         with resource_tabs[4]:
-            st.markdown("\n".join([f"- {paper}" for paper in data["resources"].get("research_papers", [])]))
+            st.markdown(markdown["research_papers"])
 
     # Progress Tab
-    with tabs[3]:
+    with tabs[3], instrument.section("render_progress"):
         st.markdown("### Progress")
         st.write("Track your progress for each topic in this stage.")
-        for topic in data["topics"]:
-            st.write(f"- **{topic['name']}**: {'✅ Completed' if topic['name'] in st.session_state.progress.get(selected_stage, []) else '❌ Not Completed'}")
+        for tid in model.topic_range(selected_stage):
+            st.write(f"- **{model.topic_names[tid]}**: {'✅ Completed' if engine.is_completed(tid) else '❌ Not Completed'}")
+
+    # History Tab
+    with tabs[4], instrument.section("render_history"):
+        history_view(engine)
 
     # Edit Roadmap Button
     if st.button("Edit Roadmap"):
-        edit_roadmap()
+        st.session_state.editing = not st.session_state.get("editing", False)
+    if st.session_state.get("editing"):
+        with instrument.section("render_editor"):
+            edit_roadmap()
 
 # Authentication UI
 def auth_page():
@@ -706,10 +817,19 @@ def auth_page():
         email = st.text_input("Email")
         password = st.text_input("Password", type='password')
         if st.button("Login"):
-            user = login_user(email, password)
+            try:
+                user = login_user(email, password)
+            except accounts.RateLimited as e:
+                st.error(f"Too many login attempts. Please try again in {e.retry_after} seconds.")
+                return
             if user:
+                try:
+                    progress = session_progress(email)  # Load user progress
+                except Exception as e:
+                    st.error(f"Could not load your progress: {e}")
+                    return
                 st.session_state.user = email
-                st.session_state.progress = load_progress(email)  # Load user progress
+                st.session_state.progress = progress
                 st.success("Login successful!")
                 st.rerun()
             else:
@@ -726,25 +846,152 @@ def auth_page():
                     st.success("Account created successfully! Please login.")
                 except sqlite3.IntegrityError:  # Handle duplicate email error
                     st.error("An account with this email already exists.")
+                except accounts.RateLimited as e:
+                    st.error(f"Too many sign-ups. Please try again in {e.retry_after} seconds.")
                 except Exception as e:  # Catch other exceptions
                     st.error(f"An error occurred: {e}")
             else:
                 st.warning("Passwords do not match. Please try again.")
 
+def cohort_dashboard():
+    # Admin-only cohort analytics over every user (see analytics.py)
+    st.title("📈 Cohort Analytics")
+    # Everyone is measured against the shared roadmap, not personal edits
+    loaded = current_roadmap()
+    model = loaded.model
+    # Not flushed first: users whose deferred saves commit later are marked
+    # changed again then (see startup), and the next refresh re-reads them
+    cohort = analytics.get_cohort(model, get_topic_registry(), load_progress)
+    with instrument.section("analytics_refresh"), db.connection() as conn:
+        if cohort.loaded_at is None or st.button("Full Reload"):
+            cohort.load(conn)
+            st.session_state.cohort_note = f"Loaded {len(cohort.emails)} users"
+        else:
+            changed = cohort.refresh(conn)
+            if changed:
+                st.session_state.cohort_note = f"Refreshed {changed} changed users"
+    st.caption(f"{st.session_state.get('cohort_note', '')} · data as of "
+               f"{datetime.fromtimestamp(cohort.loaded_at).strftime('%H:%M:%S')}")
+
+    summary = cohort.summary()
+    cols = st.columns(4)
+    cols[0].metric("Learners", summary["users"])
+    cols[1].metric("Active", summary["active"])
+    cols[2].metric("Median Hours", f"{summary['median_hours']:.1f}h")
+    cols[3].metric("90th Percentile", f"{summary['p90_hours']:.1f}h")
+
+    st.markdown("### Stage Funnel")
+    funnel = cohort.stage_funnel()
+    st.bar_chart({"stage": list(funnel),
+                  "started": [f["started"] for f in funnel.values()],
+                  "finished": [f["finished"] for f in funnel.values()]},
+                 x="stage", y=["started", "finished"])
+
+    st.markdown("### Stage Completion Distribution")
+    st.dataframe([{"stage": stage, **dict(zip(analytics.BUCKET_LABELS, counts))}
+                  for stage, counts in cohort.stage_distribution().items()],
+                 hide_index=True)
+
+    st.markdown("### Topic Completion")
+    st.line_chart({"topic": list(range(len(model))), "completed by": cohort.topic_rates().tolist()},
+                  x="topic", y="completed by")
+    st.markdown("**Largest drop-offs**")
+    for stage, topic, rate, drop in cohort.drop_offs():
+        st.write(f"- {topic} ({stage}): {rate:.0%} completed, down {drop:.0%} from the topic before")
+
+def profiling_panel(breakdown):
+    # Admin-only (ROADMAP_ADMINS): where this rerun's time went, plus
+    # process-wide totals. Sections nest, so they do not add up to the rerun.
+    with st.sidebar.expander("🛠 Profiling"):
+        st.markdown("**This rerun**")
+        for name, seconds in sorted(breakdown.items(), key=lambda item: -item[1]):
+            st.write(f"{name}: {seconds * 1000:.2f} ms")
+        st.markdown("**Since start**")
+        totals, counters = instrument.snapshot()
+        st.dataframe([{"name": name, "calls": calls, "total ms": round(seconds * 1000, 2),
+                       "avg ms": round(seconds / calls * 1000, 3), "max ms": round(longest * 1000, 2)}
+                      for name, (calls, seconds, longest) in sorted(totals.items())],
+                     hide_index=True)
+        for name, stats in user_cache.stats().items():
+            st.caption(f"{name} cache: " + ", ".join(f"{k} {v}" for k, v in stats.items()))
+        st.caption("DB writer: " + ", ".join(f"{k} {v}" for k, v in db.get_writer().stats.items()))
+        st.download_button("Download metrics (Prometheus text)", instrument.prometheus_text(),
+                           file_name="roadmap_metrics.prom")
+
+# Multi-process mode: pick up what other workers (or this user's other
+# tabs) changed since this session loaded it
+def reload_progress(email):
+    store = st.session_state.get("progress_store")
+    if store is not None:
+        store.flush()
+    old = st.session_state.progress
+    new = load_progress(email)
+    # Checkboxes keep their own state; drop the ones whose topic changed
+    for stage in set(old) | set(new):
+        for topic in set(old.get(stage, ())) ^ set(new.get(stage, ())):
+            st.session_state.pop(f"{stage}_{topic}", None)
+    st.session_state.progress = new
+    st.session_state.pop("metrics", None)
+    st.session_state.pop("progress_store", None)
+
+def sync_session():
+    email = st.session_state.user
+    current = (coherence.generation(),
+               {scope: coherence.version(scope, email) for scope in ("progress", "overrides")})
+    seen = st.session_state.get("seen_changes")
+    st.session_state.seen_changes = current
+    if seen is None:
+        return
+    mine = coherence.origin(session_id())
+    for scope, change in current[1].items():
+        if current[0] == seen[0] and (change == seen[1][scope] or change[1] == mine):
+            continue
+        if scope == "progress":
+            reload_progress(email)
+        else:
+            st.session_state.pop("overrides", None)
+            st.session_state.pop("search_overlay", None)
+
 # App flow
 def main():
+    startup(db.DB_PATH)
+    instrument.begin_rerun()
     # Initialize session state variables
     if 'progress' not in st.session_state:
         st.session_state.progress = {}
     if 'user' not in st.session_state:
         auth_page()
     else:
-        main_app()
+        if db.PROGRESS_ENCODING == "events":
+            get_compactor()
+        if coherence.ENABLED:
+            sync_session()
+        if auth.is_admin(st.session_state.user):
+            label = "⬅ Back to Tracker" if st.session_state.get("dashboard") else "📈 Cohort Analytics"
+            if st.sidebar.button(label):
+                st.session_state.dashboard = not st.session_state.get("dashboard", False)
+                st.rerun()
+        if st.session_state.get("dashboard") and auth.is_admin(st.session_state.user):
+            cohort_dashboard()
+        else:
+            main_app()
         if st.sidebar.button("Logout"):  # Move Logout button to the sidebar
+            get_progress_store().flush()
+            db.flush(st.session_state.user)
             del st.session_state.user
             del st.session_state.progress
+            del st.session_state.progress_store
+            st.session_state.pop("metrics", None)
+            st.session_state.pop("overrides", None)
+            st.session_state.pop("user_roadmap", None)
+            st.session_state.pop("dashboard", None)
+            st.session_state.pop("search_overlay", None)
+            st.session_state.pop("seen_changes", None)
             st.success("Logged out successfully!")
             st.rerun()
+    breakdown = instrument.end_rerun()
+    if breakdown and auth.is_admin(st.session_state.get("user")):
+        profiling_panel(breakdown)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,95 @@
+from array import array
+
+# Metrics engine for roadmap progress. Static per-stage hour totals come
+# precomputed with the shared roadmap model; each session keeps its
+# completion state as a bitset and adjusts completed hours incrementally
+# when a single topic toggles. Remaining hours are also kept in a Fenwick
+# tree over the stages, so the hours left up to any stage (what a finish
+# forecast needs) cost O(log stages) to read and to update.
+class ProgressMetrics:
+    def __init__(self, model, progress=None, bits=None):
+        self.model = model
+        self.bits = model.encode(progress) if bits is None else bits
+        self.completed_hours = array("l", (model.completed_hours(self.bits, i)
+                                           for i in range(len(model.stages))))
+        self.total_completed = sum(self.completed_hours)
+        # 1-based Fenwick tree of each stage's remaining hours
+        tree = [0]
+        tree.extend(total - done for total, done in zip(model.stage_hours, self.completed_hours))
+        for n in range(1, len(tree)):
+            parent = n + (n & -n)
+            if parent < len(tree):
+                tree[parent] += tree[n]
+        self._remaining = tree
+        # Formatted navigation labels, redone only for a stage that changed
+        self._labels = [None] * len(model.stages)
+
+    def is_completed(self, tid):
+        return bool(self.bits >> tid & 1)
+
+    def toggle(self, stage, topic, done):
+        tid = self.model.topic_id(stage, topic)
+        if tid is None or self.is_completed(tid) == done:
+            return
+        self.bits ^= 1 << tid
+        delta = self.model.topic_hours[tid] if done else -self.model.topic_hours[tid]
+        i = self.model.stage_id(stage)
+        self.completed_hours[i] += delta
+        self.total_completed += delta
+        tree = self._remaining
+        n = i + 1
+        while n < len(tree):
+            tree[n] -= delta
+            n += n & -n
+        self._labels[i] = None
+
+    def completed_topics(self, stage):
+        i = self.model.stage_id(stage)
+        if i is None:
+            return []
+        return [self.model.topic_names[tid] for tid in self.model._set_bits(self.bits, i)]
+
+    def remaining_through(self, i):
+        # Hours left in stage number i and every stage before it
+        hours = 0
+        n = i + 1
+        while n:
+            hours += self._remaining[n]
+            n -= n & -n
+        return hours
+
+    def stage(self, stage):
+        i = self.model.stage_id(stage)
+        total = self.model.stage_hours[i]
+        completed = self.completed_hours[i]
+        return {
+            "total": total,
+            "completed": completed,
+            "percent": (completed / total * 100) if total > 0 else 0
+        }
+
+    def label(self, i):
+        # "<stage> (12.3%)" for stage number i
+        label = self._labels[i]
+        if label is None:
+            total = self.model.stage_hours[i]
+            percent = (self.completed_hours[i] / total * 100) if total > 0 else 0
+            label = self._labels[i] = f"{self.model.stages[i]} ({percent:.1f}%)"
+        return label
+
+    def total(self):
+        total = self.model.total_hours
+        completed = self.total_completed
+        return {
+            "hours": total,
+            "completed": completed,
+            "percent": (completed / total * 100) if total > 0 else 0,
+            "remaining": total - completed
+        }
+
+    def as_dict(self):
+        # Same shape as the original calculate_progress() result
+        return {
+            "total": self.total(),
+            "stages": {stage: self.stage(stage) for stage in self.model.stages}
+        }
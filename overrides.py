@@ -0,0 +1,122 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import roadmap_model
+
+# Per-user roadmap customizations, stored as a list of small deltas over the
+# shared base roadmap instead of a private copy of it:
+#   {"op": "edit_topic", "stage": s, "topic": old name, "name": new, "time": h}
+#   {"op": "add_topic", "stage": s, "name": n, "time": h}
+#   {"op": "remove_topic", "stage": s, "topic": name}
+#   {"op": "edit_resource", "stage": s, "kind": k, "old": value, "value": new}
+#   {"op": "add_resource", "stage": s, "kind": k, "value": v}
+#   {"op": "remove_resource", "stage": s, "kind": k, "value": v}
+# Topics and resources are matched by value, so deltas keep applying when the
+# base roadmap is reordered; a delta whose target is gone is skipped, and so
+# is one that would give a stage two topics of the same name (topics are
+# keyed by name, see topic_list).
+MAX_CACHED_USERS = 256
+
+
+def digest(deltas):
+    return hashlib.sha256(json.dumps(deltas, sort_keys=True).encode()).hexdigest()[:16]
+
+def _topic_index(topics, name):
+    for i, topic in enumerate(topics):
+        if topic["name"] == name:
+            return i
+    return None
+
+def apply(stages, deltas):
+    # Copy-on-write: only stages a delta touches are copied into plain dicts;
+    # everything else is passed through as it is in `stages` (for a loaded
+    # roadmap, views of its model that a derived model shares)
+    if not deltas:
+        return stages
+    result = dict(stages)
+    copied = set()
+    for delta in deltas:
+        name = delta["stage"]
+        if name not in result:
+            continue
+        if name not in copied:
+            stage = result[name] = dict(result[name])
+            stage["topics"] = list(stage["topics"])
+            stage["resources"] = dict(stage.get("resources", {}))
+            copied.add(name)
+        stage = result[name]
+        topics = stage["topics"]
+        op = delta["op"]
+        if op == "edit_topic":
+            i = _topic_index(topics, delta["topic"])
+            if i is not None and (delta["name"] == delta["topic"]
+                                  or _topic_index(topics, delta["name"]) is None):
+                topics[i] = {"name": delta["name"], "time": delta["time"]}
+        elif op == "add_topic":
+            if _topic_index(topics, delta["name"]) is None:
+                topics.append({"name": delta["name"], "time": delta["time"]})
+        elif op == "remove_topic":
+            i = _topic_index(topics, delta["topic"])
+            if i is not None:
+                del topics[i]
+        else:
+            resources = stage["resources"]
+            values = list(resources.get(delta["kind"], ()))
+            if op == "add_resource":
+                values.append(delta["value"])
+            elif op == "edit_resource" and delta["old"] in values:
+                values[values.index(delta["old"])] = delta["value"]
+            elif op == "remove_resource" and delta["value"] in values:
+                values.remove(delta["value"])
+            resources[delta["kind"]] = values
+    return result
+
+
+class UserRoadmap:
+    __slots__ = ("stages", "model")
+
+    def __init__(self, stages, model):
+        self.stages = stages
+        self.model = model
+
+
+class EffectiveRoadmaps:
+    # Bounded LRU of customized views, keyed by the deltas rather than the
+    # user, so users with the same customizations share one. Users without
+    # deltas all share the base roadmap and its model. A view's stages are
+    # the base model's stage views except where a delta applied, so its
+    # model shares every untouched stage with the base model and costs
+    # memory for the edited stages plus a few bytes per topic.
+    def __init__(self, size=MAX_CACHED_USERS):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "builds": 0, "evictions": 0}
+
+    def get(self, base, deltas, deltas_digest):
+        if not deltas:
+            return UserRoadmap(base.stages, base.model)
+        key = (base.key, deltas_digest)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry
+        stages = apply(base.stages, deltas)
+        entry = UserRoadmap(stages, roadmap_model.Roadmap(stages, f"{base.key}+{deltas_digest}"))
+        with self._lock:
+            self._entries[key] = entry
+            self.stats["builds"] += 1
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+        return entry
+
+    def __len__(self):
+        return len(self._entries)
+
+
+effective = EffectiveRoadmaps()
@@ -0,0 +1,224 @@
+import json
+import threading
+
+# Compact progress encoding: one bitset per stage, keyed by stable topic IDs,
+# in a versioned binary blob.
+#
+#   b"RP" | format version | varint stage count
+#   then per stage: varint stage id | varint byte length | little-endian bits
+#
+# Bit n of a stage is set when the topic with number n in that stage is done.
+MAGIC = b"RP"
+FORMAT_VERSION = 1
+
+
+class TopicRegistry:
+    # Stage and topic numbers are assigned the first time a name is seen and
+    # never reused, so a blob stays valid when topics are added, renamed
+    # (a new name gets a new number) or reordered in the roadmap.
+    # `on_assign` may return the (stage_id, topic_no) actually stored when
+    # the numbers are handed out elsewhere (several workers sharing one
+    # database); `source` then returns every stored row, for blobs that
+    # use numbers this registry has not seen yet.
+    def __init__(self, rows=(), on_assign=None, source=None):
+        self._lock = threading.Lock()
+        self._on_assign = on_assign
+        self._source = source
+        self._stage_ids = {}
+        self._stage_names = []
+        self._topic_nos = []
+        self._topic_names = []
+        for stage, topic, stage_id, topic_no in rows:
+            self._add(stage, topic, stage_id, topic_no)
+
+    def _add(self, stage, topic, stage_id, topic_no):
+        self._stage_ids[stage] = stage_id
+        while len(self._topic_nos) <= stage_id:
+            self._stage_names.append(None)
+            self._topic_nos.append({})
+            self._topic_names.append([])
+        self._stage_names[stage_id] = stage
+        self._topic_nos[stage_id][topic] = topic_no
+        names = self._topic_names[stage_id]
+        names.extend([None] * (topic_no + 1 - len(names)))
+        names[topic_no] = topic
+
+    def ids(self, stage, topic):
+        stage_id = self._stage_ids.get(stage)
+        if stage_id is not None:
+            topic_no = self._topic_nos[stage_id].get(topic)
+            if topic_no is not None:
+                return stage_id, topic_no
+        with self._lock:
+            stage_id = self._stage_ids.get(stage, len(self._topic_nos))
+            nos = self._topic_nos[stage_id] if stage_id < len(self._topic_nos) else {}
+            if topic in nos:
+                return stage_id, nos[topic]
+            topic_no = len(self._topic_names[stage_id]) if nos else 0
+            if self._on_assign is not None:
+                stored = self._on_assign(stage, topic, stage_id, topic_no)
+                if stored is not None:
+                    stage_id, topic_no = stored
+            self._add(stage, topic, stage_id, topic_no)
+            return stage_id, topic_no
+
+    def refresh(self):
+        # Pick up numbers assigned by other processes; returns whether any
+        # source was there to ask
+        if self._source is None:
+            return False
+        rows = self._source()
+        with self._lock:
+            for row in rows:
+                self._add(*row)
+        return True
+
+    def _known(self, stage_id, topic_no=None):
+        if stage_id >= len(self._stage_names) or self._stage_names[stage_id] is None:
+            return False
+        names = self._topic_names[stage_id]
+        return topic_no is None or (topic_no < len(names) and names[topic_no] is not None)
+
+    def register(self, model):
+        # Number every topic of a roadmap in roadmap order, so blobs decode
+        # onto that roadmap's model with the shift fast path
+        for stage in model.stages:
+            for tid in model.topic_range(stage):
+                self.ids(stage, model.topic_names[tid])
+
+    def stage_name(self, stage_id):
+        if not self._known(stage_id):
+            self.refresh()
+        return self._stage_names[stage_id]
+
+    def topic_name(self, stage_id, topic_no):
+        if not self._known(stage_id, topic_no):
+            self.refresh()
+        return self._topic_names[stage_id][topic_no]
+
+    def model_offset(self, stage_id, model):
+        # When a stage's topic numbers follow the model's topic order (the
+        # usual case: numbers are assigned in roadmap order), its bitset maps
+        # onto the model bitset with a single shift. Returns None otherwise.
+        stage = self.stage_name(stage_id)
+        if model.stage_id(stage) is None:
+            return None
+        ids = model.topic_range(stage)
+        names = self._topic_names[stage_id]
+        if len(names) > len(ids):
+            return None
+        for topic_no, name in enumerate(names):
+            if model.topic_names[ids.start + topic_no] != name:
+                return None
+        return ids.start
+
+
+def _put_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _get_varint(blob, pos):
+    value = shift = 0
+    while True:
+        byte = blob[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+def is_encoded(blob):
+    return isinstance(blob, (bytes, bytearray, memoryview)) and bytes(blob[:2]) == MAGIC
+
+def _pack(stages):
+    # {stage id: bits} -> blob
+    out = bytearray(MAGIC)
+    out.append(FORMAT_VERSION)
+    _put_varint(out, len(stages))
+    for stage_id in sorted(stages):
+        bits = stages[stage_id]
+        raw = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+        _put_varint(out, stage_id)
+        _put_varint(out, len(raw))
+        out += raw
+    return bytes(out)
+
+def _unpack(blob):
+    # blob -> [(stage id, bits)]
+    blob = bytes(blob)
+    if not is_encoded(blob):
+        raise ValueError("Not an encoded progress blob")
+    if blob[2] != FORMAT_VERSION:
+        raise ValueError(f"Unsupported progress format version {blob[2]}")
+    count, pos = _get_varint(blob, 3)
+    stages = []
+    for _ in range(count):
+        stage_id, pos = _get_varint(blob, pos)
+        size, pos = _get_varint(blob, pos)
+        stages.append((stage_id, int.from_bytes(blob[pos:pos + size], "little")))
+        pos += size
+    return stages
+
+def encode(progress, registry):
+    stages = {}
+    for stage, topics in progress.items():
+        for topic in topics:
+            stage_id, topic_no = registry.ids(stage, topic)
+            stages[stage_id] = stages.get(stage_id, 0) | (1 << topic_no)
+    return _pack(stages)
+
+def decode(blob, registry):
+    progress = {}
+    for stage_id, bits in _unpack(blob):
+        topics = progress.setdefault(registry.stage_name(stage_id), [])
+        while bits:
+            low = bits & -bits
+            topics.append(registry.topic_name(stage_id, low.bit_length() - 1))
+            bits ^= low
+    return progress
+
+def apply_changes(blob, changes, registry):
+    # Set or clear the bits of (stage, topic, done) flips in a blob without
+    # decoding the rest of it to topic names
+    stages = dict(_unpack(blob)) if blob else {}
+    for stage, topic, done in changes:
+        stage_id, topic_no = registry.ids(stage, topic)
+        bits = stages.get(stage_id, 0)
+        bits = bits | (1 << topic_no) if done else bits & ~(1 << topic_no)
+        if bits:
+            stages[stage_id] = bits
+        else:
+            stages.pop(stage_id, None)
+    return _pack(stages)
+
+def to_model_bits(blob, registry, model, offsets=None):
+    # Decode straight into a roadmap_model bitset, skipping topic names for
+    # every stage that maps onto the model by a shift. `offsets` caches
+    # model_offset() results between calls for the same model.
+    if offsets is None:
+        offsets = {}
+    result = 0
+    for stage_id, bits in _unpack(blob):
+        if stage_id not in offsets:
+            offsets[stage_id] = registry.model_offset(stage_id, model)
+        offset = offsets[stage_id]
+        if offset is not None and bits.bit_length() <= len(model.topic_range(registry.stage_name(stage_id))):
+            result |= bits << offset
+            continue
+        stage = registry.stage_name(stage_id)
+        while bits:
+            low = bits & -bits
+            tid = model.topic_id(stage, registry.topic_name(stage_id, low.bit_length() - 1))
+            if tid is not None:
+                result |= 1 << tid
+            bits ^= low
+    return result
+
+# Conversions to and from the JSON form ({stage: [topic names]})
+def from_json(text, registry):
+    return encode(json.loads(text), registry)
+
+def to_json(blob, registry):
+    return json.dumps(decode(blob, registry))
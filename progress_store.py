@@ -0,0 +1,52 @@
+# Progress store with change detection: checkbox renders only record flips,
+# and all flips from one rerun are persisted with a single write in flush().
+# With `load_stage`, `progress` may start without some stages; each is
+# filled in from load_stage(stage) the first time it is touched.
+class ProgressStore:
+    def __init__(self, email, progress, save, load_stage=None):
+        self.email = email
+        self.progress = progress
+        self._save = save
+        self._load_stage = load_stage
+        self._pending = {}
+        self.writes = 0
+        self.flips = 0
+
+    def _topics(self, stage):
+        topics = self.progress.get(stage)
+        if topics is None:
+            topics = self.progress[stage] = self._load_stage(stage) if self._load_stage else []
+        return topics
+
+    def is_completed(self, stage, topic):
+        return topic in self._topics(stage)
+
+    def set_completed(self, stage, topic, done):
+        topics = self._topics(stage)
+        if done == (topic in topics):
+            return False
+        if done:
+            topics.append(topic)
+        else:
+            topics.remove(topic)
+        # A second flip of the same topic before a flush cancels the first
+        key = (stage, topic)
+        if key in self._pending:
+            del self._pending[key]
+        else:
+            self._pending[key] = done
+        self.flips += 1
+        return True
+
+    @property
+    def dirty(self):
+        return bool(self._pending)
+
+    def flush(self):
+        if not self._pending:
+            return False
+        changes = [(stage, topic, done) for (stage, topic), done in self._pending.items()]
+        self._save(self.email, changes)
+        self._pending = {}
+        self.writes += 1
+        return True
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+import pickle
+import threading
+
+import roadmap_model
+
+# Roadmap definitions live in versioned JSON files, one per named roadmap:
+#   roadmaps/<name>.json -> {"name": ..., "version": N, "stages": {...}}
+# Each file is parsed once per content hash and shared by every session. A
+# stat() per call is the hot-reload check, so edits to a file show up on the
+# next rerun without restarting the server.
+#
+# A new process does not parse the JSON either: the first load of a file's
+# content writes a snapshot of its compiled roadmap_model.Roadmap to
+# roadmaps/__pycache__/, keyed by the file's hash and roadmap_model.py's,
+# and later processes unpickle that instead.
+ROADMAP_DIR = os.environ.get(
+    "ROADMAP_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "roadmaps"))
+DEFAULT_ROADMAP = os.environ.get("ROADMAP_NAME", "data_science")
+SNAPSHOTS = os.environ.get("ROADMAP_SNAPSHOTS", "1") == "1"
+
+_loaded = {}
+_lock = threading.Lock()
+_model_digest = None
+
+
+class LoadedRoadmap:
+    # Only the compiled model is kept; `stages` are views of it in the JSON's
+    # dict form
+    __slots__ = ("name", "title", "version", "digest", "model")
+
+    def __init__(self, name, title, version, digest, model):
+        self.name = name
+        self.title = title
+        self.version = version
+        self.digest = digest
+        self.model = model
+
+    @property
+    def stages(self):
+        return self.model.views
+
+    @property
+    def key(self):
+        # Identifies this exact content; used to key derived caches
+        return f"{self.name}@{self.digest}"
+
+
+def available():
+    return sorted(f[:-5] for f in os.listdir(ROADMAP_DIR) if f.endswith(".json"))
+
+def path_for(name):
+    return os.path.join(ROADMAP_DIR, f"{name}.json")
+
+def _snapshot_path(name, digest):
+    global _model_digest
+    if _model_digest is None:
+        # A snapshot holds pickled Roadmap objects, so it is only valid for
+        # the roadmap_model.py that wrote it
+        with open(roadmap_model.__file__, "rb") as f:
+            _model_digest = hashlib.sha256(f.read()).hexdigest()[:8]
+    return os.path.join(ROADMAP_DIR, "__pycache__", f"{name}.{digest}.{_model_digest}.pickle")
+
+def _read_snapshot(name, digest):
+    # -> (title, version, model), or None to parse the JSON
+    try:
+        with open(_snapshot_path(name, digest), "rb") as f:
+            return pickle.load(f)
+    except Exception:
+        # Missing, truncated or from an incompatible Python; (re)written
+        # after parsing
+        return None
+
+def _write_snapshot(name, digest, snapshot):
+    # Written next to the JSON, atomically; stale snapshots of the same
+    # roadmap are removed. A read-only roadmap directory just means every
+    # process parses the JSON.
+    path = _snapshot_path(name, digest)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(snapshot, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        for f in os.listdir(os.path.dirname(path)):
+            if f.startswith(f"{name}.") and f.endswith(".pickle") and f != os.path.basename(path):
+                os.remove(os.path.join(os.path.dirname(path), f))
+    except OSError:
+        pass
+
+def _parse(name, content, digest):
+    key = f"{name}@{digest}"
+    snapshot = _read_snapshot(name, digest) if SNAPSHOTS else None
+    if snapshot is None:
+        doc = json.loads(content)
+        snapshot = (doc.get("name", name), doc.get("version", 1),
+                    roadmap_model.Roadmap(doc["stages"], key))
+        if SNAPSHOTS:
+            _write_snapshot(name, digest, snapshot)
+    title, version, model = snapshot
+    # The shared model for this content, as roadmap_model.get_model(stages, key)
+    roadmap_model.put(model)
+    return LoadedRoadmap(name, title, version, digest, model)
+
+def load(name=DEFAULT_ROADMAP):
+    path = path_for(name)
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    cached = _loaded.get(name)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    with _lock:
+        with open(path, "rb") as f:
+            content = f.read()
+        digest = hashlib.sha256(content).hexdigest()[:16]
+        if cached is not None and cached[1].digest == digest:
+            roadmap = cached[1]
+        else:
+            roadmap = _parse(name, content, digest)
+        _loaded[name] = (stamp, roadmap)
+    return roadmap
@@ -0,0 +1,270 @@
+import sys
+from array import array
+from bisect import bisect_right
+from collections.abc import Mapping
+from itertools import compress
+
+# Compact, read-only view of a roadmap. Topics get integer IDs in roadmap
+# order, so a stage is a contiguous ID range, hours live in one flat array
+# and a user's completion state fits in a single int used as a bitset.
+MAX_CACHED_VERSIONS = 16
+_BIT_MASK = bytes.maketrans(b"01", b"\x00\x01")
+
+_models = {}
+
+
+class _Spliced:
+    # A derived model's topic_names or topic_hours: topic ID -> item, where
+    # stage i's IDs map onto parts[i] from offsets[i] on (a range of the base
+    # model's sequence for a stage it shares, or the stage's own items)
+    __slots__ = ("_starts", "_parts", "_offsets")
+
+    def __init__(self, starts, parts, offsets):
+        self._starts = starts
+        self._parts = parts
+        self._offsets = offsets
+
+    def __len__(self):
+        return self._starts[-1]
+
+    def __getitem__(self, tid):
+        if isinstance(tid, slice):
+            start, stop, _ = tid.indices(len(self))
+            i = bisect_right(self._starts, start) - 1
+            if start < stop <= self._starts[i + 1]:
+                first = self._offsets[i] + start - self._starts[i]
+                return self._parts[i][first:first + stop - start]
+            return [self[n] for n in range(start, stop)]
+        if tid < 0:
+            tid += len(self)
+        i = bisect_right(self._starts, tid) - 1
+        if not 0 <= tid < self._starts[-1]:
+            raise IndexError("topic id out of range")
+        return self._parts[i][self._offsets[i] + tid - self._starts[i]]
+
+    def __iter__(self):
+        return (self[tid] for tid in range(len(self)))
+
+    def __eq__(self, other):
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def nbytes(self, shared=()):
+        return (sys.getsizeof(self) + sys.getsizeof(self._parts) + sys.getsizeof(self._offsets) +
+                sum(sys.getsizeof(part) for part in {id(p): p for p in self._parts}.values()
+                    if not any(part is other for other in shared)))
+
+
+class Roadmap:
+    __slots__ = ("version", "stages", "stage_start", "stage_hours", "total_hours",
+                 "topic_names", "topic_hours", "_resources", "_stage_ids", "_topic_ids",
+                 "_views")
+
+    def __init__(self, roadmap, version=None):
+        # `roadmap` is {stage: {"topics": [...], "resources": {...}}}; none of
+        # it is kept. A stage given as another model's view (see views) is
+        # shared with that model instead: its topic names, hours, index and
+        # resources are reused, so a customized roadmap derived from the
+        # base model's views (overrides.apply) costs memory for the edited
+        # stages only, plus a few pointers per stage.
+        stages = []
+        stage_start = array("l", [0])
+        stage_hours = array("l")
+        topic_ids = []
+        resources = []
+        name_parts, hour_parts, offsets = [], [], []
+        source = None
+        for stage, data in roadmap.items():
+            if isinstance(data, _StageView):
+                source, j = data.model, data.index
+                stages.append(source.stages[j])
+                name_parts.append(source.topic_names)
+                hour_parts.append(source.topic_hours)
+                offsets.append(source.stage_start[j])
+                topic_ids.append(source._topic_ids[j])
+                resources.append(source._resources[j])
+                stage_start.append(stage_start[-1] + source.stage_start[j + 1] - source.stage_start[j])
+                stage_hours.append(source.stage_hours[j])
+                continue
+            stages.append(sys.intern(stage))
+            # Topic name -> position within the stage, so an index stays
+            # valid wherever the stage starts
+            ids = {}
+            names = []
+            hours = array("l")
+            for topic in data["topics"]:
+                name = sys.intern(topic["name"])
+                ids.setdefault(name, len(ids))
+                names.append(name)
+                hours.append(int(topic["time"]))
+            name_parts.append(tuple(names))
+            hour_parts.append(hours)
+            offsets.append(0)
+            topic_ids.append(ids)
+            # (kind, values) pairs; lists become tuples, labels stay strings
+            resources.append(tuple((sys.intern(kind), tuple(value) if isinstance(value, list) else value)
+                                   for kind, value in data.get("resources", {}).items()))
+            stage_start.append(stage_start[-1] + len(names))
+            stage_hours.append(sum(hours))
+        self.version = version
+        self.stages = tuple(stages)
+        self.stage_start = stage_start
+        self.stage_hours = stage_hours
+        self.total_hours = sum(stage_hours)
+        if source is None:
+            self.topic_names = tuple(name for part in name_parts for name in part)
+            self.topic_hours = array("l", (h for part in hour_parts for h in part))
+        else:
+            self.topic_names = _Spliced(stage_start, name_parts, offsets)
+            self.topic_hours = _Spliced(stage_start, hour_parts, offsets)
+        self._resources = tuple(resources)
+        if source is not None and self.stages == source.stages:
+            self._stage_ids = source._stage_ids
+        else:
+            self._stage_ids = {stage: i for i, stage in enumerate(stages)}
+        self._topic_ids = tuple(topic_ids)
+        self._views = None
+
+    def __len__(self):
+        return len(self.topic_names)
+
+    def stage_id(self, stage):
+        return self._stage_ids.get(stage)
+
+    def topic_range(self, stage):
+        i = self._stage_ids[stage]
+        return range(self.stage_start[i], self.stage_start[i + 1])
+
+    def topic_id(self, stage, name):
+        i = self._stage_ids.get(stage)
+        if i is None:
+            return None
+        n = self._topic_ids[i].get(name)
+        return None if n is None else self.stage_start[i] + n
+
+    def stage_resources(self, stage):
+        # {kind: tuple of values, or a label such as "time"}
+        return dict(self._resources[self._stage_ids[stage]])
+
+    @property
+    def views(self):
+        # {stage: read-only view of the stage in the roadmap's dict form}.
+        # Stands in for the parsed JSON (roadmap_loader keeps only models),
+        # and a model built from views shares those stages with this one.
+        if self._views is None:
+            self._views = {stage: _StageView(self, i) for i, stage in enumerate(self.stages)}
+        return self._views
+
+    # Completion bitsets
+    def encode(self, progress):
+        # {stage: [topic names]} -> int with bit <topic id> set when completed
+        bits = bytearray((len(self.topic_names) + 7) // 8)
+        for stage, topics in progress.items():
+            i = self._stage_ids.get(stage)
+            if i is None:
+                continue
+            ids = self._topic_ids[i]
+            start = self.stage_start[i]
+            for name in topics:
+                n = ids.get(name)
+                if n is not None:
+                    tid = start + n
+                    bits[tid >> 3] |= 1 << (tid & 7)
+        return int.from_bytes(bits, "little")
+
+    def decode(self, bits):
+        progress = {}
+        for i, stage in enumerate(self.stages):
+            progress[stage] = [self.topic_names[tid] for tid in self._set_bits(bits, i)]
+        return progress
+
+    def _set_bits(self, bits, stage_no):
+        start = self.stage_start[stage_no]
+        width = self.stage_start[stage_no + 1] - start
+        chunk = (bits >> start) & ((1 << width) - 1)
+        while chunk:
+            low = chunk & -chunk
+            yield start + low.bit_length() - 1
+            chunk ^= low
+
+    def completed_hours(self, bits, stage_no):
+        # The stage's bits as a bytes mask over its slice of topic_hours, so
+        # the sum runs in C instead of once per set bit
+        start = self.stage_start[stage_no]
+        width = self.stage_start[stage_no + 1] - start
+        chunk = (bits >> start) & ((1 << width) - 1)
+        if not chunk:
+            return 0
+        mask = f"{chunk:0{width}b}".encode()[::-1].translate(_BIT_MASK)
+        return sum(compress(self.topic_hours[start:start + width], mask))
+
+    def nbytes(self, shared=None):
+        # Approximate memory held by the model (strings are interned, and
+        # not counted), less what it shares with `shared`, the model whose
+        # views it was built from
+        size = sys.getsizeof(self)
+        for part in (self.stages, self.stage_start, self.stage_hours, self._resources,
+                     self._topic_ids):
+            size += sys.getsizeof(part)
+        for part in (self.topic_names, self.topic_hours):
+            if isinstance(part, _Spliced):
+                size += part.nbytes(() if shared is None else (shared.topic_names, shared.topic_hours))
+            else:
+                size += sys.getsizeof(part)
+        if shared is None or self._stage_ids is not shared._stage_ids:
+            size += sys.getsizeof(self._stage_ids)
+        shared_ids = {id(ids) for ids in shared._topic_ids} if shared is not None else set()
+        size += sum(sys.getsizeof(ids) for ids in self._topic_ids if id(ids) not in shared_ids)
+        shared_ids = {id(pairs) for pairs in shared._resources} if shared is not None else set()
+        for pairs in self._resources:
+            if id(pairs) not in shared_ids:
+                size += sys.getsizeof(pairs) + sum(
+                    sys.getsizeof(pair) + (sys.getsizeof(pair[1]) if isinstance(pair[1], tuple) else 0)
+                    for pair in pairs)
+        if self._views is not None:
+            size += sys.getsizeof(self._views) + sum(sys.getsizeof(view) for view in self._views.values())
+        return size
+
+
+class _StageView(Mapping):
+    # One stage of a Roadmap as {"topics": [{"name", "time"}], "resources":
+    # {kind: [values] or label}}, built on access
+    __slots__ = ("model", "index")
+
+    def __init__(self, model, index):
+        self.model = model
+        self.index = index
+
+    def __getitem__(self, key):
+        model, i = self.model, self.index
+        if key == "topics":
+            ids = range(model.stage_start[i], model.stage_start[i + 1])
+            return [{"name": model.topic_names[tid], "time": model.topic_hours[tid]} for tid in ids]
+        if key == "resources":
+            return {kind: list(value) if isinstance(value, tuple) else value
+                    for kind, value in model._resources[i]}
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(("topics", "resources"))
+
+    def __len__(self):
+        return 2
+
+
+def get_model(roadmap, version):
+    model = _models.get(version)
+    if model is None:
+        if len(_models) >= MAX_CACHED_VERSIONS:
+            _models.clear()
+        model = _models[version] = Roadmap(roadmap, version)
+    return model
+
+def put(model):
+    # A model built (or unpickled) elsewhere, shared from now on under its
+    # version like one get_model() built
+    if len(_models) >= MAX_CACHED_VERSIONS and model.version not in _models:
+        _models.clear()
+    _models[model.version] = model
+
+def invalidate(version):
+    _models.pop(version, None)
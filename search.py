@@ -0,0 +1,286 @@
+import math
+import os
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from heapq import nsmallest
+
+# Search over topic names and resource lists. Each entry (stage, kind, text),
+# with kind "topic" or a resource list name, is a document in an in-memory
+# inverted index: token -> doc IDs. A query term matches tokens exactly, by
+# prefix (so results show up while typing) and fuzzily through a trigram
+# index over the vocabulary (so typos still match); matches are weighted by
+# IDF and summed per document.
+#
+# The shared index per roadmap is updated in place when its file changes
+# (only entries that were added or removed are touched), and a user's
+# customizations are an Overlay on top of it, so nobody rebuilds the index
+# to search their own roadmap.
+RESULT_LIMIT = int(os.environ.get("ROADMAP_SEARCH_LIMIT", "20"))
+PREFIX_MIN = 2           # shortest term expanded by prefix
+PREFIX_EXPANSIONS = 64   # vocabulary tokens tried per prefix
+FUZZY_MIN = 4            # shortest term matched fuzzily
+FUZZY_SIMILARITY = 0.5   # Dice coefficient over trigrams
+PREFIX_WEIGHT = 0.8
+FUZZY_WEIGHT = 0.6
+TIE_RESOURCE = 1 << 20   # tie rank offset putting resources after topics
+
+_TOKEN = re.compile(r"[^\W_]+")
+
+
+def tokens(text):
+    return _TOKEN.findall(text.lower())
+
+def _grams(token):
+    padded = f" {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def documents(stages):
+    # {stage: {"topics": [...], "resources": {...}}} -> (stage, kind, text) keys
+    for stage, data in stages.items():
+        for topic in data["topics"]:
+            yield stage, "topic", topic["name"]
+        for kind, values in data.get("resources", {}).items():
+            if isinstance(values, list):  # "time" and "difficulty" are labels
+                for value in values:
+                    yield stage, kind, value
+
+
+class Index:
+    # `idf` lets an overlay rank its few documents with the base index's
+    # statistics, so scores from both are comparable
+    def __init__(self, docs=(), idf=None):
+        self._docs = []                      # doc ID -> key, None once removed
+        self._order = []                     # doc ID -> tie rank, lower first
+        self._ids = defaultdict(list)        # key -> doc IDs (keys may repeat)
+        self._postings = {}                  # token -> set of doc IDs
+        self._vocab = []                     # sorted tokens, for prefixes
+        self._grams = defaultdict(set)       # trigram -> tokens
+        self._free = []
+        self._idf = idf or self.idf
+        self._lock = threading.RLock()
+        self.key = None
+        for key in docs:
+            self.add(key)
+
+    def __len__(self):
+        return len(self._docs) - len(self._free)
+
+    def count(self, key):
+        return len(self._ids.get(key, ()))
+
+    def add(self, key):
+        with self._lock:
+            doc = self._free.pop() if self._free else len(self._docs)
+            order = len(key[2]) + (0 if key[1] == "topic" else TIE_RESOURCE)
+            if doc == len(self._docs):
+                self._docs.append(key)
+                self._order.append(order)
+            else:
+                self._docs[doc] = key
+                self._order[doc] = order
+            self._ids[key].append(doc)
+            for token in set(tokens(key[2])):
+                posting = self._postings.get(token)
+                if posting is None:
+                    posting = self._postings[token] = set()
+                    insort(self._vocab, token)
+                    for gram in _grams(token):
+                        self._grams[gram].add(token)
+                posting.add(doc)
+
+    def remove(self, key):
+        # Removes one copy of `key`; returns False when there is none
+        with self._lock:
+            ids = self._ids.get(key)
+            if not ids:
+                return False
+            doc = ids.pop()
+            if not ids:
+                del self._ids[key]
+            self._docs[doc] = None
+            self._free.append(doc)
+            for token in set(tokens(key[2])):
+                posting = self._postings[token]
+                posting.discard(doc)
+                if not posting:
+                    del self._postings[token]
+                    del self._vocab[bisect_left(self._vocab, token)]
+                    for gram in _grams(token):
+                        self._grams[gram].discard(token)
+            return True
+
+    def sync(self, docs):
+        # Bring the index in line with a new document list, touching only
+        # the difference; returns (added, removed)
+        with self._lock:
+            wanted = Counter(docs)
+            have = Counter({key: len(ids) for key, ids in self._ids.items()})
+            removed = have - wanted
+            added = wanted - have
+            for key, n in removed.items():
+                for _ in range(n):
+                    self.remove(key)
+            for key, n in added.items():
+                for _ in range(n):
+                    self.add(key)
+            return sum(added.values()), sum(removed.values())
+
+    def idf(self, token):
+        return math.log(1 + len(self) / (1 + len(self._postings.get(token, ()))))
+
+    def expand(self, term):
+        # Vocabulary tokens a query term matches: {token: match weight}
+        matches = {}
+        if term in self._postings:
+            matches[term] = 1.0
+        if len(term) >= PREFIX_MIN:
+            i = bisect_left(self._vocab, term)
+            for token in self._vocab[i:i + PREFIX_EXPANSIONS]:
+                if not token.startswith(term):
+                    break
+                if token != term:
+                    matches[token] = PREFIX_WEIGHT * (0.5 + 0.5 * len(term) / len(token))
+        if len(term) >= FUZZY_MIN:
+            grams = _grams(term)
+            shared = Counter()
+            for gram in grams:
+                shared.update(self._grams.get(gram, ()))
+            for token, common in shared.items():
+                similarity = 2 * common / (len(grams) + len(token))
+                if similarity >= FUZZY_SIMILARITY and token not in matches:
+                    matches[token] = FUZZY_WEIGHT * similarity
+        return matches
+
+    def _groups(self, term):
+        # -> ([(weight, doc IDs)] best first, all matched doc IDs); each doc
+        # is only in the group of the best token it contains
+        ranked = sorted(((weight * self._idf(token), token)
+                         for token, weight in self.expand(term).items()), reverse=True)
+        groups, seen = [], set()
+        for weight, token in ranked:
+            docs = self._postings[token] - seen
+            if docs:
+                seen |= docs
+                groups.append((weight, docs))
+        return groups, seen
+
+    def top(self, terms, limit=RESULT_LIMIT):
+        # -> [(score, order, key)] for the best `limit` documents. Documents
+        # matching every term are ranked; when none do, those matching any.
+        # Ties go to topics, then to the shorter text (see _order).
+        order = self._order.__getitem__
+        with self._lock:
+            per_term = [self._groups(term) for term in terms]
+            if not per_term:
+                return []
+            if len(per_term) == 1:
+                # Groups are already in score order: take whole groups until
+                # one does not fit, and the best of that one by tie order
+                best = []
+                for weight, docs in per_term[0][0]:
+                    need = limit - len(best)
+                    if need <= 0:
+                        break
+                    picked = sorted(docs, key=order) if len(docs) <= need else nsmallest(need, docs, key=order)
+                    best.extend((weight, order(doc), self._docs[doc]) for doc in picked)
+                return best
+            matched = [docs for _, docs in per_term]
+            candidates = set.intersection(*matched) or set.union(*matched)
+            totals = dict.fromkeys(candidates, 0.0)
+            for groups, _ in per_term:
+                for weight, docs in groups:
+                    for doc in candidates.intersection(docs):
+                        totals[doc] += weight
+            best = nsmallest(limit, totals.items(), key=lambda item: (-item[1], order(item[0])))
+            return [(score, order(doc), self._docs[doc]) for doc, score in best]
+
+    def search(self, query, limit=RESULT_LIMIT):
+        return results(self.top(tokens(query), limit), limit)
+
+
+def results(top, limit):
+    # [(score, order, key)] from one or more indexes -> [(stage, kind, text,
+    # score)], best first, one row per key
+    rows, seen = [], set()
+    for score, _, key in sorted(top, key=lambda item: (-item[0], item[1])):
+        if key not in seen:
+            seen.add(key)
+            rows.append((*key, score))
+            if len(rows) == limit:
+                break
+    return rows
+
+
+class Overlay:
+    # A user's customized roadmap as deltas over the shared index (see
+    # overrides.py): entries their deltas removed are hidden, entries they
+    # added live in a small index of their own
+    def __init__(self, base, stages, deltas=()):
+        self.base = base
+        self.stages = stages
+        self.added = Index(idf=base.idf)
+        self.hidden = Counter()
+        for delta in deltas:
+            self.apply(delta)
+
+    def _count(self, key):
+        return self.base.count(key) - self.hidden[key] + self.added.count(key)
+
+    def _add(self, key):
+        self.added.add(key)
+
+    def _remove(self, key):
+        if self._count(key) <= 0:
+            return False
+        if not self.added.remove(key):
+            self.hidden[key] += 1
+        return True
+
+    def apply(self, delta):
+        # Mirrors overrides.apply(), one delta at a time
+        stage, op = delta["stage"], delta["op"]
+        if stage not in self.stages:
+            return
+        if op == "edit_topic":
+            old, new = (stage, "topic", delta["topic"]), (stage, "topic", delta["name"])
+            if self._count(old) > 0 and (old == new or self._count(new) <= 0):
+                self._remove(old)
+                self._add(new)
+        elif op == "add_topic":
+            if self._count((stage, "topic", delta["name"])) <= 0:
+                self._add((stage, "topic", delta["name"]))
+        elif op == "remove_topic":
+            self._remove((stage, "topic", delta["topic"]))
+        elif op == "add_resource":
+            self._add((stage, delta["kind"], delta["value"]))
+        elif op == "edit_resource":
+            if self._remove((stage, delta["kind"], delta["old"])):
+                self._add((stage, delta["kind"], delta["value"]))
+        elif op == "remove_resource":
+            self._remove((stage, delta["kind"], delta["value"]))
+
+    def search(self, query, limit=RESULT_LIMIT):
+        # Over-fetch from the base by what may be hidden; a hidden key can
+        # still have copies left in the base
+        terms = tokens(query)
+        hidden = {key for key, n in self.hidden.items() if n and n >= self.base.count(key)}
+        top = [item for item in self.base.top(terms, limit + len(hidden)) if item[2] not in hidden]
+        return results(top + self.added.top(terms, limit), limit)
+
+
+_indexes = {}
+_lock = threading.Lock()
+
+def get_index(roadmap):
+    # The shared index for a roadmap_loader.LoadedRoadmap, synced in place
+    # when the file's content changes
+    with _lock:
+        index = _indexes.get(roadmap.name)
+        if index is None:
+            index = _indexes[roadmap.name] = Index(documents(roadmap.stages))
+        elif index.key != roadmap.key:
+            index.sync(documents(roadmap.stages))
+        index.key = roadmap.key
+        return index
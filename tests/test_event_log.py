@@ -0,0 +1,66 @@
+import sqlite3
+
+import pytest
+
+import db
+import event_log
+import progress_codec
+
+EMAIL = "u@x.y"
+STAGE = "Stage 1"
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute(db.CREATE_EVENTS)
+    conn.execute(db.CREATE_SNAPSHOTS)
+    yield conn
+    conn.close()
+
+def log(conn, *events):
+    for topic, done in events:
+        conn.execute(db.INSERT_EVENT, (EMAIL, STAGE, topic, int(done), 1, "2026-01-01"))
+
+def no_base(email, conn):
+    return {}
+
+def load(conn, to_id=None, base=no_base):
+    return event_log.load(conn, EMAIL, progress_codec.TopicRegistry(), base, to_id)
+
+
+def test_apply_folds_absolute_done_values():
+    events = [(1, STAGE, "a", 1), (2, STAGE, "a", 1), (3, STAGE, "b", 1), (4, STAGE, "a", 0)]
+    assert event_log.apply({}, events) == {STAGE: ["b"]}
+
+def test_apply_unchecking_an_open_topic_is_a_no_op():
+    assert event_log.apply({STAGE: ["a"]}, [(1, STAGE, "b", 0)]) == {STAGE: ["a"]}
+
+def test_load_replays_all_events_over_base(conn):
+    log(conn, ("a", True), ("b", True), ("a", False))
+    progress, last = load(conn, base=lambda email, conn: {STAGE: ["c"]})
+    assert progress == {STAGE: ["c", "b"]}
+    assert last == 3
+
+def test_load_to_id_replays_forward(conn):
+    log(conn, ("a", True), ("b", True), ("a", False), ("a", True))
+    states = [sorted(load(conn, to_id)[0].get(STAGE, [])) for to_id in range(5)]
+    assert states == [[], ["a"], ["a", "b"], ["b"], ["a", "b"]]
+
+def test_rewind_past_a_stale_tab_event_keeps_the_topic(conn):
+    # The second "done a" came from a tab that had not seen the first one
+    log(conn, ("a", True), ("a", True), ("b", True))
+    assert load(conn, 2)[0] == {STAGE: ["a"]}
+    assert load(conn, 1)[0] == {STAGE: ["a"]}
+
+def test_load_starts_from_snapshot(conn):
+    registry = progress_codec.TopicRegistry()
+    log(conn, ("a", True), ("b", True), ("c", True))
+    conn.execute(db.UPSERT_SNAPSHOT,
+                 (EMAIL, 2, progress_codec.encode({STAGE: ["x"]}, registry), None))
+    progress, last = event_log.load(conn, EMAIL, registry, no_base)
+    assert progress == {STAGE: ["x", "c"]}
+    assert last == 3
+    # A rewind to before the snapshot replays from the base instead
+    assert event_log.load(conn, EMAIL, registry, no_base, 1)[0] == {STAGE: ["a"]}
+    assert event_log.load(conn, EMAIL, registry, no_base, 2)[0] == {STAGE: ["x"]}
@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+
+import forecast
+import metrics
+import roadmap_model
+
+DAY = forecast.DAY
+T0 = 1_700_000_000.0
+STAGES = {
+    "Stage 1": {"topics": [{"name": "a", "time": 10}, {"name": "b", "time": 20}]},
+    "Stage 2": {"topics": [{"name": "c", "time": 30}]},
+}
+
+
+def pace(*toggles):
+    # (seconds after T0, hours) toggles
+    result = forecast.Pace()
+    for at, hours in toggles:
+        result.record(hours, T0 + at)
+    return result
+
+def engine(progress=None, stages=STAGES):
+    return metrics.ProgressMetrics(roadmap_model.Roadmap(stages), progress or {})
+
+
+def test_no_pace_without_enough_history():
+    assert forecast.Pace().per_day(T0) is None
+    assert pace((0, 10), (60, 10)).per_day(T0 + DAY) is None
+    assert pace((0, 10), (60, 10), (120, 10)).per_day(T0 + 600) is None
+
+def test_steady_pace():
+    # 10h every day for a week, read right after the last toggle
+    steady = pace(*[(n * DAY, 10) for n in range(8)])
+    assert 9 < steady.per_day(T0 + 7 * DAY) < 12
+
+def test_unchecking_lowers_the_pace():
+    done = pace((0, 10), (DAY, 10), (2 * DAY, 10))
+    undone = pace((0, 10), (DAY, 10), (2 * DAY, 10), (2 * DAY + 60, -10))
+    assert undone.per_day(T0 + 3 * DAY) < done.per_day(T0 + 3 * DAY)
+
+def test_idle_pace_decays_to_none():
+    # 30h in one day, then 200 days without a toggle
+    burst = pace((0, 10), (DAY / 2, 10), (DAY, 10))
+    assert burst.per_day(T0 + 2 * DAY) is not None
+    assert burst.per_day(T0 + 200 * DAY) is None
+
+def test_project_after_a_long_idle_gap():
+    burst = pace((0, 10), (DAY / 2, 10), (DAY, 10))
+    projection = forecast.project(burst, engine(), "Stage 1", now=T0 + 200 * DAY)
+    assert projection == {"per_day": None, "finish": None, "stage_finish": None}
+
+def test_project_caps_far_finish_dates():
+    # A slow but valid pace against a huge roadmap would overflow datetime
+    slow = pace((0, 1), (DAY, 0), (2 * DAY, 0))
+    now = T0 + 20 * DAY
+    per_day = slow.per_day(now)
+    assert per_day is not None
+    huge = {"Stage 1": {"topics": [{"name": "a", "time": int(per_day * forecast.MAX_DAYS) + 1}]}}
+    projection = forecast.project(slow, engine(stages=huge), "Stage 1", now=now)
+    assert projection["per_day"] == per_day
+    assert projection["finish"] is None
+    assert projection["stage_finish"] is None
+
+def test_project_finish_dates():
+    steady = pace(*[(n * DAY, 10) for n in range(8)])
+    now = T0 + 7 * DAY
+    per_day = steady.per_day(now)
+    start = datetime.fromtimestamp(now)
+    projection = forecast.project(steady, engine({"Stage 1": ["a"]}), "Stage 1", now=now)
+    assert projection["per_day"] == per_day
+    assert projection["stage_finish"] == start + timedelta(days=20 / per_day)
+    assert projection["finish"] == start + timedelta(days=50 / per_day)
+    # A finished stage has no finish date of its own
+    projection = forecast.project(steady, engine({"Stage 1": ["a", "b"]}), "Stage 1", now=now)
+    assert projection["stage_finish"] is None
+    assert projection["finish"] == start + timedelta(days=30 / per_day)
@@ -0,0 +1,64 @@
+import overrides
+
+BASE = {
+    "Stage 1": {"topics": [{"name": "a", "time": 1}, {"name": "b", "time": 2}],
+                "resources": {"books": ["x", "y"], "time": "2 weeks"}},
+    "Stage 2": {"topics": [{"name": "c", "time": 3}], "resources": {}},
+}
+
+
+def names(stages, stage):
+    return [topic["name"] for topic in stages[stage]["topics"]]
+
+
+def test_no_deltas_returns_base():
+    assert overrides.apply(BASE, []) is BASE
+
+def test_topic_deltas():
+    result = overrides.apply(BASE, [
+        {"op": "edit_topic", "stage": "Stage 1", "topic": "a", "name": "a2", "time": 5},
+        {"op": "add_topic", "stage": "Stage 1", "name": "d", "time": 4},
+        {"op": "remove_topic", "stage": "Stage 1", "topic": "b"},
+    ])
+    assert result["Stage 1"]["topics"] == [{"name": "a2", "time": 5}, {"name": "d", "time": 4}]
+    assert names(BASE, "Stage 1") == ["a", "b"]
+
+def test_resource_deltas():
+    result = overrides.apply(BASE, [
+        {"op": "edit_resource", "stage": "Stage 1", "kind": "books", "old": "x", "value": "x2"},
+        {"op": "remove_resource", "stage": "Stage 1", "kind": "books", "value": "y"},
+        {"op": "add_resource", "stage": "Stage 2", "kind": "videos", "value": "v"},
+    ])
+    assert result["Stage 1"]["resources"] == {"books": ["x2"], "time": "2 weeks"}
+    assert result["Stage 2"]["resources"] == {"videos": ["v"]}
+    assert BASE["Stage 1"]["resources"]["books"] == ["x", "y"]
+    assert BASE["Stage 2"]["resources"] == {}
+
+def test_untouched_stages_are_shared():
+    result = overrides.apply(BASE, [{"op": "add_topic", "stage": "Stage 2", "name": "d", "time": 1}])
+    assert result["Stage 1"] is BASE["Stage 1"]
+    assert result["Stage 2"] is not BASE["Stage 2"]
+    assert result["Stage 2"]["topics"][0] is BASE["Stage 2"]["topics"][0]
+
+def test_deltas_with_missing_targets_are_skipped():
+    result = overrides.apply(BASE, [
+        {"op": "add_topic", "stage": "Gone", "name": "d", "time": 1},
+        {"op": "edit_topic", "stage": "Stage 1", "topic": "zz", "name": "q", "time": 1},
+        {"op": "remove_topic", "stage": "Stage 1", "topic": "zz"},
+        {"op": "edit_resource", "stage": "Stage 1", "kind": "books", "old": "zz", "value": "q"},
+    ])
+    assert "Gone" not in result
+    assert names(result, "Stage 1") == ["a", "b"]
+    assert result["Stage 1"]["resources"]["books"] == ["x", "y"]
+
+def test_deltas_that_would_duplicate_a_topic_are_skipped():
+    result = overrides.apply(BASE, [
+        {"op": "add_topic", "stage": "Stage 1", "name": "b", "time": 9},
+        {"op": "edit_topic", "stage": "Stage 1", "topic": "a", "name": "b", "time": 9},
+        {"op": "edit_topic", "stage": "Stage 1", "topic": "a", "name": "a", "time": 9},
+    ])
+    assert result["Stage 1"]["topics"] == [{"name": "a", "time": 9}, {"name": "b", "time": 2}]
+
+def test_digest_ignores_key_order():
+    assert overrides.digest([{"op": "a", "stage": "s"}]) == overrides.digest([{"stage": "s", "op": "a"}])
+    assert overrides.digest([]) != overrides.digest([{"op": "a", "stage": "s"}])
@@ -0,0 +1,72 @@
+import pytest
+
+import progress_codec
+import roadmap_model
+
+STAGES = {
+    "Stage 1": {"topics": [{"name": "a", "time": 1}, {"name": "b", "time": 2},
+                           {"name": "c", "time": 3}]},
+    "Stage 2": {"topics": [{"name": "d", "time": 4}, {"name": "e", "time": 5}]},
+}
+
+
+def as_sets(progress):
+    return {stage: set(topics) for stage, topics in progress.items() if topics}
+
+
+@pytest.mark.parametrize("progress", [
+    {},
+    {"Stage 1": ["a"]},
+    {"Stage 1": ["c", "a"], "Stage 2": ["e"]},
+    {"Stage 2": ["topic no. %d" % n for n in range(200)]},
+])
+def test_round_trip(progress):
+    registry = progress_codec.TopicRegistry()
+    blob = progress_codec.encode(progress, registry)
+    assert progress_codec.is_encoded(blob)
+    assert as_sets(progress_codec.decode(blob, registry)) == as_sets(progress)
+    assert as_sets(progress_codec.decode(
+        progress_codec.from_json(progress_codec.to_json(blob, registry), registry),
+        registry)) == as_sets(progress)
+
+def test_decode_with_stored_numbers():
+    registry = progress_codec.TopicRegistry()
+    blob = progress_codec.encode({"Stage 2": ["e"], "Stage 1": ["b"]}, registry)
+    rows = [(stage, topic, *registry.ids(stage, topic))
+            for stage, topic in [("Stage 1", "b"), ("Stage 2", "e")]]
+    assert as_sets(progress_codec.decode(blob, progress_codec.TopicRegistry(rows))) == \
+        {"Stage 1": {"b"}, "Stage 2": {"e"}}
+
+def test_decode_rejects_other_data():
+    registry = progress_codec.TopicRegistry()
+    with pytest.raises(ValueError):
+        progress_codec.decode(b'{"Stage 1": ["a"]}', registry)
+    blob = bytearray(progress_codec.encode({"Stage 1": ["a"]}, registry))
+    blob[2] = progress_codec.FORMAT_VERSION + 1
+    with pytest.raises(ValueError):
+        progress_codec.decode(bytes(blob), registry)
+
+def test_apply_changes_matches_encode():
+    registry = progress_codec.TopicRegistry()
+    blob = progress_codec.encode({"Stage 1": ["a", "b"]}, registry)
+    blob = progress_codec.apply_changes(
+        blob, [("Stage 1", "a", False), ("Stage 2", "d", True), ("Stage 1", "c", True)], registry)
+    assert as_sets(progress_codec.decode(blob, registry)) == \
+        {"Stage 1": {"b", "c"}, "Stage 2": {"d"}}
+    # Clearing a stage's last topic drops the stage from the blob
+    blob = progress_codec.apply_changes(blob, [("Stage 2", "d", False)], registry)
+    assert blob == progress_codec.encode({"Stage 1": ["b", "c"]}, registry)
+    assert progress_codec.apply_changes(b"", [("Stage 1", "a", True)], registry) == \
+        progress_codec.encode({"Stage 1": ["a"]}, registry)
+
+@pytest.mark.parametrize("registered", [True, False])
+def test_to_model_bits_matches_model_encode(registered):
+    model = roadmap_model.Roadmap(STAGES)
+    registry = progress_codec.TopicRegistry()
+    if registered:
+        registry.register(model)  # numbered in roadmap order: shift path
+    progress = {"Stage 1": ["c", "a"], "Stage 2": ["e"], "Gone": ["z"]}
+    blob = progress_codec.encode(progress, registry)
+    offsets = {}
+    assert progress_codec.to_model_bits(blob, registry, model, offsets) == model.encode(progress)
+    assert progress_codec.to_model_bits(blob, registry, model, offsets) == model.encode(progress)
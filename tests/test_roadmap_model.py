@@ -0,0 +1,95 @@
+import gc
+import json
+import pickle
+import random
+
+import pytest
+
+import overrides
+import roadmap_model
+
+BASE = {
+    f"Stage {s}": {
+        "topics": [{"name": f"Topic {s}.{t}", "time": 1 + (s + t) % 7} for t in range(8)],
+        "resources": {"books": [f"Book {s}"], "youtube": [], "time": "2 weeks"},
+    }
+    for s in range(6)
+}
+
+
+def random_deltas(rng):
+    deltas = []
+    for _ in range(rng.randrange(1, 6)):
+        stage = rng.choice(list(BASE))
+        topic = rng.choice(BASE[stage]["topics"])["name"]
+        op = rng.choice(["edit_topic", "add_topic", "remove_topic", "add_resource"])
+        if op == "edit_topic":
+            deltas.append({"op": op, "stage": stage, "topic": topic, "name": f"N{rng.random()}", "time": 3})
+        elif op == "add_topic":
+            deltas.append({"op": op, "stage": stage, "name": f"A{rng.random()}", "time": 2})
+        elif op == "remove_topic":
+            deltas.append({"op": op, "stage": stage, "topic": topic})
+        else:
+            deltas.append({"op": op, "stage": stage, "kind": "books", "value": "x"})
+    return deltas
+
+def assert_same(a, b):
+    assert list(a.topic_names) == list(b.topic_names)
+    assert list(a.topic_hours) == list(b.topic_hours)
+    assert a.stages == b.stages
+    assert a.stage_start == b.stage_start and a.stage_hours == b.stage_hours
+    assert a.total_hours == b.total_hours
+    for stage in a.stages:
+        assert a.topic_range(stage) == b.topic_range(stage)
+        assert a.stage_resources(stage) == b.stage_resources(stage)
+        for tid in a.topic_range(stage):
+            assert b.topic_id(stage, a.topic_names[tid]) == tid
+
+
+def test_model_keeps_no_source_dicts():
+    source = json.loads(json.dumps(BASE))
+    model = roadmap_model.Roadmap(source)
+    model.views
+    seen, todo = set(), [model]
+    while todo:
+        obj = todo.pop()
+        if id(obj) not in seen:
+            seen.add(id(obj))
+            assert not (isinstance(obj, dict) and "topics" in obj)
+            if not isinstance(obj, type):
+                todo.extend(gc.get_referents(obj))
+    assert model.stage_resources("Stage 1") == {"books": ("Book 1",), "youtube": (), "time": "2 weeks"}
+
+def test_views_read_back_as_the_source():
+    model = roadmap_model.Roadmap(BASE)
+    assert {stage: dict(view) for stage, view in model.views.items()} == BASE
+    with pytest.raises(KeyError):
+        model.views["Stage 0"]["name"]
+
+def test_model_from_views_shares_every_stage():
+    model = roadmap_model.Roadmap(BASE)
+    copy = roadmap_model.Roadmap(model.views)
+    assert_same(model, copy)
+    assert copy.nbytes(model) < model.nbytes() / 4
+
+@pytest.mark.parametrize("seed", range(50))
+def test_derived_model_matches_a_full_build(seed):
+    model = roadmap_model.Roadmap(BASE)
+    stages = overrides.apply(model.views, random_deltas(random.Random(seed)))
+    derived = roadmap_model.Roadmap(stages)
+    full = roadmap_model.Roadmap({stage: dict(data) for stage, data in stages.items()})
+    assert_same(full, derived)
+    progress = {stage: [t["name"] for t in data["topics"][::3]] for stage, data in stages.items()}
+    bits = full.encode(progress)
+    assert derived.encode(progress) == bits
+    assert derived.decode(bits) == full.decode(bits)
+    assert [derived.completed_hours(bits, i) for i in range(len(derived.stages))] == \
+        [full.completed_hours(bits, i) for i in range(len(full.stages))]
+
+def test_pickled_model_keeps_its_views():
+    model = roadmap_model.Roadmap(BASE, "v1")
+    model.views
+    copy = pickle.loads(pickle.dumps(model, pickle.HIGHEST_PROTOCOL))
+    assert_same(model, copy)
+    assert {stage: dict(view) for stage, view in copy.views.items()} == BASE
+    assert all(view.model is copy for view in copy.views.values())
@@ -0,0 +1,73 @@
+import overrides
+import search
+
+STAGES = {
+    "Stage 1": {"topics": [{"name": "Pandas basics", "time": 1}, {"name": "Numpy arrays", "time": 1}],
+                "resources": {"books": ["Python for Data Analysis", "Python for Data Analysis"]}},
+}
+
+
+def overlay(*deltas):
+    return search.Overlay(search.Index(search.documents(STAGES)), STAGES, deltas)
+
+def found(view, query):
+    return {(stage, kind, text) for stage, kind, text, _ in view.search(query)}
+
+
+def test_removed_topic_is_hidden():
+    view = overlay({"op": "remove_topic", "stage": "Stage 1", "topic": "Pandas basics"})
+    assert found(view, "pandas") == set()
+    assert ("Stage 1", "topic", "Numpy arrays") in found(view, "numpy")
+
+def test_edited_topic_is_found_by_its_new_name():
+    view = overlay({"op": "edit_topic", "stage": "Stage 1", "topic": "Pandas basics",
+                    "name": "Polars basics", "time": 1})
+    assert found(view, "pandas") == set()
+    assert found(view, "polars") == {("Stage 1", "topic", "Polars basics")}
+
+def test_duplicate_resource_stays_until_every_copy_is_removed():
+    key = ("Stage 1", "books", "Python for Data Analysis")
+    remove = {"op": "remove_resource", "stage": "Stage 1", "kind": "books",
+              "value": "Python for Data Analysis"}
+    view = overlay(remove)
+    assert view.hidden[key] == 1
+    assert key in found(view, "analysis")
+    view.apply(remove)
+    assert found(view, "analysis") == set()
+    # There is nothing left to remove, so a third removal hides nothing more
+    view.apply(remove)
+    assert view.hidden[key] == 2
+
+def test_removing_an_added_entry_does_not_hide_the_base():
+    add = {"op": "add_resource", "stage": "Stage 1", "kind": "books",
+           "value": "Python for Data Analysis"}
+    remove = {"op": "remove_resource", "stage": "Stage 1", "kind": "books",
+              "value": "Python for Data Analysis"}
+    view = overlay(add, remove)
+    assert not view.hidden
+    assert view.added.count(("Stage 1", "books", "Python for Data Analysis")) == 0
+
+def test_topics_are_not_duplicated():
+    view = overlay({"op": "add_topic", "stage": "Stage 1", "name": "Pandas basics", "time": 1},
+                   {"op": "edit_topic", "stage": "Stage 1", "topic": "Numpy arrays",
+                    "name": "Pandas basics", "time": 1})
+    assert len(view.added) == 0
+    assert not view.hidden
+    assert ("Stage 1", "topic", "Numpy arrays") in found(view, "numpy")
+
+def test_editing_a_missing_entry_adds_nothing():
+    view = overlay({"op": "edit_topic", "stage": "Stage 1", "topic": "Gone",
+                    "name": "Polars basics", "time": 1},
+                   {"op": "add_topic", "stage": "Stage 9", "name": "Polars basics", "time": 1})
+    assert found(view, "polars") == set()
+    assert not view.hidden
+
+def test_overlay_matches_a_rebuilt_index():
+    deltas = [
+        {"op": "edit_topic", "stage": "Stage 1", "topic": "Numpy arrays", "name": "Numpy ufuncs", "time": 1},
+        {"op": "add_resource", "stage": "Stage 1", "kind": "videos", "value": "Numpy in an hour"},
+        {"op": "remove_resource", "stage": "Stage 1", "kind": "books", "value": "Python for Data Analysis"},
+    ]
+    rebuilt = search.Index(search.documents(overrides.apply(STAGES, deltas)))
+    for query in ["numpy", "analysis", "pandas", "ufunc"]:
+        assert found(overlay(*deltas), query) == found(rebuilt, query)
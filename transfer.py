@@ -0,0 +1,174 @@
+import argparse
+import csv
+import json
+import sys
+import time
+from contextlib import nullcontext
+from itertools import islice
+
+import db
+import event_log
+import progress_codec
+
+# Streaming backup and migration of users and progress:
+#   python transfer.py export backup.ndjson
+#   python transfer.py export --format csv --table progress progress.csv
+#   python transfer.py import backup.ndjson --db other.db
+# Rows are streamed from the cursor and imported in executemany batches, so
+# memory stays flat however many rows there are. NDJSON carries both tables
+# in one file ({"type": "user" | "progress", ...}); CSV holds one table.
+# Progress is exported per topic whatever the storage mode, and imported
+# into the per-topic progress table, which the "bitset" and "events" modes
+# fall back to for users without a blob or snapshot.
+USER_FIELDS = ("email", "password", "created_at")
+PROGRESS_FIELDS = ("email", "stage", "topic", "completed_at")
+BATCH_SIZE = 10000
+COMMIT_EVERY = 200000
+
+
+def _decoded_progress(conn):
+    # Per-topic rows for the "bitset" and "events" modes, one user at a time
+    registry = progress_codec.TopicRegistry(conn.execute(db.SELECT_TOPIC_IDS).fetchall())
+
+    def stored(email, conn):
+        if db.PROGRESS_ENCODING == "bitset":
+            row = conn.execute(db.SELECT_PROGRESS_BITS, (email,)).fetchone()
+            if row:
+                return progress_codec.decode(row[0], registry)
+        progress = {}
+        for stage, topic in conn.execute(db.SELECT_PROGRESS, (email,)):
+            progress.setdefault(stage, []).append(topic)
+        return progress
+
+    for (email,) in conn.cursor().execute(db.SELECT_ALL_EMAILS):
+        if db.PROGRESS_ENCODING == "events":
+            progress = event_log.load(conn, email, registry, stored)[0]
+        else:
+            progress = stored(email, conn)
+        for stage, topics in progress.items():
+            for topic in topics:
+                yield email, stage, topic, None
+
+def rows(conn, table):
+    if table == "users":
+        return conn.cursor().execute(db.SELECT_ALL_USERS)
+    if db.PROGRESS_ENCODING == "rows":
+        return conn.cursor().execute(db.SELECT_ALL_PROGRESS_ROWS)
+    return _decoded_progress(conn)
+
+def export(conn, out, fmt, tables):
+    count = 0
+    for table in tables:
+        fields = USER_FIELDS if table == "users" else PROGRESS_FIELDS
+        kind = "user" if table == "users" else "progress"
+        if fmt == "csv":
+            writer = csv.writer(out)
+            writer.writerow(fields)
+            for row in rows(conn, table):
+                writer.writerow(row)
+                count += 1
+        else:
+            for row in rows(conn, table):
+                out.write(json.dumps({"type": kind, **dict(zip(fields, row))}, default=str))
+                out.write("\n")
+                count += 1
+    return count
+
+def _records(inp, fmt, table):
+    # -> ("user" | "progress", params) pairs, one input line at a time
+    if fmt == "csv":
+        fields = USER_FIELDS if table == "users" else PROGRESS_FIELDS
+        kind = "user" if table == "users" else "progress"
+        reader = csv.reader(inp)
+        header = next(reader, None)
+        if header is not None and tuple(header) != fields:
+            raise ValueError(f"Expected CSV columns {','.join(fields)}, got {','.join(header)}")
+        for row in reader:
+            yield kind, [value or None for value in row]
+        return
+    for line in inp:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        kind = record.get("type")
+        if kind not in ("user", "progress"):
+            raise ValueError(f"Unknown record type {kind!r}")
+        fields = USER_FIELDS if kind == "user" else PROGRESS_FIELDS
+        yield kind, [record.get(field) for field in fields]
+
+def import_(conn, inp, fmt, table, batch_size=BATCH_SIZE, commit_every=COMMIT_EVERY):
+    # Consecutive records of one kind go in together with executemany; a
+    # transaction spans `commit_every` rows
+    count = pending = 0
+    records = _records(inp, fmt, table)
+    users, progress = [], []
+
+    def write():
+        nonlocal pending
+        if users:
+            conn.executemany(db.INSERT_USER_IGNORE,
+                             [(email, password, json.dumps({}), created_at)
+                              for email, password, created_at in users])
+        if progress:
+            conn.executemany(db.UPSERT_TOPIC, progress)
+        pending += len(users) + len(progress)
+        users.clear()
+        progress.clear()
+        if pending >= commit_every:
+            conn.commit()
+            pending = 0
+
+    for batch in iter(lambda: list(islice(records, batch_size)), []):
+        for kind, params in batch:
+            (users if kind == "user" else progress).append(params)
+        write()
+        count += len(batch)
+    if count:
+        # Running workers in multi-process mode drop their caches
+        conn.execute(db.INSERT_CHANGE, ("*", "*", "transfer", time.time()))
+    conn.commit()
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream users and progress in or out of the database")
+    parser.add_argument("--db", default=db.DB_PATH, help="database file (default: %(default)s)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("export", help="write users and progress to NDJSON or CSV")
+    p.add_argument("file", nargs="?", default="-", help="output file, - for stdout")
+    p.add_argument("--format", choices=("ndjson", "csv"), default="ndjson")
+    p.add_argument("--table", choices=("users", "progress", "all"), default="all")
+
+    p = sub.add_parser("import", help="load users and progress from NDJSON or CSV")
+    p.add_argument("file", nargs="?", default="-", help="input file, - for stdin")
+    p.add_argument("--format", choices=("ndjson", "csv"), default="ndjson")
+    p.add_argument("--table", choices=("users", "progress"), default="progress",
+                   help="table a CSV file holds")
+    p.add_argument("--batch", type=int, default=BATCH_SIZE)
+    p.add_argument("--commit-every", type=int, default=COMMIT_EVERY)
+
+    args = parser.parse_args()
+    if args.command == "export" and args.format == "csv" and args.table == "all":
+        parser.error("CSV holds one table: pass --table users or --table progress")
+
+    conn = db.connect(args.db)
+    with conn:
+        conn.execute(db.CREATE_USERS)
+        db.migrate(conn)
+    start = time.perf_counter()
+    if args.command == "export":
+        tables = ("users", "progress") if args.table == "all" else (args.table,)
+        out = nullcontext(sys.stdout) if args.file == "-" else open(args.file, "w", newline="", encoding="utf-8")
+        with out as out:
+            count = export(conn, out, args.format, tables)
+    else:
+        inp = nullcontext(sys.stdin) if args.file == "-" else open(args.file, newline="", encoding="utf-8")
+        with inp as inp:
+            count = import_(conn, inp, args.format, args.table, args.batch, args.commit_every)
+    conn.close()
+    elapsed = time.perf_counter() - start
+    print(f"{args.command}ed {count} rows in {elapsed:.2f}s "
+          f"({count / elapsed if elapsed else 0:.0f} rows/s)", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Process-wide caches of per-user data shared by every session, so a reload
+# or a second tab for the same user does not re-read and re-decode it from
+# the database. Writers update (or invalidate) the entry as they save, so a
+# cached value is never older than the last write from this process.
+CACHE_SIZE = int(os.environ.get("ROADMAP_USER_CACHE_SIZE", "1024"))
+CACHE_TTL = float(os.environ.get("ROADMAP_USER_CACHE_TTL", "600"))
+
+
+class TTLCache:
+    # Bounded LRU whose entries also expire `ttl` seconds after being stored
+    def __init__(self, size=CACHE_SIZE, ttl=CACHE_TTL, copy=None):
+        self.size = size
+        self.ttl = ttl
+        self._copy = copy or (lambda value: value)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0,
+                      "invalidations": 0}
+
+    def get(self, key, load):
+        # Returns a private copy, so callers may mutate what they get back
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return self._copy(entry[0])
+                del self._entries[key]
+                self.stats["expirations"] += 1
+            self.stats["misses"] += 1
+        value = load(key)
+        if value is not None:
+            self.put(key, value)
+        return value
+
+    def put(self, key, value):
+        if self.size <= 0 or self.ttl <= 0:
+            return
+        value = self._copy(value)
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def update(self, key, change):
+        # Apply `change` to a cached value in place; no-op when not cached
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                change(entry[0])
+
+    def invalidate(self, key):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def copy_progress(progress):
+    return {stage: list(topics) for stage, topics in progress.items()}
+
+def apply_changes(changes):
+    # -> a change function for TTLCache.update() from (stage, topic, done) flips
+    def change(progress):
+        for stage, topic, done in changes:
+            topics = progress.setdefault(stage, [])
+            if done and topic not in topics:
+                topics.append(topic)
+            elif not done and topic in topics:
+                topics.remove(topic)
+    return change
+
+
+# Decoded {stage: [topics]} progress and users rows, keyed by email
+progress = TTLCache(copy=copy_progress)
+users = TTLCache()
+# Stored progress blobs in the "bitset" mode (bytes, so shared as they are)
+progress_bits = TTLCache()
+# forecast.Pace per email; shared by the user's sessions and updated in place
+pace = TTLCache()
+
+def stats():
+    return {"progress": dict(progress.stats, size=len(progress)),
+            "users": dict(users.stats, size=len(users)),
+            "progress_bits": dict(progress_bits.stats, size=len(progress_bits)),
+            "pace": dict(pace.stats, size=len(pace))}
+
+def clear():
+    progress.clear()
+    users.clear()
+    progress_bits.clear()
+    pace.clear()